@@ -0,0 +1,399 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from bs import PARSERS, make_parse_executor, save_html_files_async
+from parallel import sweep_parallel_async
+from pinger import make_session, ping_domains_async
+from report import write_report
+from resolver import CachedResolver, DnsCache, StaticResolver
+from timing import StageTimer
+
+_WORDS = (
+    "domain", "service", "online", "shop", "news", "travel", "music", "garden", "coffee", "energy",
+    "market", "studio", "health", "school", "design", "sport", "family", "weather", "people", "digital"
+)
+# Order in which a host's random draw is mapped to its behaviour
+_KINDS = ("nxdomain", "timeout", "fail", "redirect")
+
+
+def farm_names(config):
+    """
+    Returns (bases, suffixes) of the fake hosts the farm answers for.
+    """
+    bases = [f"bench{i}" for i in range(config["bases"])]
+    suffixes = [f".t{i}" for i in range(config["tlds"])]
+    return bases, suffixes
+
+
+def host_profile(host, config):
+    """
+    Returns the behaviour of a fake host: {"kind", "size"} where kind is "nxdomain",
+    "timeout", "fail", "redirect" or "ok" and size is the page size in bytes.
+    Depends only on the host name and config["seed"], so every run sees the same farm.
+    """
+    rng = random.Random(f"{config['seed']}:{host}")
+    draw = rng.random()
+    kind = "ok"
+    for name in _KINDS:
+        rate = config[f"{name}_rate"]
+        if draw < rate:
+            kind = name
+            break
+        draw -= rate
+    size = int(config["page_kb"] * 1024 * rng.uniform(0.5, 1.5))
+    return {"kind": kind, "size": size}
+
+
+def make_page(host, size, rng):
+    """
+    Returns an HTML page for `host` of roughly `size` bytes with a title, descriptions,
+    headings and paragraphs.
+    """
+    def sentence(n):
+        return " ".join(rng.choice(_WORDS) for _ in range(n)).capitalize() + "."
+
+    head = (f"<html><head><title>{host} - {sentence(3)}</title>"
+            f"<meta name='description' content='{sentence(12)}'>"
+            f"<meta property='og:description' content='{sentence(12)}'></head><body>")
+    parts = [head]
+    length = len(head)
+    while length < size:
+        part = f"<h2>{sentence(4)}</h2><p>{sentence(40)}</p>" if rng.random() < 0.2 else f"<p>{sentence(40)}</p>"
+        parts.append(part)
+        length += len(part)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+async def run_farm(config, ready):
+    profiles = {}
+    pages = {}
+    rng = random.Random(config["seed"])
+    mu = math.log(max(config["latency_ms"], 0.001) / 1000)
+
+    async def handle(request):
+        host = request.host.split(":")[0]
+        profile = profiles.get(host)
+        if profile is None:
+            profile = profiles[host] = host_profile(host, config)
+        if profile["kind"] == "timeout":
+            await asyncio.sleep(config["hang"])
+        await asyncio.sleep(rng.lognormvariate(mu, config["latency_sigma"]))
+        if profile["kind"] == "fail":
+            return web.Response(status=rng.choice((404, 500, 503)))
+        if profile["kind"] == "redirect" and request.path == "/":
+            raise web.HTTPFound("/home")
+        page = pages.get(host)
+        if page is None:
+            page = pages[host] = make_page(host, profile["size"], random.Random(host))
+        return web.Response(text=page, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    await web.SockSite(runner, sock, backlog=1024).start()
+    ready.put(sock.getsockname()[1])
+    await asyncio.Event().wait()
+
+
+def serve_farm(config, ready):
+    """
+    Runs the farm until the process is terminated; puts the port on `ready` once
+    it accepts connections.
+    """
+    asyncio.run(run_farm(config, ready))
+
+
+class FarmResolver(CachedResolver):
+    """
+    aiohttp resolver that sends every host to the local farm, so no request can
+    leave the machine.
+    """
+
+    def __init__(self, port):
+        super().__init__()
+        self.port = port
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{
+            "hostname": host,
+            "host": "127.0.0.1",
+            "port": self.port,
+            "family": socket.AF_INET,
+            "proto": 0,
+            "flags": socket.AI_NUMERICHOST
+        }]
+
+
+def farm_resolvers(live, port):
+    """
+    Returns the (DNS resolver, aiohttp resolver) pair that maps the farm's hosts to it;
+    picklable through functools.partial for worker processes.
+    """
+    return StaticResolver(live), FarmResolver(port)
+
+
+def usage():
+    """
+    Returns (cpu_seconds, children_cpu_seconds, peak_rss_mb, children_peak_rss_mb),
+    with None for what the platform cannot report.
+    """
+    cpu = time.process_time()
+    if resource is None:
+        return cpu, None, None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (
+        cpu,
+        children.ru_utime + children.ru_stime,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        children.ru_maxrss / scale
+    )
+
+
+async def run_client(config, port, output_dir):
+    """
+    Sweeps every base of the farm through the probe, scrape and report stages the way
+    the batch CLI does, and returns the measurements.
+    """
+    bases, suffixes = farm_names(config)
+    live = {f"{base}{suffix}": "127.0.0.1" for base in bases for suffix in suffixes
+            if host_profile(f"{base}{suffix}", config)["kind"] != "nxdomain"}
+    if config["processes"] > 1:
+        return await run_parallel_client(config, port, output_dir, bases, suffixes, live)
+    dns_resolver, http_resolver = farm_resolvers(live, port)
+    session = make_session(config["concurrency"], config["per_host"], http_resolver)
+    sem = asyncio.Semaphore(config["max_concurrent"])
+    executor = make_parse_executor(config["parse_mode"])
+    timers = {base: StageTimer() for base in bases}
+    dns_cache = DnsCache(None)
+    formats = config["formats"]
+    start_usage = usage()
+    try:
+        start = time.perf_counter()
+        found = await asyncio.gather(*(ping_domains_async(
+            base, suffixes,
+            connect_timeout=config["timeout"], read_timeout=config["timeout"],
+            resolver=dns_resolver, dns_cache=dns_cache, session=session, http_resolver=http_resolver,
+            timer=timers[base], scheme="http"
+        ) for base in bases))
+        probed = time.perf_counter()
+        all_stats = await asyncio.gather(*(save_html_files_async(
+            base, reachable, formats, max_concurrent=config["max_concurrent"], rate_limit=config["delay"],
+            output_dir=output_dir, parser=config["parser"], session=session, sem=sem, executor=executor,
+            timer=timers[base]
+        ) for base, reachable in zip(bases, found)))
+        scraped = time.perf_counter()
+        for base, stats in zip(bases, all_stats):
+            write_report(base, stats, formats=formats, output_dir=output_dir, timer=timers[base])
+        reported = time.perf_counter()
+    finally:
+        await session.close()
+        if executor is not None:
+            executor.shutdown()
+    end_usage = usage()
+
+    timer = StageTimer()
+    for base_timer in timers.values():
+        timer.merge(base_timer)
+    candidates = len(bases) * len(suffixes)
+    reachable = sum(len(r) for r in found)
+    pages = reachable - sum(stats["failed"] for stats in all_stats)
+    probe_s = probed - start
+    scrape_s = scraped - probed
+
+    def delta(i):
+        if end_usage[i] is None:
+            return None
+        return round(end_usage[i] - start_usage[i], 3)
+
+    return {
+        "candidates": candidates,
+        "resolved": len(live),
+        "reachable": reachable,
+        "pages_scraped": pages,
+        "probe_s": round(probe_s, 3),
+        "scrape_s": round(scrape_s, 3),
+        "report_s": round(reported - scraped, 3),
+        "total_s": round(reported - start, 3),
+        "probes_per_s": round(candidates / probe_s, 1) if probe_s else None,
+        "pages_per_s": round(pages / scrape_s, 1) if scrape_s else None,
+        "cpu_s": delta(0),
+        "children_cpu_s": delta(1),
+        "peak_rss_mb": round(end_usage[2], 1) if end_usage[2] is not None else None,
+        "children_peak_rss_mb": round(end_usage[3], 1) if end_usage[3] is not None else None,
+        "stages": timer.summary()
+    }
+
+
+async def run_parallel_client(config, port, output_dir, bases, suffixes, live):
+    """
+    Sweeps the farm with parallel.sweep_parallel_async() over config["processes"]
+    worker processes. Probing and scraping overlap there, so only totals are measured.
+    """
+    timers = {}
+    start_usage = usage()
+    start = time.perf_counter()
+    all_stats = await sweep_parallel_async(
+        bases, config["processes"], suffixes, config["formats"], rate_limit=config["delay"], output_dir=output_dir,
+        limit=config["concurrency"], limit_per_host=config["per_host"], max_concurrent=config["max_concurrent"],
+        timeout=config["timeout"], parser=config["parser"], use_cache=False,
+        resolvers=functools.partial(farm_resolvers, live, port), scheme="http", use_dns_cache=False, use_store=False, use_history=False,
+        timers=timers
+    )
+    total_s = time.perf_counter() - start
+    end_usage = usage()
+
+    timer = StageTimer()
+    for base_timer in timers.values():
+        timer.merge(base_timer)
+    candidates = len(bases) * len(suffixes)
+    reachable = sum(stats["total_pinged"] for stats in all_stats.values() if stats)
+    pages = reachable - sum(stats["failed"] for stats in all_stats.values() if stats)
+
+    def delta(i):
+        if end_usage[i] is None:
+            return None
+        return round(end_usage[i] - start_usage[i], 3)
+
+    return {
+        "candidates": candidates,
+        "resolved": len(live),
+        "reachable": reachable,
+        "pages_scraped": pages,
+        "probe_s": None,
+        "scrape_s": None,
+        "report_s": None,
+        "total_s": round(total_s, 3),
+        "probes_per_s": round(candidates / total_s, 1) if total_s else None,
+        "pages_per_s": round(pages / total_s, 1) if total_s else None,
+        "cpu_s": delta(0),
+        "children_cpu_s": delta(1),
+        "peak_rss_mb": round(end_usage[2], 1) if end_usage[2] is not None else None,
+        "children_peak_rss_mb": round(end_usage[3], 1) if end_usage[3] is not None else None,
+        "stages": timer.summary()
+    }
+
+
+def run_benchmark(config, output_dir=None):
+    """
+    Starts the farm in its own process (so its CPU time is not counted), runs the
+    client against it and returns {"config", "environment", "results"}.
+    """
+    ready = multiprocessing.Queue()
+    farm = multiprocessing.Process(target=serve_farm, args=(config, ready), daemon=True)
+    farm.start()
+    try:
+        port = ready.get(timeout=30)
+        # The pinger prints every reachable domain, which would skew the timings
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if output_dir:
+                results = asyncio.run(run_client(config, port, output_dir))
+            else:
+                with tempfile.TemporaryDirectory() as tmp:
+                    results = asyncio.run(run_client(config, port, tmp))
+    finally:
+        farm.terminate()
+        farm.join()
+    return {
+        "config": config,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "results": results
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the probe, scrape and report stages against a local fake web farm (no network needed).")
+    ap.add_argument("--bases", type=int, default=5, help="Number of base names (default: 5)")
+    ap.add_argument("--tlds", type=int, default=400, help="Number of fake TLDs per base (default: 400)")
+    ap.add_argument("--nxdomain-rate", type=float, default=0.6, help="Fraction of names that do not resolve (default: 0.6)")
+    ap.add_argument("--timeout-rate", type=float, default=0.02, help="Fraction of hosts that never answer in time (default: 0.02)")
+    ap.add_argument("--fail-rate", type=float, default=0.1, help="Fraction of hosts answering 404/500/503 (default: 0.1)")
+    ap.add_argument("--redirect-rate", type=float, default=0.1, help="Fraction of hosts that redirect once (default: 0.1)")
+    ap.add_argument("--latency-ms", type=float, default=50, help="Median server latency in ms (default: 50)")
+    ap.add_argument("--latency-sigma", type=float, default=0.8, help="Spread of the log-normal latency (default: 0.8)")
+    ap.add_argument("--page-kb", type=float, default=30, help="Mean page size in KB (default: 30)")
+    ap.add_argument("--hang", type=float, default=30, help="How long timeout hosts stall in seconds (default: 30)")
+    ap.add_argument("--timeout", type=float, default=2, help="Probe connect/read timeout in seconds (default: 2)")
+    ap.add_argument("--concurrency", type=int, default=200, help="Total connection limit (default: 200)")
+    ap.add_argument("--per-host", type=int, default=0, help="Connection limit per host, 0 for none (default: 0)")
+    ap.add_argument("--max-concurrent", type=int, default=50, help="Concurrent page downloads (default: 50)")
+    ap.add_argument("--delay", type=float, default=0, help="Initial delay between requests to one host (default: 0)")
+    ap.add_argument("--parser", choices=PARSERS, default="stream", help="Parser engine (default: stream)")
+    ap.add_argument("--parse-mode", choices=("process", "thread", "inline"), default="process", help="Where pages are parsed (default: process)")
+    ap.add_argument("--processes", type=int, default=1, help="Worker processes; more than 1 uses parallel.py (default: 1)")
+    ap.add_argument("--formats", default="txt,json", help="Comma-separated output formats (default: txt,json)")
+    ap.add_argument("--seed", type=int, default=1, help="Seed for the farm layout and latencies (default: 1)")
+    ap.add_argument("--keep-output", help="Keep the scraped files and reports in this folder")
+    ap.add_argument("--output", help="Write the results as JSON to this file")
+    args = ap.parse_args(argv)
+
+    config = {
+        "bases": args.bases,
+        "tlds": args.tlds,
+        "nxdomain_rate": args.nxdomain_rate,
+        "timeout_rate": args.timeout_rate,
+        "fail_rate": args.fail_rate,
+        "redirect_rate": args.redirect_rate,
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "page_kb": args.page_kb,
+        "hang": args.hang,
+        "timeout": args.timeout,
+        "concurrency": args.concurrency,
+        "per_host": args.per_host,
+        "max_concurrent": args.max_concurrent,
+        "delay": args.delay,
+        "parser": args.parser,
+        "parse_mode": args.parse_mode,
+        "processes": args.processes,
+        "formats": [f.strip() for f in args.formats.split(",") if f.strip()],
+        "seed": args.seed
+    }
+    run = run_benchmark(config, args.keep_output)
+    results = run["results"]
+    print(f"{results['candidates']} candidates, {results['resolved']} resolved, {results['reachable']} reachable, {results['pages_scraped']} pages scraped")
+    if results["probe_s"] is None:
+        print(f"total {results['total_s']}s ({results['probes_per_s']} candidates/s, {results['pages_per_s']} pages/s)")
+    else:
+        print(f"probe {results['probe_s']}s ({results['probes_per_s']}/s), scrape {results['scrape_s']}s ({results['pages_per_s']} pages/s), report {results['report_s']}s")
+    print(f"CPU {results['cpu_s']}s (+{results['children_cpu_s']}s in workers), peak RSS {results['peak_rss_mb']} MB")
+    for stage, summary in results["stages"].items():
+        print(f"  {stage:<9} n={summary['count']:<6} p50={summary['p50'] * 1000:.1f}ms p95={summary['p95'] * 1000:.1f}ms p99={summary['p99'] * 1000:.1f}ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import argparse
+import glob
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs import LXML_AVAILABLE, PARSERS, extract_elements
+
+
+def load_corpus(path):
+    """
+    Returns a list of (name, html) for every .html or .html.gz file under `path`
+    (e.g. an output folder saved with the HTML format).
+    """
+    pages = []
+    files = glob.glob(os.path.join(path, "**", "*.html"), recursive=True)
+    files += glob.glob(os.path.join(path, "**", "*.html.gz"), recursive=True)
+    for file in sorted(files):
+        opener = gzip.open if file.endswith(".gz") else open
+        with opener(file, "rt", encoding="utf-8", errors="replace") as f:
+            pages.append((os.path.relpath(file, path), f.read()))
+    return pages
+
+
+def bench_parser(pages, parser, tags, repeat=3):
+    """
+    Times extract_elements() with `parser` on every page (best of `repeat` runs) and
+    measures the peak memory allocated while parsing each page.
+    """
+    times = []
+    peaks = []
+    for _, html in pages:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extract_elements(html, tags, parser)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times.append(best)
+        tracemalloc.start()
+        extract_elements(html, tags, parser)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "parser": parser,
+        "pages": len(pages),
+        "total_s": round(sum(times), 4),
+        "mean_ms": round(statistics.mean(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "max_ms": round(max(times) * 1000, 3),
+        "mean_peak_kb": round(statistics.mean(peaks) / 1024, 1),
+        "max_peak_kb": round(max(peaks) / 1024, 1)
+    }
+
+
+def check_identical(pages, parser, tags):
+    """
+    Returns the names of pages where `parser` extracts something different from html.parser.
+    """
+    return [name for name, html in pages
+            if extract_elements(html, tags, parser) != extract_elements(html, tags, "html.parser")]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare the parser engines of bs.extract_elements() on a corpus of saved pages.")
+    ap.add_argument("corpus", help="Folder with saved .html or .html.gz pages (searched recursively)")
+    ap.add_argument("--parsers", default=",".join(PARSERS), help="Comma-separated parser engines (default: all)")
+    ap.add_argument("--tags", default="", help="Comma-separated tags to extract (default: h1-h6,p)")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs per page, the best is kept (default: 3)")
+    ap.add_argument("--output", help="Write the results as JSON to this file")
+    args = ap.parse_args(argv)
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        print(f"No .html or .html.gz files found in {args.corpus}")
+        return 1
+    tags = [t.strip() for t in args.tags.split(",") if t.strip()] or None
+    parsers = [p.strip() for p in args.parsers.split(",") if p.strip()]
+    if "lxml" in parsers and not LXML_AVAILABLE:
+        print("lxml is not installed, skipping it.")
+        parsers.remove("lxml")
+
+    results = []
+    print(f"{'parser':<12} {'pages':>6} {'mean ms':>9} {'median ms':>10} {'max ms':>9} {'peak KB':>9} {'max peak KB':>12} {'differs':>8}")
+    for parser in parsers:
+        result = bench_parser(pages, parser, tags, args.repeat)
+        result["differs_from_html_parser"] = check_identical(pages, parser, tags) if parser != "html.parser" else []
+        results.append(result)
+        print(f"{parser:<12} {result['pages']:>6} {result['mean_ms']:>9} {result['median_ms']:>10} {result['max_ms']:>9} "
+              f"{result['mean_peak_kb']:>9} {result['max_peak_kb']:>12} {len(result['differs_from_html_parser']):>8}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"corpus": args.corpus, "tags": tags, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
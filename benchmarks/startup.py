@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules timed on their own; gui and cli are what main.py loads for each mode
+MODULES = ("gui", "cli", "tlds", "bs", "pinger")
+# Prints the seconds from the start of the child to when its GUI window is shown
+_WINDOW_SCRIPT = """
+import time
+start = time.perf_counter()
+import gui
+
+def ready(root):
+    root.update()
+    print(time.perf_counter() - start, flush=True)
+    root.destroy()
+
+gui.start_gui(on_ready=ready)
+"""
+
+
+def run_child(args, timeout=60):
+    """
+    Runs `python args` in a fresh interpreter in the repository root and returns
+    (wall seconds until it exits, stdout, stderr), or None if it fails.
+    """
+    start = time.perf_counter()
+    try:
+        done = subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    wall = time.perf_counter() - start
+    if done.returncode != 0:
+        return None
+    return wall, done.stdout, done.stderr
+
+
+def parse_importtime(stderr):
+    """
+    Returns {module: (self us, cumulative us)} from the output of python -X importtime.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def bench_import(module, repeat=5, top=5):
+    """
+    Imports `module` in `repeat` fresh interpreters. Returns the median import time,
+    the median wall time of the whole process and the `top` modules that took
+    longest to import themselves (from the last run), or None if the import fails.
+    """
+    import_ms = []
+    wall_ms = []
+    times = {}
+    # The first run only writes the bytecode caches
+    runs = [run_child(["-X", "importtime", "-c", f"import {module}"]) for _ in range(repeat + 1)][1:]
+    for run in runs:
+        if run is None:
+            return None
+        wall, _, stderr = run
+        times = parse_importtime(stderr)
+        import_ms.append(times[module][1] / 1000)
+        wall_ms.append(wall * 1000)
+    heaviest = sorted(times.items(), key=lambda item: -item[1][0])[:top]
+    return {
+        "module": module,
+        "import_ms": round(statistics.median(import_ms), 1),
+        "process_ms": round(statistics.median(wall_ms), 1),
+        "heaviest": [{"module": name, "self_ms": round(self_us / 1000, 1)} for name, (self_us, _) in heaviest],
+    }
+
+
+def bench_first_window(repeat=3):
+    """
+    Returns the median milliseconds from interpreter start to the GUI window being
+    shown, or None if there is no display (or Tk is missing).
+    """
+    times = []
+    for _ in range(repeat):
+        run = run_child(["-c", _WINDOW_SCRIPT])
+        if run is None:
+            return None
+        _, stdout, _ = run
+        times.append(float(stdout.split()[-1]) * 1000)
+    return round(statistics.median(times), 1)
+
+
+def bench_tld_index(repeat=20):
+    """
+    Returns the median milliseconds to read the compiled TLD index from disk.
+    """
+    sys.path.insert(0, ROOT)
+    import tlds
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tlds.read_index()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 2)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Measure import times and time-to-first-window, each in fresh interpreters.")
+    ap.add_argument("--modules", default=",".join(MODULES), help=f"Comma-separated modules to time (default: {','.join(MODULES)})")
+    ap.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the median is kept (default: 5)")
+    ap.add_argument("--max-import-ms", type=float, help="Exit with status 1 if any module takes longer to import")
+    ap.add_argument("--max-window-ms", type=float, help="Exit with status 1 if the GUI window takes longer to appear")
+    ap.add_argument("--output", help="Write the results as JSON to this file")
+    args = ap.parse_args(argv)
+
+    failures = []
+    imports = []
+    print(f"{'module':<10} {'import ms':>10} {'process ms':>11}  heaviest imports")
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        result = bench_import(module, args.repeat)
+        if result is None:
+            print(f"{module:<10} {'failed':>10}")
+            failures.append(f"import {module} failed")
+            continue
+        imports.append(result)
+        heaviest = ", ".join(f"{h['module']} {h['self_ms']}" for h in result["heaviest"])
+        print(f"{module:<10} {result['import_ms']:>10} {result['process_ms']:>11}  {heaviest}")
+        if args.max_import_ms is not None and result["import_ms"] > args.max_import_ms:
+            failures.append(f"import {module} took {result['import_ms']} ms (max {args.max_import_ms})")
+
+    window_ms = bench_first_window(max(1, args.repeat // 2))
+    if window_ms is None:
+        print("Time to first window: not measured (no display)")
+    else:
+        print(f"Time to first window: {window_ms} ms")
+        if args.max_window_ms is not None and window_ms > args.max_window_ms:
+            failures.append(f"first window took {window_ms} ms (max {args.max_window_ms})")
+    tld_index_ms = bench_tld_index()
+    print(f"TLD index load: {tld_index_ms} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "imports": imports, "first_window_ms": window_ms, "tld_index_ms": tld_index_ms, "failures": failures}, f, indent=2)
+    for failure in failures:
+        print(f"Regression: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import codecs
+import gzip
+import os
+import re
+
+# Bodies are cut off after this many bytes unless the caller asks for another cap
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024  # 5 MB
+CHUNK_SIZE = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_:.-]+)""", re.IGNORECASE)
+
+
+def detect_charset(declared, head):
+    """
+    Picks the encoding of a body from its first chunk `head`: a byte order mark wins,
+    then the charset `declared` in the Content-Type header, then a <meta> charset near
+    the start of the document, otherwise UTF-8.
+    """
+    for bom, name in _BOMS:
+        if head.startswith(bom):
+            return name
+    candidates = [declared]
+    match = _META_CHARSET.search(head[:4096])
+    if match:
+        candidates.append(match.group(1).decode("ascii"))
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+class RawWriter:
+    """
+    Writes a raw body to `path` (gzip-compressed if `compress`) while it is downloaded.
+    Data goes to path.part first; commit() moves it into place, discard() removes it.
+    """
+
+    def __init__(self, path, compress=False):
+        self.path = path
+        self.part = path + ".part"
+        self.file = gzip.open(self.part, "wb") if compress else open(self.part, "wb")
+
+    def write(self, chunk):
+        self.file.write(chunk)
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.part, self.path)
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.part)
+        except OSError:
+            pass
+
+
+class BodyDecoder:
+    """
+    Incrementally decodes a body from its chunks, stopping after `max_bytes`. The
+    charset is detected on the first chunk. Only the decoded text is kept, never the
+    whole body twice.
+    """
+
+    def __init__(self, declared_charset=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.declared = declared_charset
+        self.max_bytes = max_bytes
+        self.decoder = None
+        self.encoding = None
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+
+    def feed(self, chunk):
+        """
+        Adds a chunk and returns the part of it that was accepted; once the cap is
+        reached `truncated` is set and reading should stop.
+        """
+        if self.max_bytes and self.size + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.size]
+            self.truncated = True
+        if self.decoder is None:
+            self.encoding = detect_charset(self.declared, chunk)
+            self.decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        self.size += len(chunk)
+        self.parts.append(self.decoder.decode(chunk))
+        return chunk
+
+    def text(self):
+        if self.decoder is None:
+            return ""
+        self.parts.append(self.decoder.decode(b"", final=True))
+        return "".join(self.parts)
+
+
+async def read_response(response, max_bytes=DEFAULT_MAX_BYTES, sink=None, run=None):
+    """
+    Reads an aiohttp response as a stream of chunks and returns (text, truncated).
+    The raw chunks are also written to `sink` (e.g. a RawWriter); with `run` (a
+    coroutine function such as FileSink.run) the writes happen off the event loop.
+    """
+    body = BodyDecoder(response.charset, max_bytes)
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        chunk = body.feed(chunk)
+        if sink is not None:
+            if run is not None:
+                await run(sink.write, chunk)
+            else:
+                sink.write(chunk)
+        if body.truncated:
+            break
+    return body.text(), body.truncated
+
+
+def read_requests_response(response, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Same as read_response() for a requests response opened with stream=True.
+    """
+    declared = None
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        declared = response.encoding
+    body = BodyDecoder(declared, max_bytes)
+    for chunk in response.iter_content(CHUNK_SIZE):
+        body.feed(chunk)
+        if body.truncated:
+            break
+    response.close()
+    return body.text(), body.truncated
+
+
+def write_raw(path, text, compress=False):
+    """
+    Writes an already decoded page to `path` as UTF-8, gzip-compressed if `compress`.
+    """
+    if compress:
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
@@ -1,149 +1,520 @@
 
 import os
 import asyncio
+import importlib.util
 import aiohttp
-from bs4 import BeautifulSoup
 import time
 import json
+import contextlib
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pinger import build_candidates, fetch_website_details, get_all_tlds
+from probestore import is_definite
+from tldrank import rank_suffixes
+from htmlstream import PARSERS, extract_elements_stream
+from httpcache import content_hash
+from body import DEFAULT_MAX_BYTES, RawWriter, read_response, write_raw
+from throttle import HostThrottle
+from timing import trace_config
+from dedup import Deduplicator
 
+# Checked without importing lxml; it is only loaded by the first page parsed with it
+LXML_AVAILABLE = importlib.util.find_spec("lxml") is not None
 
+# Fields of the extract_page() dict
+EXTRACT_FIELDS = ("title", "meta_description", "og_description", "json_ld", "tags", "keywords", "sentiment")
+# A page with none of these is counted as not useful instead of saved
+USEFUL_FIELDS = ("title", "meta_description", "og_description", "json_ld", "tags")
 
-async def fetch_and_save(session, sem, base, suffix, url, log_callback, stats, headers, formats, tags_to_scrape=None, retries=3, rate_limit=0.5):
+
+
+def extract_elements(text, tags_to_scrape=None, parser="html.parser"):
+    """
+    Extracts (title, meta_description, og_description, json_ld, tags) from an HTML document
+    with the given parser engine: "html.parser" or "lxml" (full BeautifulSoup tree) or
+    "stream" (targeted streaming extractor, same output as "html.parser").
+    """
+    tags = tags_to_scrape if tags_to_scrape else ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p']
+    if parser == "stream":
+        return extract_elements_stream(text, tags)
+    from bs4 import BeautifulSoup
+
+    if parser == "lxml" and not LXML_AVAILABLE:
+        parser = "html.parser"
+    soup = BeautifulSoup(text, parser)
+
+    title = soup.title.string.strip() if soup.title and soup.title.string else ""
+    meta_desc = soup.find("meta", attrs={"name": "description"})
+    meta_desc_val = meta_desc['content'].strip() if meta_desc and meta_desc.get("content") else ""
+    og_desc = soup.find("meta", attrs={"property": "og:description"})
+    og_desc_val = og_desc['content'].strip() if og_desc and og_desc.get("content") else ""
+    json_ld = []
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string)
+            json_ld.append(data)
+        except Exception:
+            pass
+    h_tags = []
+    for tag in soup.find_all(tags):
+        t = tag.get_text(strip=True)
+        if t:
+            h_tags.append({"tag": tag.name, "text": t})
+    return title, meta_desc_val, og_desc_val, json_ld, h_tags
+
+def extract_page(text, tags_to_scrape=None, parser="html.parser"):
+    """
+    Extracts the important elements (title, meta/og descriptions, JSON-LD and the text
+    of `tags_to_scrape`) from an HTML document. "keywords" and "sentiment" are left
+    empty; they are filled in for all pages of a run at once by nlp.analyze_pages_async().
+    Pure function of its arguments so it can run in a worker process.
+    """
+    return page_dict(*extract_elements(text, tags_to_scrape, parser))
+
+def extract_page_timed(text, tags_to_scrape=None, parser="html.parser"):
+    """
+    Same as extract_page(), but returns (extracted, parse_seconds) so the time spent in
+    the parser can be reported.
+    """
+    start = time.perf_counter()
+    extracted = extract_page(text, tags_to_scrape, parser)
+    return extracted, time.perf_counter() - start
+
+def page_dict(title, meta_desc_val, og_desc_val, json_ld, h_tags):
+    """
+    Returns the extract_page() dict for the output of extract_elements().
+    """
+    return {
+        "title": title,
+        "meta_description": meta_desc_val,
+        "og_description": og_desc_val,
+        "json_ld": json_ld,
+        "tags": h_tags,
+        "keywords": [],
+        "sentiment": None
+    }
+
+def page_paths(base, suffix, output_dir=None, raw_gzip=False):
+    """
+    Returns (folder, base_filename, raw_path) for the files of one page, creating
+    output_dir/base if needed. The raw page is base-suffix.html (or .html.gz).
+    """
+    folder = output_dir if output_dir else base
+    folder = os.path.join(folder, base)
+    os.makedirs(folder, exist_ok=True)
+    base_filename = f"{base}-{suffix.lstrip('.')}"
+    return folder, base_filename, os.path.join(folder, base_filename + (".html.gz" if raw_gzip else ".html"))
+
+def wants_raw(formats):
+    # The JSON format refers to the raw page file instead of embedding it
+    return 'html' in formats or 'json' in formats
+
+def write_page(base, suffix, url, text, extracted, log_callback, stats, formats, output_dir=None, skip_existing=False, raw_written=False, raw_gzip=False):
+    """
+    Saves the result of extract_page() in the requested formats to
+    output_dir/base/base-suffix.*, updating `stats`: one "saved" per page (however
+    many files it has), or "not_useful" if none of USEFUL_FIELDS has a value, as in
+    sink.ShardSink.
+    With skip_existing (used when the page is known to be unchanged), files that already
+    exist are kept as they are instead of being rewritten.
+    The raw page is written for the html and json formats (gzip-compressed with
+    raw_gzip), unless the caller already streamed it to disk (raw_written) or there is
+    no raw page (`text` is None).
+    """
+    # Prepare data for all formats
+    folder, base_filename, raw_path = page_paths(base, suffix, output_dir, raw_gzip)
+
+    title = extracted["title"]
+    meta_desc_val = extracted["meta_description"]
+    og_desc_val = extracted["og_description"]
+    json_ld = extracted["json_ld"]
+    h_tags = extracted["tags"]
+    keywords = extracted["keywords"]
+    sentiment = extracted["sentiment"]
+
+    # Save TXT (summary)
+    if 'txt' in formats:
+        lines = []
+        if title:
+            lines.append(f"[title] {title}")
+        if meta_desc_val:
+            lines.append(f"[meta description] {meta_desc_val}")
+        if og_desc_val:
+            lines.append(f"[og:description] {og_desc_val}")
+        for item in json_ld:
+            lines.append(f"[json-ld] {json.dumps(item, ensure_ascii=False, indent=2)}")
+        for h in h_tags:
+            lines.append(f"[{h['tag']}] {h['text']}")
+        if keywords:
+            lines.append("[keywords] " + ', '.join(keywords))
+        if sentiment:
+            lines.append(f"[sentiment] polarity={sentiment['polarity']:.2f}, subjectivity={sentiment['subjectivity']:.2f}")
+        if lines:
+            txt_path = os.path.join(folder, base_filename + ".txt")
+            if skip_existing and os.path.exists(txt_path):
+                msg = f"Unchanged, kept summary TXT {txt_path}"
+            else:
+                with open(txt_path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(lines))
+                msg = f"Saved summary TXT to {txt_path}"
+            if log_callback:
+                log_callback(msg)
+
+    # Save HTML (raw HTML), also referenced from the JSON
+    has_raw = raw_written or text is not None
+    if wants_raw(formats) and has_raw:
+        if raw_written:
+            msg = f"Saved raw HTML to {raw_path}"
+        elif skip_existing and os.path.exists(raw_path):
+            msg = f"Unchanged, kept raw HTML {raw_path}"
+        else:
+            write_raw(raw_path, text, raw_gzip)
+            msg = f"Saved raw HTML to {raw_path}"
+        if 'html' in formats and log_callback:
+            log_callback(msg)
+
+    # Save JSON (full structured data)
+    if 'json' in formats:
+        data = {
+            "url": url,
+            "title": title,
+            "meta_description": meta_desc_val,
+            "og_description": og_desc_val,
+            "json_ld": json_ld,
+            "tags": h_tags,
+            "keywords": keywords,
+            "sentiment": sentiment,
+            "raw_html_file": os.path.basename(raw_path) if has_raw else None
+        }
+        json_path = os.path.join(folder, base_filename + ".json")
+        if skip_existing and os.path.exists(json_path):
+            msg = f"Unchanged, kept JSON {json_path}"
+        else:
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            msg = f"Saved JSON to {json_path}"
+        if log_callback:
+            log_callback(msg)
+
+    useful = any(extracted[field] for field in USEFUL_FIELDS)
+    stats["saved" if useful else "not_useful"] += 1
+
+class FileSink:
+    """
+    Writes pages in the per-file layout (see write_page()) from one background thread,
+    so the event loop never waits for the disk. Pages are queued with put(); other
+    blocking file operations can be run on the same thread with run().
+    """
+    # Raw pages are streamed to their own files while downloading
+    raw_files = True
+
+    def __init__(self, output_dir=None, formats=("txt",), log_callback=None, raw_gzip=False):
+        self.output_dir = output_dir
+        self.formats = formats
+        self.log_callback = log_callback
+        self.raw_gzip = raw_gzip
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def put(self, base, suffix, url, text, extracted, stats, skip_existing=False, raw_written=False, timer=None, done=None):
+        """
+        Queues a page for writing. `done` (if given) is called on the writer thread
+        with the statistics the page added once it is written.
+        """
+        self.executor.submit(self.write, base, suffix, url, text, extracted, stats, skip_existing, raw_written, timer, done)
+
+    def write(self, base, suffix, url, text, extracted, stats, skip_existing, raw_written, timer, done):
+        try:
+            page_stats = {"saved": 0, "not_useful": 0}
+            with timed(timer, "write", urlparse(url).hostname):
+                write_page(base, suffix, url, text, extracted, self.log_callback, page_stats, self.formats, self.output_dir, skip_existing, raw_written, self.raw_gzip)
+            for key, value in page_stats.items():
+                stats[key] += value
+            if done is not None:
+                done(page_stats)
+        except Exception as e:
+            if self.log_callback:
+                self.log_callback(f"Error writing {url}: {e}")
+
+    def update(self, base, suffix, url, extracted):
+        """
+        Rewrites the TXT and JSON files of an already written page with new keywords
+        and sentiment (see nlp.analyze_pages_async()).
+        """
+        self.executor.submit(self.rewrite, base, suffix, url, extracted)
+
+    def rewrite(self, base, suffix, url, extracted):
+        try:
+            folder, base_filename, raw_path = page_paths(base, suffix, self.output_dir)
+            # Files that exist from an earlier run are updated too
+            formats = [fmt for fmt in ("txt", "json") if fmt in self.formats or os.path.exists(os.path.join(folder, f"{base_filename}.{fmt}"))]
+            raw_gzip = os.path.exists(raw_path + ".gz")
+            raw_written = raw_gzip or os.path.exists(raw_path)
+            write_page(base, suffix, url, None, extracted, None, {"saved": 0, "not_useful": 0}, formats, self.output_dir, raw_written=raw_written, raw_gzip=raw_gzip)
+        except Exception as e:
+            if self.log_callback:
+                self.log_callback(f"Error updating {url}: {e}")
+
+    def open_raw(self, base, suffix):
+        """
+        Returns a RawWriter for the raw page file; call it through run().
+        """
+        return RawWriter(page_paths(base, suffix, self.output_dir, self.raw_gzip)[2], self.raw_gzip)
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def drain(self):
+        """
+        Waits until everything queued so far has been written.
+        """
+        await self.run(lambda: None)
+
+    def close(self):
+        self.executor.shutdown()
+
+def make_parse_executor(parse_mode="process", parse_workers=None):
+    """
+    Returns the executor used for extract_page(): a ProcessPoolExecutor ("process"),
+    a ThreadPoolExecutor ("thread"), or None to parse on the event loop ("inline").
+    """
+    if parse_mode == "process":
+        return ProcessPoolExecutor(max_workers=parse_workers)
+    if parse_mode == "thread":
+        return ThreadPoolExecutor(max_workers=parse_workers)
+    return None
+
+async def extract_async(executor, text, tags_to_scrape=None, parser="html.parser", timer=None, host=None):
+    """
+    Runs extract_page() in `executor` (on the event loop if None) and adds the parse
+    time to `timer` (a timing.StageTimer) if given.
+    """
+    if executor is not None:
+        extracted, parse_time = await asyncio.get_running_loop().run_in_executor(executor, extract_page_timed, text, tags_to_scrape, parser)
+    else:
+        extracted, parse_time = extract_page_timed(text, tags_to_scrape, parser)
+    if timer is not None:
+        timer.add("parse", parse_time, host)
+    return extracted
+
+async def analyze_and_update(pages, executor, sink, timer=None, cache=None):
+    """
+    Runs the NLP stage over the (base, suffix, url, extracted) `pages` of a run and
+    has `sink` update their files with the results. Pages that already carry the
+    results (unchanged pages whose extraction came from the HTTP cache) are left as
+    they are; they only count for the TF-IDF of the others. The results are stored
+    in `cache` (an httpcache.HttpCache) too, so the next run can reuse them.
+    """
+    if not pages:
+        return
+    from nlp import analyze_pages_async
+
+    with timed(timer, "nlp"):
+        analysed = await analyze_pages_async([extracted for _, _, _, extracted in pages], executor, keep_analysed=True)
+    analysed = {id(extracted) for extracted in analysed}
+    updated = [(base, suffix, url, extracted) for base, suffix, url, extracted in pages if id(extracted) in analysed]
+    for base, suffix, url, extracted in updated:
+        sink.update(base, suffix, url, extracted)
+    if cache is not None and updated:
+        cache.update_extracted([(url, extracted) for _, _, url, extracted in updated])
+
+async def discard_alias(sink, raw, log_callback, url, original):
+    if raw is not None:
+        await sink.run(raw.discard)
+    if log_callback:
+        log_callback(f"{url} is the same site as {original}, not saved")
+
+def count(stats, counts, key):
+    # Counts in the run statistics and in the statistics of the page
+    stats[key] += 1
+    counts[key] = counts.get(key, 0) + 1
+
+def journal_done(journal, suffix, url, counts, final_url, extracted):
+    """
+    Returns the `done` callback for FileSink.put() that records a written page in
+    `journal`, or None without a journal.
+    """
+    if journal is None:
+        return None
+
+    def done(page_stats):
+        page_counts = dict(counts)
+        for key, value in page_stats.items():
+            page_counts[key] = page_counts.get(key, 0) + value
+        journal.page(suffix, url, page_counts, final_url, extracted)
+    return done
+
+def resume_pages(journal, base, domains, stats, dedup=None, pages=None):
+    """
+    Restores the pages `journal` recorded in an interrupted run: adds their statistics
+    to `stats`, replays them through `dedup` and into `pages` (for the NLP stage) in
+    the order they completed, and returns the (suffix, url) `domains` still to do.
+    """
+    journal.restore_stats(stats)
+    for suffix, entry in journal.pages.items():
+        if dedup is not None:
+            if "alias" in entry:
+                dedup.aliases[suffix] = entry["alias"]
+            elif "extracted" in entry:
+                dedup.check_redirect(suffix, entry["url"], entry.get("final_url"))
+                dedup.check_content(suffix, entry["url"], entry["extracted"])
+        if pages is not None and "extracted" in entry:
+            pages.append((base, suffix, entry["url"], entry["extracted"]))
+    return [(suffix, url) for suffix, url in domains if suffix not in journal.pages]
+
+def timed(timer, stage, host=None):
+    return timer.measure(stage, host) if timer is not None else contextlib.nullcontext()
+
+async def fetch_and_save(session, sem, base, suffix, url, log_callback, stats, headers, formats, tags_to_scrape=None, retries=3, rate_limit=0.5, executor=None, parser="html.parser", cache=None, throttle=None, timer=None, max_bytes=DEFAULT_MAX_BYTES, sink=None, pages=None, dedup=None, journal=None, on_page=None):
     # Only log successful fetches/saves, not every attempt
+    # With a throttle.HostThrottle, politeness is per host (token bucket, adaptive
+    # concurrency, Retry-After, jittered backoff) instead of fixed sleeps
+    # With a timing.StageTimer, queueing, request phases, parsing and writing are timed
+    # The body is streamed (at most `max_bytes`); results go to `sink` (FileSink or
+    # sink.ShardSink), which does all disk I/O on its own thread
+    # Saved pages are appended to `pages` (if given) for the NLP stage
+    # With a dedup.Deduplicator, pages that redirect to or duplicate an earlier page of
+    # the base are recorded as aliases and not stored
+    # With a journal.Journal, the outcome and the statistics it added are recorded once
+    # the page is done
+    # With `on_page`, await on_page(final_url, text) runs for every stored page (the
+    # crawler takes its links from there)
+    host = urlparse(url).hostname
+    counts = {}
+    trace_ctx = {"timer": timer, "host": host} if timer is not None else None
     attempt = 0
     while attempt < retries:
+        retry_after = None
+        raw = None
         try:
-            async with sem:
-                async with session.get(url, headers=headers, timeout=10) as response:
-                    if response.status != 200:
-                        raise aiohttp.ClientError(f"Status {response.status}")
-                    text = await response.text()
-                    soup = BeautifulSoup(text, "html.parser")
-
-                    # Prepare data for all formats
-                    folder = fetch_and_save.output_dir if hasattr(fetch_and_save, 'output_dir') and fetch_and_save.output_dir else base
-                    folder = os.path.join(folder, base)
-                    os.makedirs(folder, exist_ok=True)
-                    base_filename = f"{base}-{suffix.lstrip('.')}"
-
-                    # Extracted data for JSON
-                    title = soup.title.string.strip() if soup.title and soup.title.string else ""
-                    meta_desc = soup.find("meta", attrs={"name": "description"})
-                    meta_desc_val = meta_desc['content'].strip() if meta_desc and meta_desc.get("content") else ""
-                    og_desc = soup.find("meta", attrs={"property": "og:description"})
-                    og_desc_val = og_desc['content'].strip() if og_desc and og_desc.get("content") else ""
-                    json_ld = []
-                    for script in soup.find_all('script', type='application/ld+json'):
-                        try:
-                            data = json.loads(script.string)
-                            json_ld.append(data)
-                        except Exception:
-                            pass
-                    all_text = []
-                    h_tags = []
-                    tags = tags_to_scrape if tags_to_scrape else ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p']
-                    for tag in soup.find_all(tags):
-                        t = tag.get_text(strip=True)
-                        if t:
-                            h_tags.append({"tag": tag.name, "text": t})
-                            all_text.append(t)
-                    # Keyword extraction
-                    keywords = []
+            entry = cache.get(url) if cache is not None else None
+            request_headers = dict(headers, **cache.conditional_headers(entry)) if entry else headers
+            etag = last_modified = None
+            queued = time.perf_counter()
+            # The host's slot and token come first, so a task waiting on a throttled host
+            # (rate, Retry-After, backoff, Crawl-delay) does not hold a download slot
+            async with (throttle.slot(host) if throttle is not None else contextlib.nullcontext()):
+                async with sem:
+                    if timer is not None:
+                        timer.add("queue", time.perf_counter() - queued, host)
+                    start = time.monotonic()
                     try:
-                        from collections import Counter
-                        import re
-                        words = re.findall(r'\b\w{4,}\b', ' '.join(all_text).lower())
-                        common = Counter(words).most_common(10)
-                        keywords = [w for w, _ in common]
-                    except Exception:
-                        pass
-                    # Sentiment analysis
-                    sentiment = None
-                    try:
-                        from textblob import TextBlob
-                        blob = TextBlob(' '.join(all_text))
-                        sentiment = {
-                            "polarity": round(blob.sentiment.polarity, 2),
-                            "subjectivity": round(blob.sentiment.subjectivity, 2)
-                        }
-                    except Exception:
-                        pass
-
-                    # Save TXT (summary)
-                    if 'txt' in formats:
-                        lines = []
-                        if title:
-                            lines.append(f"[title] {title}")
-                        if meta_desc_val:
-                            lines.append(f"[meta description] {meta_desc_val}")
-                        if og_desc_val:
-                            lines.append(f"[og:description] {og_desc_val}")
-                        for item in json_ld:
-                            lines.append(f"[json-ld] {json.dumps(item, ensure_ascii=False, indent=2)}")
-                        for h in h_tags:
-                            lines.append(f"[{h['tag']}] {h['text']}")
-                        if keywords:
-                            lines.append("[keywords] " + ', '.join(keywords))
-                        if sentiment:
-                            lines.append(f"[sentiment] polarity={sentiment['polarity']:.2f}, subjectivity={sentiment['subjectivity']:.2f}")
-                        if not lines:
-                            stats["not_useful"] += 1
-                        else:
-                            txt_path = os.path.join(folder, base_filename + ".txt")
-                            with open(txt_path, "w", encoding="utf-8") as f:
-                                f.write("\n".join(lines))
-                            msg = f"Saved summary TXT to {txt_path}"
-                            if log_callback:
-                                log_callback(msg)
-                            stats["saved"] += 1
-
-                    # Save JSON (full structured data)
-                    if 'json' in formats:
-                        data = {
-                            "url": url,
-                            "title": title,
-                            "meta_description": meta_desc_val,
-                            "og_description": og_desc_val,
-                            "json_ld": json_ld,
-                            "tags": h_tags,
-                            "keywords": keywords,
-                            "sentiment": sentiment,
-                            "raw_html": text
-                        }
-                        json_path = os.path.join(folder, base_filename + ".json")
-                        with open(json_path, "w", encoding="utf-8") as f:
-                            json.dump(data, f, ensure_ascii=False, indent=2)
-                        msg = f"Saved JSON to {json_path}"
-                        if log_callback:
-                            log_callback(msg)
-                        stats["saved"] += 1
-
-                    # Save HTML (raw HTML)
-                    if 'html' in formats:
-                        html_path = os.path.join(folder, base_filename + ".html")
-                        with open(html_path, "w", encoding="utf-8") as f:
-                            f.write(text)
-                        msg = f"Saved raw HTML to {html_path}"
-                        if log_callback:
-                            log_callback(msg)
-                        stats["saved"] += 1
-
-                    # If nothing was saved, count as not useful
-                    if not any(fmt in formats for fmt in ['txt', 'json', 'html']):
-                        stats["not_useful"] += 1
+                        async with session.get(url, headers=request_headers, timeout=10, trace_request_ctx=trace_ctx) as response:
+                            if response.status != 200 and response.status != 304:
+                                retry_after = response.headers.get("Retry-After")
+                            if throttle is not None:
+                                throttle.record(host, response.status, time.monotonic() - start, retry_after=retry_after)
+                            if response.status == 304 and entry:
+                                text = None
+                            elif response.status != 200:
+                                raise aiohttp.ClientError(f"Status {response.status}")
+                            else:
+                                if sink.raw_files and wants_raw(formats):
+                                    raw = await sink.run(sink.open_raw, base, suffix)
+                                with timed(timer, "download", host):
+                                    text, truncated = await read_response(response, max_bytes, raw, sink.run)
+                                if truncated and log_callback:
+                                    log_callback(f"Body of {url} cut off after {max_bytes} bytes")
+                            final_url = str(response.url)
+                            etag = response.headers.get("ETag")
+                            last_modified = response.headers.get("Last-Modified")
+                    except asyncio.TimeoutError:
+                        if throttle is not None:
+                            throttle.record(host, timeout=True)
+                        raise
+            if dedup is not None:
+                original = dedup.check_redirect(suffix, url, final_url)
+                if original:
+                    await discard_alias(sink, raw, log_callback, url, original)
+                    if journal is not None:
+                        journal.page(suffix, url, counts, final_url, alias=dedup.aliases[suffix])
+                    return
+            raw_written = raw is not None
+            extracted = None
+            cached = False
+            if cache is not None:
+                extract_key = json.dumps([tags_to_scrape, parser])
+                hash_ = content_hash(text) if text is not None else None
+                if entry and (text is None or hash_ == entry["content_hash"]):
+                    # Not modified (304) or same body as last time: reuse the previous extraction
+                    count(stats, counts, "cache_revalidated" if text is None else "cache_hits")
+                    cache.touch(url, etag, last_modified)
+                    text = entry["text"]
+                    if entry["extract_key"] == extract_key:
+                        extracted = entry["extracted"]
+                        cached = True
+                else:
+                    count(stats, counts, "cache_misses")
+            if extracted is None:
+                # The network slot is released here; parsing runs in `executor` so a large page
+                # does not stall the other downloads
+                extracted = await extract_async(executor, text, tags_to_scrape, parser, timer, host)
+                if cache is not None:
+                    cache.put(url, text, extracted, extract_key, etag, last_modified, hash_)
+            if dedup is not None:
+                original = dedup.check_content(suffix, url, extracted)
+                if original:
+                    await discard_alias(sink, raw, log_callback, url, original)
+                    if journal is not None:
+                        journal.page(suffix, url, counts, final_url, alias=dedup.aliases[suffix])
                     return
+            if raw_written:
+                await sink.run(raw.commit)
+                raw = None
+            done = journal_done(journal, suffix, url, counts, final_url, extracted)
+            sink.put(base, suffix, url, text, extracted, stats, skip_existing=cached, raw_written=raw_written, timer=timer, done=done)
+            if pages is not None:
+                pages.append((base, suffix, url, extracted))
+            if on_page is not None:
+                await on_page(final_url, text)
+            return
         except Exception as e:
+            if raw is not None:
+                await sink.run(raw.discard)
             attempt += 1
             if attempt >= retries:
-                stats["failed"] += 1
+                count(stats, counts, "failed")
+                if journal is not None:
+                    journal.page(suffix, url, counts)
+            elif throttle is not None:
+                await asyncio.sleep(throttle.retry_delay(attempt, retry_after))
             else:
                 await asyncio.sleep(1)  # Wait before retry
-        await asyncio.sleep(rate_limit)
+        if throttle is None:
+            await asyncio.sleep(rate_limit)
 
-async def save_html_files_async(base, domains, formats=None, log_callback=None, max_concurrent=10, rate_limit=0.5, retries=3, tags_to_scrape=None, output_dir=None):
+async def save_html_files_async(base, domains, formats=None, log_callback=None, max_concurrent=10, rate_limit=0.5, retries=3, tags_to_scrape=None, output_dir=None, parse_mode="process", parse_workers=None, parser="html.parser", cache=None, session=None, sem=None, executor=None, throttle=None, timer=None, max_bytes=DEFAULT_MAX_BYTES, raw_gzip=False, sink=None, nlp=True, final_urls=None, dedup=True, journal=None, pages=None, progress_callback=None):
     """
     Async version: For each (suffix, url) in domains, fetch HTML and save important elements to base/base-suffix.txt.
     Uses aiohttp for efficiency. Supports rate limiting and retries.
+    Politeness is per host through a throttle.HostThrottle (shared one passed as
+    `throttle`, or a new one): each host starts at one request per `rate_limit` seconds
+    and at most `max_concurrent` requests at a time, and adapts to how it responds.
+    `max_concurrent` also limits the downloads overall; parsing runs separately on `parse_workers`
+    processes or threads depending on `parse_mode` ("process", "thread" or "inline"),
+    with the `parser` engine (see extract_elements()).
+    With an httpcache.HttpCache as `cache`, pages are requested conditionally and
+    unchanged pages reuse the previous extraction and files.
+    A shared aiohttp `session`, download semaphore `sem` and parse `executor` can be
+    passed in when several bases are scraped at once; they are left open afterwards.
+    Stage times are collected in `timer` (a timing.StageTimer) if given.
+    Bodies are streamed and cut off after `max_bytes`; the raw page is written to disk
+    while it downloads (gzip-compressed with raw_gzip) and the JSON refers to it.
+    Results are written by `sink` off the event loop: a FileSink for the per-file layout
+    (the default) or a sink.ShardSink for one compressed JSONL shard per run. A sink
+    passed in is drained, not closed, before returning.
+    With `nlp`, keywords (TF-IDF across all pages of the run) and sentiment are computed
+    once every page is fetched and the saved files are updated; without it they stay
+    empty and can be added later with `python -m nlp`. The stored pages are also
+    appended as (base, suffix, url, extracted) to `pages` if a list is given.
+    With dedup, only one of the domains whose probe ended up at the same host
+    (`final_urls` is {suffix: final url}, e.g. from ping_domains_async()) is fetched, and
+    pages that redirect to or have the same or nearly the same text as an earlier page
+    are not stored; they are listed in stats["aliases"] and counted out of
+    stats["unique"] (see dedup.Deduplicator).
+    Every finished page is recorded in `journal` (a journal.Journal, left open) if
+    given; pages it already holds from an interrupted run are not fetched again and
+    their statistics are restored, so the report matches an uninterrupted run.
+    progress_callback(done, total) is called as each of the `total` pages to fetch is done.
     Returns a dict with scrape statistics for reporting.
     """
     if formats is None:
@@ -154,17 +525,202 @@ async def save_html_files_async(base, domains, formats=None, log_callback=None,
         "failed": 0,
         "not_useful": 0
     }
+    if cache is not None:
+        stats.update({"cache_hits": 0, "cache_revalidated": 0, "cache_misses": 0})
     headers = {"User-Agent": "Mozilla/5.0 (compatible; DomainScraper/1.0)"}
-    sem = asyncio.Semaphore(max_concurrent)
-    if output_dir:
-        fetch_and_save.output_dir = output_dir
-    else:
-        fetch_and_save.output_dir = None
-    async with aiohttp.ClientSession() as session:
-        tasks = [fetch_and_save(session, sem, base, suffix, url, log_callback, stats, headers, formats, tags_to_scrape, retries, rate_limit) for suffix, url in domains]
-        await asyncio.gather(*tasks)
+    if sem is None:
+        sem = asyncio.Semaphore(max_concurrent)
+    if throttle is None:
+        throttle = HostThrottle(rate=1 / rate_limit if rate_limit > 0 else None, max_concurrency=max_concurrent)
+    own_executor = executor is None
+    if own_executor:
+        executor = make_parse_executor(parse_mode, parse_workers)
+    own_session = session is None
+    if own_session:
+        session = aiohttp.ClientSession(trace_configs=[trace_config()])
+    own_sink = sink is None
+    if own_sink:
+        sink = FileSink(output_dir, formats, log_callback, raw_gzip)
+    if pages is None and nlp:
+        pages = []
+    deduplicator = Deduplicator() if dedup else None
+    if deduplicator is not None:
+        domains = deduplicator.plan(domains, final_urls or {})
+    if journal is not None:
+        domains = resume_pages(journal, base, domains, stats, deduplicator, pages)
+    try:
+        done = [0]
+
+        async def fetch(suffix, url):
+            await fetch_and_save(session, sem, base, suffix, url, log_callback, stats, headers, formats, tags_to_scrape, retries, rate_limit, executor, parser, cache, throttle, timer, max_bytes, sink, pages, deduplicator, journal)
+            done[0] += 1
+            if progress_callback is not None:
+                progress_callback(done[0], len(domains))
+
+        await asyncio.gather(*(fetch(suffix, url) for suffix, url in domains))
+        if deduplicator is not None:
+            deduplicator.update_stats(stats)
+        if nlp:
+            await analyze_and_update(pages, executor, sink, timer, cache)
+    finally:
+        # Wait for the queued writes so the statistics are complete
+        await sink.drain()
+        if own_sink:
+            sink.close()
+        if own_session:
+            await session.close()
+        if own_executor and executor is not None:
+            executor.shutdown()
     return stats
 
 # Synchronous wrapper for GUI compatibility
-def save_html_files(base, domains, formats=None, log_callback=None, max_concurrent=10, rate_limit=0.5, retries=3, tags_to_scrape=None, output_dir=None):
-    return asyncio.run(save_html_files_async(base, domains, formats, log_callback, max_concurrent, rate_limit, retries, tags_to_scrape, output_dir))
\ No newline at end of file
+def save_html_files(base, domains, formats=None, log_callback=None, max_concurrent=10, rate_limit=0.5, retries=3, tags_to_scrape=None, output_dir=None, parse_mode="process", parse_workers=None, parser="html.parser", cache=None, timer=None, max_bytes=DEFAULT_MAX_BYTES, raw_gzip=False, nlp=True, final_urls=None, dedup=True, journal=None):
+    return asyncio.run(save_html_files_async(base, domains, formats, log_callback, max_concurrent, rate_limit, retries, tags_to_scrape, output_dir, parse_mode, parse_workers, parser, cache, timer=timer, max_bytes=max_bytes, raw_gzip=raw_gzip, nlp=nlp, final_urls=final_urls, dedup=dedup, journal=journal))
+
+async def scan_and_save_async(base, suffixes=None, formats=None, log_callback=None, progress_callback=None, timeout=5, max_workers=20, tags_to_scrape=None, output_dir=None, parse_mode="process", parse_workers=None, parser="html.parser", cache=None, store=None, full_sweep=False, timer=None, max_bytes=DEFAULT_MAX_BYTES, raw_gzip=False, sink=None, nlp=True, dedup=True, journal=None):
+    """
+    Single-pass pipeline: pings every candidate domain for `base` and hands each successful
+    response straight to the extraction stage, so reachable pages are scraped while the
+    sweep is still running and never downloaded twice. Parsing and the optional `cache`
+    work as in save_html_files_async(), except that the probe always downloads the
+    body, so only the content-hash check applies.
+    With a probestore.ProbeStore as `store`, suffixes that were recently found unreachable
+    are skipped (unless full_sweep is set) and every probe outcome is recorded, except
+    transient failures (see probestore.is_definite()).
+    Probe, parse and write times are collected in `timer` (a timing.StageTimer) if given.
+    `max_bytes`, raw_gzip, `sink`, `nlp`, dedup and `journal` work as in
+    save_html_files_async(), except that every page is downloaded by its probe, so
+    duplicates only skip the parse (redirects) and the write. Unreachable probes are
+    journaled too, so a resumed run only probes them again if they failed for a
+    transient reason.
+    Returns a tuple (reachable, stats) where reachable is the list of (suffix, url) tuples.
+    """
+    if formats is None:
+        formats = ['txt']
+    stats = {
+        "total_pinged": 0,
+        "saved": 0,
+        "failed": 0,
+        "not_useful": 0
+    }
+    if cache is not None:
+        stats.update({"cache_hits": 0, "cache_revalidated": 0, "cache_misses": 0})
+    headers = {"User-Agent": "Mozilla/5.0 (compatible; DomainScraper/1.0)"}
+    if suffixes is None:
+        suffixes = [s if s.startswith('.') else f'.{s}' for s in get_all_tlds()]
+    # Most likely TLDs first, so their pages are scraped early
+    candidates = build_candidates(base, rank_suffixes(suffixes, store))
+    if store is not None:
+        to_probe, _ = store.plan(base, [suffix for suffix, _ in candidates], full_sweep)
+        to_probe = set(to_probe)
+        candidates = [(suffix, url) for suffix, url in candidates if suffix in to_probe]
+    reachable = []
+    outcomes = []
+    pages = []
+    deduplicator = Deduplicator() if dedup else None
+    if journal is not None:
+        finished = [(suffix, entry["url"]) for suffix, entry in journal.pages.items()]
+        reachable += finished
+        stats["total_pinged"] += len(finished)
+        resume_pages(journal, base, [], stats, deduplicator, pages)
+        # Transient failures are probed again, as in pinger.iter_reachable_async()
+        unreachable = {suffix for suffix, entry in journal.probes.items() if not entry["reachable"] and is_definite(entry)}
+        candidates = [(suffix, url) for suffix, url in candidates if suffix not in journal.pages and suffix not in unreachable]
+    loop = asyncio.get_running_loop()
+
+    async def probe(executor, suffix, url):
+        start = time.monotonic()
+        page = await loop.run_in_executor(executor, fetch_website_details, url, timeout, headers, max_bytes)
+        latency = round(time.monotonic() - start, 4)
+        result = {
+            "reachable": page["reachable"],
+            "status": page["status"],
+            "latency": latency,
+            "final_url": page["url"],
+            "error": page["error"] if page["error"] != "status" else None
+        }
+        outcomes.append((suffix, result))
+        if journal is not None:
+            journal.probe(suffix, url, result)
+        if timer is not None:
+            timer.add("probe", latency, urlparse(url).hostname)
+        return suffix, url, page
+
+    async def extract_and_write(suffix, url, page):
+        text = page["text"]
+        counts = {}
+        try:
+            if deduplicator is not None and deduplicator.check_redirect(suffix, url, page["url"]):
+                if journal is not None:
+                    journal.page(suffix, url, counts, page["url"], alias=deduplicator.aliases[suffix])
+                return
+            extracted = None
+            cached = False
+            if cache is not None:
+                page_headers = {k.lower(): v for k, v in page["headers"].items()}
+                extract_key = json.dumps([tags_to_scrape, parser])
+                hash_ = content_hash(text)
+                entry = cache.get(url)
+                if entry and entry["content_hash"] == hash_:
+                    count(stats, counts, "cache_hits")
+                    cache.touch(url, page_headers.get("etag"), page_headers.get("last-modified"))
+                    if entry["extract_key"] == extract_key:
+                        extracted = entry["extracted"]
+                        cached = True
+                else:
+                    count(stats, counts, "cache_misses")
+            if extracted is None:
+                extracted = await extract_async(parse_executor, text, tags_to_scrape, parser, timer, urlparse(url).hostname)
+                if cache is not None:
+                    cache.put(url, text, extracted, extract_key, page_headers.get("etag"), page_headers.get("last-modified"), hash_)
+            if deduplicator is not None and deduplicator.check_content(suffix, url, extracted):
+                if journal is not None:
+                    journal.page(suffix, url, counts, page["url"], alias=deduplicator.aliases[suffix])
+                return
+            sink.put(base, suffix, url, text, extracted, stats, skip_existing=cached, timer=timer, done=journal_done(journal, suffix, url, counts, page["url"], extracted))
+            pages.append((base, suffix, url, extracted))
+        except Exception:
+            count(stats, counts, "failed")
+            if journal is not None:
+                journal.page(suffix, url, counts)
+
+    parse_executor = make_parse_executor(parse_mode, parse_workers)
+    own_sink = sink is None
+    if own_sink:
+        sink = FileSink(output_dir, formats, log_callback, raw_gzip)
+    writes = []
+    try:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            tasks = [probe(executor, suffix, url) for suffix, url in candidates]
+            done = 0
+            for next_result in asyncio.as_completed(tasks):
+                suffix, url, page = await next_result
+                done += 1
+                if page["reachable"]:
+                    reachable.append((suffix, url))
+                    stats["total_pinged"] += 1
+                    # The probe already holds the full body, so reuse it instead of refetching
+                    writes.append(asyncio.create_task(extract_and_write(suffix, url, page)))
+                if progress_callback:
+                    progress_callback(done, len(tasks))
+        finally:
+            # If the run is cancelled, the probes that have not started are dropped
+            executor.shutdown(cancel_futures=True)
+        await asyncio.gather(*writes)
+        if deduplicator is not None:
+            deduplicator.update_stats(stats)
+        if nlp:
+            await analyze_and_update(pages, parse_executor, sink, timer, cache)
+    finally:
+        await sink.drain()
+        if own_sink:
+            sink.close()
+        if parse_executor is not None:
+            parse_executor.shutdown()
+        if store is not None:
+            store.record_many(base, outcomes)
+    return reachable, stats
+
+def scan_and_save(base, suffixes=None, formats=None, log_callback=None, progress_callback=None, timeout=5, max_workers=20, tags_to_scrape=None, output_dir=None, parse_mode="process", parse_workers=None, parser="html.parser", cache=None, store=None, full_sweep=False, timer=None, max_bytes=DEFAULT_MAX_BYTES, raw_gzip=False, sink=None, nlp=True, dedup=True, journal=None):
+    return asyncio.run(scan_and_save_async(base, suffixes, formats, log_callback, progress_callback, timeout, max_workers, tags_to_scrape, output_dir, parse_mode, parse_workers, parser, cache, store, full_sweep, timer, max_bytes, raw_gzip, sink, nlp, dedup, journal))
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import os
+import sys
+
+from body import DEFAULT_MAX_BYTES
+from bs import PARSERS, make_parse_executor, save_html_files_async, scan_and_save_async
+from crawl import BloomFilter, crawl_sites_async
+from history import RunHistory
+from httpcache import HttpCache
+from journal import Journal, journal_path
+from parallel import sweep_parallel_async
+from pinger import get_all_tlds, is_valid_domain, make_session, ping_domains_async
+from probestore import ProbeStore
+from report import write_report
+from resolver import CachedResolver, DnsCache
+from sink import COMPRESSIONS, ShardSink
+from throttle import HostThrottle
+from tlds import CATEGORIES as TLD_CATEGORIES
+from timing import StageTimer
+
+
+def read_bases(bases, bases_file=None):
+    """
+    Returns the base names from the command line and/or a file ("-" for stdin),
+    one per line, ignoring blank lines and # comments. Duplicates are dropped.
+    """
+    lines = list(bases or [])
+    if bases_file == "-":
+        lines += sys.stdin.read().splitlines()
+    elif bases_file:
+        with open(bases_file, "r", encoding="utf-8") as f:
+            lines += f.read().splitlines()
+    result = []
+    for line in lines:
+        base = line.split("#", 1)[0].strip()
+        if base and base not in result:
+            result.append(base)
+    return result
+
+
+def split_list(value, dotted=False):
+    if not value:
+        return None
+    items = [v.strip() for v in value.split(",") if v.strip()]
+    if dotted:
+        items = [v if v.startswith(".") else f".{v}" for v in items]
+    return items or None
+
+
+async def sweep_bases_async(bases, suffixes=None, formats=None, tags_to_scrape=None, rate_limit=0.5, output_dir=None,
+                            limit=200, limit_per_host=0, max_concurrent=10, timeout=5, parser="stream",
+                            single_pass=False, use_cache=True, full_sweep=False, log_callback=None,
+                            max_bytes=DEFAULT_MAX_BYTES, raw_gzip=False, shard=False, compression=None, nlp=True, dedup=True, resume=False, time_budget=None, max_hits=None, max_probes=None,
+                            crawl_depth=0, max_pages=50, max_site_bytes=20 * 1024 * 1024, use_history=True, max_bases=4):
+    """
+    Sweeps and scrapes many bases on one event loop, at most `max_bases` at a time
+    (each has its own journal thread and probe tasks). All (base, tld) probes and
+    page downloads share one aiohttp connection pool (`limit` connections in total,
+    `limit_per_host` per host), one download semaphore (`max_concurrent`), one parse
+    process pool (single_pass parses in a pool per base), the per-host throttle (one
+    request per `rate_limit` seconds to start with, adapting to how each host
+    responds) and the DNS, probe and HTTP caches.
+    A report is written per base with report.write_report(), including per-stage
+    latency percentiles and per-host timings.
+    With shard, the pages of all bases go to one sink.ShardSink JSONL shard in
+    output_dir (compressed with `compression`) instead of separate files.
+    With `nlp`, keywords and sentiment are computed per base once its pages are saved.
+    With dedup, redirects, mirrors and near-duplicate pages of a base are only stored
+    once (see dedup.Deduplicator) and the report lists unique next to reachable sites.
+    Finished probes and pages are journaled per base (see journal.Journal); with
+    resume, the work an interrupted run finished is skipped.
+    TLDs are probed most likely first; the sweep of each base stops after
+    `time_budget` seconds, `max_hits` reachable domains or `max_probes` probes.
+    With crawl_depth > 0, every site is crawled that many links deep (see
+    crawl.crawl_sites_async(), capped at `max_pages` pages and `max_site_bytes` per
+    site) instead of only fetching its homepage; crawled pages are not journaled.
+    With use_history, every run is recorded in history.RunHistory and the report
+    lists what changed since the previous run of the base.
+    Returns {base: stats} (None for a base that failed).
+    """
+    formats = formats or ["txt"]
+    if suffixes is None:
+        suffixes = [s if s.startswith('.') else f'.{s}' for s in get_all_tlds()]
+    log = log_callback or (lambda msg: None)
+    results = {}
+    dns_cache = DnsCache()
+    store = ProbeStore()
+    cache = HttpCache() if use_cache else None
+    http_resolver = CachedResolver()
+    # The single-pass pipeline parses in its own pool
+    executor = make_parse_executor() if not single_pass else None
+    sem = asyncio.Semaphore(max_concurrent)
+    throttle = HostThrottle(rate=1 / rate_limit if rate_limit > 0 else None, max_concurrency=max_concurrent)
+    session = make_session(limit, limit_per_host, http_resolver)
+    sink = ShardSink(output_dir, formats, log_callback, compression) if shard else None
+    seen = BloomFilter() if crawl_depth else None
+    history = RunHistory() if use_history else None
+    running = asyncio.Semaphore(max_bases)
+
+    async def run_base(base):
+        async with running:
+            await sweep_base(base)
+
+    async def sweep_base(base):
+        timer = StageTimer()
+        journal = Journal(journal_path(base, output_dir), resume)
+        try:
+            if single_pass:
+                # The single-pass pipeline probes with its own thread pool
+                _, stats = await scan_and_save_async(base, suffixes, formats, log_callback, timeout=timeout, tags_to_scrape=tags_to_scrape, output_dir=output_dir, parser=parser, cache=cache, store=store, full_sweep=full_sweep, timer=timer, max_bytes=max_bytes, raw_gzip=raw_gzip, sink=sink, nlp=nlp, dedup=dedup, journal=journal)
+            else:
+                final_urls = {}
+                reachable = await ping_domains_async(base, suffixes, connect_timeout=timeout, read_timeout=timeout, dns_cache=dns_cache, store=store, full_sweep=full_sweep, session=session, http_resolver=http_resolver, timer=timer, final_urls=final_urls, journal=journal, time_budget=time_budget, max_hits=max_hits, max_probes=max_probes)
+                log(f"[{base}] Found {len(reachable)} reachable domains.")
+                if crawl_depth:
+                    stats = await crawl_sites_async(base, reachable, formats, log_callback, max_concurrent, rate_limit, tags_to_scrape=tags_to_scrape, output_dir=output_dir, parser=parser, cache=cache, session=session, sem=sem, executor=executor, throttle=throttle, timer=timer, max_bytes=max_bytes, raw_gzip=raw_gzip, sink=sink, nlp=nlp, final_urls=final_urls, dedup=dedup, max_depth=crawl_depth, max_pages=max_pages, max_site_bytes=max_site_bytes, seen=seen)
+                else:
+                    stats = await save_html_files_async(base, reachable, formats, log_callback, max_concurrent, rate_limit, tags_to_scrape=tags_to_scrape, output_dir=output_dir, parser=parser, cache=cache, session=session, sem=sem, executor=executor, throttle=throttle, timer=timer, max_bytes=max_bytes, raw_gzip=raw_gzip, sink=sink, nlp=nlp, final_urls=final_urls, dedup=dedup, journal=journal)
+            delta = history.record_run(base, journal, stats, timer)[1] if history is not None else None
+            report_path = write_report(base, stats, formats=formats, output_dir=output_dir, timer=timer, delta=delta)
+            log(f"[{base}] Done! {stats['saved']} pages saved. Report saved to {report_path}")
+            results[base] = stats
+        except Exception as e:
+            log(f"[{base}] Failed: {e}")
+            results[base] = None
+        finally:
+            journal.close()
+
+    try:
+        await asyncio.gather(*(run_base(base) for base in bases))
+    finally:
+        await session.close()
+        if sink is not None:
+            await sink.drain()
+            sink.close()
+            log(f"Pages saved to {sink.path}")
+        if executor is not None:
+            executor.shutdown()
+        dns_cache.save()
+        store.close()
+        if cache is not None:
+            cache.close()
+        if history is not None:
+            history.close()
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless domain scraper: sweeps every base over the TLDs and scrapes the reachable sites.")
+    ap.add_argument("bases", nargs="*", help="Base domain names (e.g. nrk bbc)")
+    ap.add_argument("-f", "--bases-file", help="File with one base per line, or - for stdin")
+    ap.add_argument("--tlds", help="Comma-separated TLDs to check (default: all known TLDs)")
+    ap.add_argument("--tld-category", action="append", choices=TLD_CATEGORIES, help="Only check known TLDs of this category, e.g. country-code (repeatable)")
+    ap.add_argument("--tags", help="Comma-separated tags/elements to scrape (default: h1-h6,p)")
+    ap.add_argument("--formats", default="txt", help="Comma-separated output formats: txt,json,html (default: txt)")
+    ap.add_argument("--delay", type=float, default=0.5, help="Initial delay between requests to the same host in seconds (default: 0.5)")
+    ap.add_argument("-o", "--output-dir", default=os.getcwd(), help="Output folder (default: current folder)")
+    ap.add_argument("--concurrency", type=int, default=200, help="Total concurrent connections (default: 200)")
+    ap.add_argument("--per-host", type=int, default=0, help="Concurrent connections per host, 0 for no cap (default: 0)")
+    ap.add_argument("--max-concurrent", type=int, default=10, help="Concurrent page downloads (default: 10)")
+    ap.add_argument("--timeout", type=float, default=5, help="Connect/read timeout for pings in seconds (default: 5)")
+    ap.add_argument("--parser", choices=PARSERS, default="stream", help="HTML parser engine (default: stream)")
+    ap.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help=f"Cut page bodies off after this many bytes (default: {DEFAULT_MAX_BYTES})")
+    ap.add_argument("--gzip-html", action="store_true", help="Store raw pages gzip-compressed (.html.gz)")
+    ap.add_argument("--shard", action="store_true", help="Write all pages to one JSONL shard per run instead of separate files")
+    ap.add_argument("--compress", choices=[c for c in COMPRESSIONS if c], help="Compress the shard with gzip or zstd")
+    ap.add_argument("--no-nlp", action="store_true", help="Skip keywords/sentiment (add them later with python -m nlp)")
+    ap.add_argument("--no-dedup", action="store_true", help="Store every reachable site, even redirects and duplicates of another one")
+    ap.add_argument("--resume", action="store_true", help="Continue an interrupted run, skipping the probes and pages it finished")
+    ap.add_argument("--no-history", action="store_true", help="Do not record this run in history.sqlite (the report then has no changes since the previous run)")
+    ap.add_argument("--time-budget", type=float, help="Stop probing a base after this many seconds")
+    ap.add_argument("--max-hits", type=int, help="Stop probing a base after this many reachable domains")
+    ap.add_argument("--max-probes", type=int, help="Stop probing a base after this many probes")
+    ap.add_argument("--crawl-depth", type=int, default=0, help="Follow links within each site this many levels deep, 0 for the homepage only (default: 0)")
+    ap.add_argument("--max-pages", type=int, default=50, help="Pages to crawl per site (default: 50)")
+    ap.add_argument("--max-site-bytes", type=int, default=20 * 1024 * 1024, help="Stop crawling a site after downloading this many bytes (default: 20 MB)")
+    ap.add_argument("--max-bases", type=int, default=4, help="Bases swept at the same time without --processes (default: 4)")
+    ap.add_argument("--processes", type=int, default=1, help="Spread the bases and TLDs over this many worker processes, 0 for one per CPU (default: 1)")
+    ap.add_argument("--single-pass", action="store_true", help="Scrape while pinging, fetching each page once")
+    ap.add_argument("--no-cache", action="store_true", help="Do not reuse cached pages")
+    ap.add_argument("--full-sweep", action="store_true", help="Ignore remembered ping results and probe every TLD")
+    ap.add_argument("-q", "--quiet", action="store_true", help="Only print errors and the final summary")
+    args = ap.parse_args(argv)
+
+    bases_file = args.bases_file
+    if not args.bases and not bases_file and not sys.stdin.isatty():
+        bases_file = "-"
+    bases = read_bases(args.bases, bases_file)
+    invalid = [b for b in bases if not is_valid_domain(b)]
+    if invalid:
+        ap.error("Invalid base domain name(s): " + ", ".join(invalid))
+    if not bases:
+        ap.error("No base domain names given.")
+    formats = split_list(args.formats) or ["txt"]
+    unknown = [f for f in formats if f not in ("txt", "json", "html")]
+    if unknown:
+        ap.error("Unknown output format(s): " + ", ".join(unknown))
+    if args.delay < 0:
+        ap.error("Delay must be a non-negative number.")
+    if args.max_bytes <= 0:
+        ap.error("--max-bytes must be a positive number.")
+    if args.compress and not args.shard:
+        ap.error("--compress only applies with --shard.")
+    if args.single_pass and (args.time_budget or args.max_hits or args.max_probes):
+        ap.error("--time-budget, --max-hits and --max-probes do not apply with --single-pass.")
+    if args.crawl_depth < 0:
+        ap.error("--crawl-depth must be 0 or a positive number.")
+    if args.crawl_depth and args.single_pass:
+        ap.error("--crawl-depth does not apply with --single-pass.")
+    if args.max_pages <= 0 or args.max_site_bytes <= 0:
+        ap.error("--max-pages and --max-site-bytes must be positive numbers.")
+    if args.tlds and args.tld_category:
+        ap.error("--tlds and --tld-category cannot be combined.")
+    if args.max_bases <= 0:
+        ap.error("--max-bases must be a positive number.")
+    if args.processes < 0:
+        ap.error("--processes must be 0 or a positive number.")
+    if args.processes != 1 and (args.single_pass or args.shard):
+        ap.error("--single-pass and --shard do not apply with --processes.")
+    for name in ("time_budget", "max_hits", "max_probes"):
+        if getattr(args, name) is not None and getattr(args, name) <= 0:
+            ap.error(f"--{name.replace('_', '-')} must be a positive number.")
+
+    options = dict(
+        suffixes=split_list(args.tlds, dotted=True) or (["." + tld for tld in get_all_tlds(args.tld_category)] if args.tld_category else None),
+        formats=formats,
+        tags_to_scrape=split_list(args.tags),
+        rate_limit=args.delay,
+        output_dir=args.output_dir,
+        limit=args.concurrency,
+        limit_per_host=args.per_host,
+        max_concurrent=args.max_concurrent,
+        timeout=args.timeout,
+        parser=args.parser,
+        use_cache=not args.no_cache,
+        full_sweep=args.full_sweep,
+        log_callback=None if args.quiet else print,
+        max_bytes=args.max_bytes,
+        raw_gzip=args.gzip_html,
+        nlp=not args.no_nlp,
+        dedup=not args.no_dedup,
+        resume=args.resume,
+        time_budget=args.time_budget,
+        max_hits=args.max_hits,
+        max_probes=args.max_probes,
+        crawl_depth=args.crawl_depth,
+        max_pages=args.max_pages,
+        max_site_bytes=args.max_site_bytes,
+        use_history=not args.no_history
+    )
+    if args.processes != 1:
+        results = asyncio.run(sweep_parallel_async(bases, args.processes or None, **options))
+    else:
+        results = asyncio.run(sweep_bases_async(bases, single_pass=args.single_pass, shard=args.shard, compression=args.compress, max_bases=args.max_bases, **options))
+    failed = [base for base, stats in results.items() if stats is None]
+    saved = sum(stats["saved"] for stats in results.values() if stats)
+    print(f"Swept {len(results)} bases: {saved} pages saved, {len(failed)} bases failed.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import math
+import posixpath
+import re
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, quote, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+from body import DEFAULT_MAX_BYTES
+from bs import FileSink, analyze_and_update, fetch_and_save, make_parse_executor
+from dedup import Deduplicator, site_host
+from throttle import HostThrottle
+from timing import trace_config
+
+# Token our robots.txt rules are matched against (from the User-Agent header)
+ROBOTS_AGENT = "DomainScraper"
+# robots.txt files are cut off after this many bytes (RFC 9309 asks for at least 500 KiB)
+ROBOTS_MAX_BYTES = 512 * 1024
+# Links waiting per site; further links are dropped until the frontier shrinks
+FRONTIER_LIMIT = 10000
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|mc_cid|mc_eid)$', re.IGNORECASE)
+_SLUG = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def normalize_url(url, base_url=None):
+    """
+    Returns `url` (resolved against `base_url`) in a canonical form so the same page is
+    only queued once: lowercase scheme and host, no default port, fragment or
+    tracking parameters, dot segments resolved, sorted query. Returns None for
+    anything that is not an http(s) URL.
+    """
+    try:
+        parts = urlsplit(urljoin(base_url, url.strip()) if base_url else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if port and port != _DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    path = parts.path or "/"
+    if "." in path:
+        normalized = posixpath.normpath(path)
+        path = normalized + "/" if path.endswith("/") and normalized != "/" else normalized
+        path = path.replace("//", "/")
+    path = quote(path, safe="/%:@!$&'()*+,;=-._~")
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(key))
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def page_suffix(suffix, url):
+    """
+    Returns the name crawled pages are stored under: `suffix` for the homepage of the
+    site, otherwise the suffix plus a slug of the path and a short hash, so every page
+    gets its own base-suffix.* files (e.g. nrk-no--nyheter-3f2a9c1e.txt).
+    """
+    parts = urlsplit(url)
+    path = parts.path.strip("/")
+    if not path and not parts.query:
+        return suffix
+    slug = _SLUG.sub("-", path + ("-" + parts.query if parts.query else "")).strip("-")[:60]
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+    return f"{suffix}--{slug}-{digest}" if slug else f"{suffix}--{digest}"
+
+
+class BloomFilter:
+    """
+    Set of strings in a fixed bit array (about 1.8 MB per million entries at the
+    default error rate), for the URLs a crawl has already queued. add() and `in` can
+    give false positives at `error_rate` once `capacity` entries are reached (the page
+    is then skipped), never false negatives.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(item))
+
+    def add(self, item):
+        """
+        Adds `item` and returns True if it was not in the filter yet.
+        """
+        new = False
+        for p in self.positions(item):
+            mask = 1 << (p & 7)
+            if not self.bits[p >> 3] & mask:
+                self.bits[p >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+
+class LinkExtractor(HTMLParser):
+    """
+    Collects the targets of <a> and <area> links of a page, honouring <base href>,
+    rel="nofollow" and <meta name="robots" content="nofollow">.
+    """
+
+    def __init__(self, url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = url
+        self.links = []
+        self.nofollow = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "base" and attrs.get("href"):
+            self.base_url = urljoin(self.base_url, attrs["href"])
+        elif tag == "meta" and (attrs.get("name") or "").lower() == "robots":
+            if "nofollow" in (attrs.get("content") or "").lower():
+                self.nofollow = True
+        elif tag in ("a", "area") and attrs.get("href"):
+            if "nofollow" not in (attrs.get("rel") or "").lower().split():
+                self.links.append(urljoin(self.base_url, attrs["href"]))
+
+
+def extract_links(text, url):
+    """
+    Returns the normalized http(s) links of the page `text` fetched from `url`, in
+    page order without repeats. Runs in a worker process or thread.
+    """
+    parser = LinkExtractor(url)
+    try:
+        parser.feed(text)
+        parser.close()
+    except Exception:
+        pass
+    if parser.nofollow:
+        return []
+    links = []
+    seen = set()
+    for link in parser.links:
+        normalized = normalize_url(link)
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            links.append(normalized)
+    return links
+
+
+class RobotsCache:
+    """
+    robots.txt rules per origin (scheme://host:port), fetched once through `session`
+    and the per-host `throttle`. Following RFC 9309, a missing robots.txt (4xx) allows
+    everything and an unreachable one (5xx, network error) disallows everything.
+    Crawl-delay is applied to the host's throttle.
+    """
+
+    def __init__(self, session, throttle=None, headers=None, timeout=10, user_agent=ROBOTS_AGENT):
+        self.session = session
+        self.throttle = throttle
+        self.headers = headers
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.rules = {}
+
+    async def get(self, url):
+        """
+        Returns the RobotFileParser of the origin of `url`.
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        rules = self.rules.get(origin)
+        if rules is None:
+            # Store the task first so concurrent pages of a site share one fetch
+            rules = self.rules[origin] = asyncio.ensure_future(self.fetch(origin, parts.hostname))
+        return await rules
+
+    async def fetch(self, origin, host):
+        rules = RobotFileParser(origin + "/robots.txt")
+        try:
+            async with (self.throttle.slot(host) if self.throttle is not None else contextlib.nullcontext()):
+                async with self.session.get(origin + "/robots.txt", headers=self.headers, timeout=self.timeout) as response:
+                    if response.status >= 500:
+                        rules.disallow_all = True
+                    elif response.status >= 400:
+                        rules.allow_all = True
+                    else:
+                        body = await response.content.read(ROBOTS_MAX_BYTES)
+                        rules.parse(body.decode("utf-8", errors="replace").splitlines())
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, ValueError):
+            rules.disallow_all = True
+        delay = rules.crawl_delay(self.user_agent)
+        if delay and self.throttle is not None:
+            self.throttle.set_crawl_delay(host, float(delay))
+        return rules
+
+    async def allowed(self, url):
+        return (await self.get(url)).can_fetch(self.user_agent, url)
+
+
+async def crawl_site(session, sem, base, suffix, url, log_callback, stats, headers, formats, seen, robots, tags_to_scrape=None, retries=3,
+                     rate_limit=0.5, executor=None, parser="html.parser", cache=None, throttle=None, timer=None, max_bytes=DEFAULT_MAX_BYTES,
+                     sink=None, pages=None, dedup=None, max_depth=2, max_pages=50, max_site_bytes=20 * 1024 * 1024, concurrency=4):
+    """
+    Crawls one site from its homepage `url` up to `max_depth` links deep, fetching and
+    storing every page with fetch_and_save() (the homepage as `suffix`, other pages
+    under page_suffix()). The frontier is a priority queue: shallower pages first,
+    then shorter paths, then discovery order. Only links on the same site (see
+    dedup.site_host()) that robots.txt allows and that are not in the BloomFilter
+    `seen` yet are queued; the homepage itself is fetched as in a run without
+    crawling. The crawl stops after `max_pages` stored pages or `max_site_bytes`
+    downloaded characters; up to `concurrency` pages are fetched at a time, on top of
+    the throttle's per-host limits.
+    Only the homepage goes through the Deduplicator `dedup`; if it is an alias of
+    another site, the site is not crawled.
+    """
+    host = site_host(url)
+    frontier = []
+    order = [0]
+    done = {"pages": 0, "bytes": 0}
+
+    def push(link, depth):
+        if len(frontier) < FRONTIER_LIMIT and seen.add(link):
+            order[0] += 1
+            heapq.heappush(frontier, (depth, urlsplit(link).path.count("/"), order[0], link))
+
+    async def fetch(link, depth):
+        async def on_page(final_url, text):
+            done["pages"] += 1
+            done["bytes"] += len(text or "")
+            if depth >= max_depth or not text or site_host(final_url) != host:
+                return
+            seen.add(normalize_url(final_url) or final_url)
+            loop = asyncio.get_running_loop()
+            try:
+                if executor is not None:
+                    links = await loop.run_in_executor(executor, extract_links, text, final_url)
+                else:
+                    links = extract_links(text, final_url)
+            except Exception:
+                return
+            for found in links:
+                if site_host(found) == host:
+                    push(found, depth + 1)
+
+        page_dedup = dedup if depth == 0 else None
+        await fetch_and_save(session, sem, base, suffix if depth == 0 else page_suffix(suffix, link), link, log_callback, stats, headers, formats,
+                             tags_to_scrape, retries, rate_limit, executor, parser, cache, throttle, timer, max_bytes, sink, pages, page_dedup,
+                             on_page=on_page)
+
+    # The homepage keeps its URL as given, so its records match an uncrawled run
+    seen.add(normalize_url(url) or url)
+    order[0] += 1
+    heapq.heappush(frontier, (0, 0, order[0], url))
+    in_flight = set()
+    while frontier or in_flight:
+        while frontier and len(in_flight) < concurrency and done["pages"] + len(in_flight) < max_pages and done["bytes"] < max_site_bytes:
+            depth, _, _, link = heapq.heappop(frontier)
+            if depth > 0 and not await robots.allowed(link):
+                stats["robots_blocked"] += 1
+                continue
+            in_flight.add(asyncio.ensure_future(fetch(link, depth)))
+        if not in_flight:
+            break
+        _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+    stats["pages_crawled"] += done["pages"]
+    stats["bytes_crawled"] += done["bytes"]
+
+
+async def crawl_sites_async(base, domains, formats=None, log_callback=None, max_concurrent=10, rate_limit=0.5, retries=3, tags_to_scrape=None,
+                            output_dir=None, parse_mode="process", parse_workers=None, parser="html.parser", cache=None, session=None, sem=None,
+                            executor=None, throttle=None, timer=None, max_bytes=DEFAULT_MAX_BYTES, raw_gzip=False, sink=None, nlp=True,
+                            final_urls=None, dedup=True, pages=None, max_depth=2, max_pages=50, max_site_bytes=20 * 1024 * 1024, seen=None):
+    """
+    Like bs.save_html_files_async(), but crawls every reachable site of `base` (see
+    crawl_site()) instead of only fetching its homepage, with the same politeness
+    (`max_concurrent`, `rate_limit` and the per-host throttle, plus robots.txt rules and
+    Crawl-delay), extraction, formats and sinks. `seen` is the BloomFilter of URLs
+    already queued, shared by all sites (a new one if None).
+    Adds "pages_crawled", "bytes_crawled" and "robots_blocked" to the statistics.
+    Returns the statistics.
+    """
+    if formats is None:
+        formats = ['txt']
+    stats = {
+        "total_pinged": len(domains),
+        "saved": 0,
+        "failed": 0,
+        "not_useful": 0,
+        "pages_crawled": 0,
+        "bytes_crawled": 0,
+        "robots_blocked": 0
+    }
+    if cache is not None:
+        stats.update({"cache_hits": 0, "cache_revalidated": 0, "cache_misses": 0})
+    headers = {"User-Agent": "Mozilla/5.0 (compatible; DomainScraper/1.0)"}
+    if sem is None:
+        sem = asyncio.Semaphore(max_concurrent)
+    if throttle is None:
+        throttle = HostThrottle(rate=1 / rate_limit if rate_limit > 0 else None, max_concurrency=max_concurrent)
+    own_executor = executor is None
+    if own_executor:
+        executor = make_parse_executor(parse_mode, parse_workers)
+    own_session = session is None
+    if own_session:
+        session = aiohttp.ClientSession(trace_configs=[trace_config()])
+    own_sink = sink is None
+    if own_sink:
+        sink = FileSink(output_dir, formats, log_callback, raw_gzip)
+    if pages is None and nlp:
+        pages = []
+    if seen is None:
+        seen = BloomFilter()
+    robots = RobotsCache(session, throttle, headers)
+    deduplicator = Deduplicator() if dedup else None
+    if deduplicator is not None:
+        domains = deduplicator.plan(domains, final_urls or {})
+    try:
+        await asyncio.gather(*(crawl_site(session, sem, base, suffix, url, log_callback, stats, headers, formats, seen, robots, tags_to_scrape,
+                                          retries, rate_limit, executor, parser, cache, throttle, timer, max_bytes, sink, pages, deduplicator,
+                                          max_depth, max_pages, max_site_bytes) for suffix, url in domains))
+        if deduplicator is not None:
+            deduplicator.update_stats(stats)
+        if nlp:
+            await analyze_and_update(pages, executor, sink, timer, cache)
+    finally:
+        await sink.drain()
+        if own_sink:
+            sink.close()
+        if own_session:
+            await session.close()
+        if own_executor and executor is not None:
+            executor.shutdown()
+    return stats
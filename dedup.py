@@ -0,0 +1,147 @@
+import functools
+import hashlib
+import re
+from urllib.parse import urlparse
+
+_TOKEN = re.compile(r'\w+')
+# Pages whose estimated Jaccard similarity (of word shingles) is at least this are
+# near-duplicates
+NEAR_DUPLICATE_SIMILARITY = 0.9
+# MinHash signature length and the LSH bands it is split into for the lookup; pages
+# that share any band are compared in full
+_PERMUTATIONS = 128
+_BANDS = 32
+_ROWS = _PERMUTATIONS // _BANDS
+
+
+@functools.lru_cache(maxsize=None)
+def _permutations():
+    """
+    Returns the (multipliers, offsets) of the MinHash permutations. numpy is only
+    imported when the first signature is computed.
+    """
+    import numpy as np
+
+    seeds = np.random.RandomState(1).randint(1, 2 ** 63, size=(2, _PERMUTATIONS), dtype=np.int64).astype(np.uint64)
+    return seeds[0] | np.uint64(1), seeds[1]
+
+
+def site_host(url):
+    """
+    Returns the host of `url` used to group sites: lowercase, without "www.".
+    """
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def page_fingerprint_text(extracted):
+    """
+    Returns the normalized text (lowercase words) of an extract_page() dict used for
+    duplicate detection: title, descriptions and scraped tags.
+    """
+    parts = [extracted.get("title"), extracted.get("meta_description"), extracted.get("og_description")]
+    parts += [h["text"] for h in extracted.get("tags") or []]
+    return " ".join(_TOKEN.findall(" ".join(p for p in parts if p).lower()))
+
+
+def minhash(text, shingle=3):
+    """
+    Returns the MinHash signature (an array of _PERMUTATIONS values) of the word
+    shingles of `shingle` words in `text`.
+    """
+    import numpy as np
+
+    multipliers, offsets = _permutations()
+    words = text.split()
+    shingles = {" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))}
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles], dtype=np.uint64)
+    # Multiply-shift hashing; the products wrap around modulo 2**64
+    return ((hashes[:, None] * multipliers + offsets) >> np.uint64(32)).min(axis=0)
+
+
+class Deduplicator:
+    """
+    Finds the reachable sites of one base that are the same site: candidates that
+    redirect to a host another candidate already serves (by final URL), pages with the
+    same extracted text (content hash) and near-duplicates (MinHash similarity of at
+    least NEAR_DUPLICATE_SIMILARITY). The first page seen is kept; the others are
+    recorded in `aliases` as {suffix: {"url", "alias_of", "reason"}} with reason "redirect",
+    "duplicate" or "near-duplicate".
+    """
+
+    def __init__(self):
+        self.hosts = {}
+        self.hashes = {}
+        self.bands = {}
+        self.aliases = {}
+
+    def plan(self, domains, final_urls):
+        """
+        Groups (suffix, url) `domains` by the host their probe ended up at
+        (`final_urls` is {suffix: final url}) and returns the ones to fetch: one per
+        host, preferring the candidate that is served on its own host. The others
+        become redirect aliases.
+        """
+        groups = {}
+        for suffix, url in domains:
+            groups.setdefault(site_host(final_urls.get(suffix) or url), []).append((suffix, url))
+        to_fetch = []
+        for host, group in groups.items():
+            own = [(suffix, url) for suffix, url in group if site_host(url) == host]
+            suffix, url = (own or group)[0]
+            self.hosts[host] = url
+            to_fetch.append((suffix, url))
+            for alias_suffix, alias_url in group:
+                if alias_suffix != suffix:
+                    self.add_alias(alias_suffix, alias_url, url, "redirect")
+        return to_fetch
+
+    def add_alias(self, suffix, url, alias_of, reason):
+        self.aliases[suffix] = {"url": url, "alias_of": alias_of, "reason": reason}
+
+    def check_redirect(self, suffix, url, final_url):
+        """
+        Returns the URL of the page already seen at the host `url` ended up at, or None
+        (remembering this page for that host).
+        """
+        host = site_host(final_url or url)
+        seen = self.hosts.setdefault(host, url)
+        if seen == url:
+            return None
+        self.add_alias(suffix, url, seen, "redirect")
+        return seen
+
+    def check_content(self, suffix, url, extracted):
+        """
+        Returns the URL of an earlier page with the same or nearly the same extracted
+        text, or None (remembering this page). Pages without text are never aliased.
+        """
+        text = page_fingerprint_text(extracted)
+        if not text:
+            return None
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        seen = self.hashes.setdefault(digest, url)
+        if seen != url:
+            self.add_alias(suffix, url, seen, "duplicate")
+            return seen
+        signature = minhash(text)
+        keys = [(i, signature[i * _ROWS:(i + 1) * _ROWS].tobytes()) for i in range(_BANDS)]
+        compared = set()
+        for key in keys:
+            for other, other_url in self.bands.get(key, ()):
+                if other_url in compared:
+                    continue
+                compared.add(other_url)
+                if (signature == other).mean() >= NEAR_DUPLICATE_SIMILARITY:
+                    self.add_alias(suffix, url, other_url, "near-duplicate")
+                    return other_url
+        for key in keys:
+            self.bands.setdefault(key, []).append((signature, url))
+        return None
+
+    def update_stats(self, stats):
+        """
+        Adds "unique" (reachable sites that are not aliases) and "aliases" to `stats`.
+        """
+        stats["aliases"] = dict(sorted(self.aliases.items()))
+        stats["unique"] = stats["total_pinged"] - len(self.aliases)
@@ -1,25 +1,117 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, simpledialog
+import asyncio
+import importlib
 import os
-import re
+import queue
 import sys
 import threading
-from pinger import ping_domains, get_all_tlds
-from bs import save_html_files
-from report import write_report
+from htmlstream import PARSERS
+
+# Lines kept in the log; older ones are dropped
+MAX_LOG_LINES = 5000
+# How often the UI applies queued events (ms), and at most how many per round
+DRAIN_INTERVAL_MS = 100
+MAX_EVENTS_PER_DRAIN = 5000
+# Modules a run needs; they are imported in the background once the window is shown,
+# so the window appears without waiting for them and the first run does not either
+RUN_MODULES = ("bs", "pinger", "report", "history", "httpcache", "probestore", "journal", "nlp")
+
+
+class UiEvents:
+    """
+    Thread-safe queue of UI updates from the scraper thread: log lines, status text,
+    progress (percent), message boxes and the end of the run. The Tk main loop drains
+    it on a timer, so worker threads never touch widgets.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def log(self, msg):
+        self.queue.put(("log", msg))
+
+    def status(self, text):
+        self.queue.put(("status", text))
+
+    def progress(self, percent):
+        self.queue.put(("progress", percent))
+
+    def message(self, icon, title, text):
+        self.queue.put(("message", (icon, title, text)))
+
+    def finished(self):
+        self.queue.put(("finished", None))
+
+    def drain(self, limit=MAX_EVENTS_PER_DRAIN):
+        """
+        Returns up to `limit` queued events as (kind, value), oldest first.
+        """
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+
+class RunControl:
+    """
+    Lets the Tk thread cancel the asyncio run of the scraper thread: cancel() cancels
+    the task passed to run(), so in-flight requests stop and files, caches and the
+    journal are closed on the way out.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.task = None
+        self.cancelled = False
+
+    async def run(self, coro):
+        with self.lock:
+            self.loop = asyncio.get_running_loop()
+            self.task = asyncio.current_task()
+            cancelled = self.cancelled
+        if cancelled:
+            coro.close()
+            raise asyncio.CancelledError
+        return await coro
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.task is not None:
+                try:
+                    self.loop.call_soon_threadsafe(self.task.cancel)
+                except RuntimeError:
+                    pass  # The run has already finished
 
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
 
 def resource_path(relative_path):
     # Get absolute path to resource, works for dev and for PyInstaller .exe
     if hasattr(sys, '_MEIPASS'):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath(os.path.dirname(__file__)), relative_path)
-def start_gui():
+
+
+def preload_modules(names=RUN_MODULES):
+    """
+    Imports the modules in `names`, skipping any that fail (the run reports those).
+    """
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def start_gui(on_ready=None):
+    """
+    Builds and runs the main window. `on_ready(root)` is called once the window is
+    shown (used to measure time-to-first-window).
+    """
     import tkinter.filedialog as fd
     # Root window
     root = tk.Tk()
@@ -53,7 +145,11 @@ def start_gui():
     logo_img = None
     logo_path = resource_path(os.path.join("logo", "log.png"))
     try:
-        if PIL_AVAILABLE:
+        from PIL import Image, ImageTk
+    except ImportError:
+        Image = None
+    try:
+        if Image is not None:
             img = Image.open(logo_path)
             max_width = 128
             if img.width > max_width:
@@ -81,10 +177,10 @@ def start_gui():
     base_entry = ttk.Entry(frame, width=30)
     base_entry.pack(fill=tk.X, pady=(0, 10))
 
-    # Threads
-    ttk.Label(frame, text="Number of threads (default 20):", font=("Segoe UI", 10)).pack(anchor="w")
+    # Concurrent pings
+    ttk.Label(frame, text="Concurrent pings (default 200, max 5000):", font=("Segoe UI", 10)).pack(anchor="w")
     max_workers_entry = ttk.Entry(frame, width=10)
-    max_workers_entry.insert(0, "20")
+    max_workers_entry.insert(0, "200")
     max_workers_entry.pack(fill=tk.X, pady=(0, 10))
 
     # TLDs
@@ -131,6 +227,33 @@ def start_gui():
     ttk.Checkbutton(format_frame, text="JSON", variable=var_json, style='TCheckbutton').pack(side=tk.LEFT, padx=2)
     ttk.Checkbutton(format_frame, text="HTML", variable=var_html, style='TCheckbutton').pack(side=tk.LEFT, padx=2)
 
+    # Parser engine
+    parser_frame = ttk.Frame(frame, style='TFrame')
+    parser_frame.pack(anchor="w", pady=(0, 10))
+    ttk.Label(parser_frame, text="HTML parser:", font=("Segoe UI", 10)).pack(side=tk.LEFT)
+    parser_var = tk.StringVar(value="stream")
+    ttk.Combobox(parser_frame, textvariable=parser_var, values=PARSERS, state="readonly", width=12).pack(side=tk.LEFT, padx=(5, 0))
+
+    # Single-pass pipeline (scrape each page as soon as its ping succeeds)
+    var_single_pass = tk.BooleanVar(value=False)
+    ttk.Checkbutton(frame, text="Single pass (scrape while pinging, fetch each page once)", variable=var_single_pass, style='TCheckbutton').pack(anchor="w", pady=(0, 10))
+
+    # HTTP cache (conditional requests, skip unchanged pages)
+    var_use_cache = tk.BooleanVar(value=True)
+    ttk.Checkbutton(frame, text="Reuse cached pages (skip unchanged pages)", variable=var_use_cache, style='TCheckbutton').pack(anchor="w", pady=(0, 10))
+
+    # Incremental sweeps: remembered probe results are reused unless a full sweep is forced
+    var_full_sweep = tk.BooleanVar(value=False)
+    ttk.Checkbutton(frame, text="Force full sweep (ignore remembered ping results)", variable=var_full_sweep, style='TCheckbutton').pack(anchor="w", pady=(0, 10))
+
+    # Resume an interrupted run from its journal
+    var_resume = tk.BooleanVar(value=False)
+    ttk.Checkbutton(frame, text="Resume interrupted run (skip finished pings and pages)", variable=var_resume, style='TCheckbutton').pack(anchor="w", pady=(0, 10))
+
+    # Keywords (TF-IDF across all sites of the base) and sentiment after scraping
+    var_nlp = tk.BooleanVar(value=True)
+    ttk.Checkbutton(frame, text="Analyze keywords/sentiment", variable=var_nlp, style='TCheckbutton').pack(anchor="w", pady=(0, 10))
+
     # Status + progress
     status_label = ttk.Label(frame, text="", foreground="#2a3b4c", font=("Segoe UI", 10, "italic"), style='TLabel')
     status_label.pack(anchor="w", pady=(0, 5))
@@ -143,16 +266,65 @@ def start_gui():
     log_widget = scrolledtext.ScrolledText(frame, width=60, height=18, font=("Consolas", 10), background="#f8fafc", borderwidth=1, relief="solid")
     log_widget.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
 
+    # Events from the scraper thread are applied here, in batches on a timer
+    events = UiEvents()
+    control = [None]
+
+    def apply_events():
+        pending = {"lines": [], "status": None, "progress": None}
+
+        def flush():
+            if pending["lines"]:
+                append_log(pending["lines"])
+                pending["lines"] = []
+            if pending["status"] is not None:
+                status_label.config(text=pending["status"])
+            if pending["progress"] is not None:
+                progress_var.set(pending["progress"])
+            pending["status"] = pending["progress"] = None
+
+        # Only the last status and progress of a batch are shown
+        for kind, value in events.drain():
+            if kind == "log":
+                pending["lines"].append(value)
+            elif kind in ("status", "progress"):
+                pending[kind] = value
+            elif kind == "message":
+                flush()
+                icon, title, text = value
+                (messagebox.showerror if icon == "error" else messagebox.showinfo)(title, text)
+            elif kind == "finished":
+                control[0] = None
+                run_button.state(["!disabled"])
+                cancel_button.state(["disabled"])
+        flush()
+        root.after(DRAIN_INTERVAL_MS, apply_events)
+
+    def append_log(lines):
+        log_widget.insert(tk.END, "\n".join(lines) + "\n")
+        # Keep at most MAX_LOG_LINES lines (the widget always ends with an empty line)
+        excess = int(log_widget.index("end-1c").split(".")[0]) - 1 - MAX_LOG_LINES
+        if excess > 0:
+            log_widget.delete("1.0", f"{excess + 1}.0")
+        log_widget.see(tk.END)
+
     # Run handler
     def on_run():
-        log_widget.delete(1.0, tk.END)
-        base = base_entry.get()
+        from pinger import is_valid_domain
+
+        base = base_entry.get().strip()
+        if not base:
+            messagebox.showerror("Input Error", "Please enter a base domain name.")
+            return
+        if not is_valid_domain(base):
+            messagebox.showerror("Input Error", "Invalid base domain name. Only letters, numbers, and hyphens allowed.")
+            return
         try:
             max_workers = int(max_workers_entry.get())
-            if max_workers < 1 or max_workers > 100:
+            if max_workers < 1 or max_workers > 5000:
                 raise ValueError
         except ValueError:
-            messagebox.showerror("Input Error", "Number of threads must be an integer between 1 and 100.")
+            messagebox.showerror("Input Error", "Concurrent pings must be an integer between 1 and 5000.")
             return
         tlds_raw = tlds_entry.get().strip()
         if tlds_raw:
@@ -178,69 +350,126 @@ def start_gui():
             return
         run_scraper_thread.rate_limit = rate_limit
         run_scraper_thread.output_dir = output_dir_var.get()
-        threading.Thread(target=run_scraper_thread, args=(base, status_label, log_widget, max_workers, tlds, progress_var, progress_bar), daemon=True).start()
+        run_scraper_thread.single_pass = var_single_pass.get()
+        run_scraper_thread.parser = parser_var.get()
+        run_scraper_thread.use_cache = var_use_cache.get()
+        run_scraper_thread.full_sweep = var_full_sweep.get()
+        run_scraper_thread.nlp = var_nlp.get()
+        run_scraper_thread.resume = var_resume.get()
+        log_widget.delete(1.0, tk.END)
+        progress_var.set(0)
+        control[0] = RunControl()
+        run_button.state(["disabled"])
+        cancel_button.state(["!disabled"])
+        threading.Thread(target=run_scraper_thread, args=(base, events, control[0], max_workers, tlds), daemon=True).start()
 
-    ttk.Button(frame, text="Run Scraper", command=on_run, style='TButton').pack(pady=(5, 0), fill=tk.X)
+    def on_cancel():
+        if control[0] is not None:
+            control[0].cancel()
+            status_label.config(text="Cancelling...")
+            cancel_button.state(["disabled"])
+
+    buttons_frame = ttk.Frame(frame, style='TFrame')
+    buttons_frame.pack(pady=(5, 0), fill=tk.X)
+    run_button = ttk.Button(buttons_frame, text="Run Scraper", command=on_run, style='TButton')
+    run_button.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    cancel_button = ttk.Button(buttons_frame, text="Cancel", command=on_cancel, style='TButton')
+    cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+    cancel_button.state(["disabled"])
+    def window_ready():
+        threading.Thread(target=preload_modules, daemon=True).start()
+        if on_ready is not None:
+            on_ready(root)
+
+    root.after(DRAIN_INTERVAL_MS, apply_events)
+    root.after_idle(window_ready)
     root.mainloop()
 
 
-# Helpers used by the GUI
-def is_valid_domain(domain):
-    # Allow Norwegian characters å, ø, æ (both lower and upper case)
-    return re.match(r'^[a-zA-Z0-9\-åøæÅØÆ]{1,63}$', domain) is not None
+def run_scraper_thread(base, events, control, max_workers, tlds):
+    """
+    Runs a scrape in a background thread. All UI updates go through `events` (a
+    UiEvents), and the run can be stopped through `control` (a RunControl). A
+    cancelled run closes its journal, so it can be resumed.
+    """
+    try:
+        asyncio.run(control.run(scrape_async(base, events, max_workers, tlds)))
+    except asyncio.CancelledError:
+        events.status("Cancelled.")
+        events.log("Cancelled. Tick 'Resume interrupted run' to continue where it stopped.")
+    except Exception as e:
+        events.status("Failed.")
+        events.log(f"Failed: {e}")
+        events.message("error", "Error", str(e))
+    finally:
+        events.finished()
 
 
-def run_scraper_thread(base, status_label, log_widget, max_workers, tlds, progress_var, progress_bar):
-    base = base.strip()
-    if not base:
-        messagebox.showerror("Input Error", "Please enter a base domain name.")
-        return
-    if not is_valid_domain(base):
-        messagebox.showerror("Input Error", "Invalid base domain name. Only letters, numbers, and hyphens allowed.")
-        return
-    status_label.config(text="Pinging domains, please wait...")
-    log_widget.insert(tk.END, f"Starting scan for: {base}\n")
-    log_widget.see(tk.END)
-    log_widget.update()
-    progress_var.set(0)
-    progress_bar.update()
-    reachable_domains = ping_domains(base, suffixes=tlds, timeout=5, max_workers=max_workers)
-    if not reachable_domains:
-        status_label.config(text="No reachable domain found.")
-        log_widget.insert(tk.END, "No reachable domain found.\n")
-        log_widget.see(tk.END)
-        return
-    log_widget.insert(tk.END, f"Found {len(reachable_domains)} reachable domains.\n")
-    log_widget.see(tk.END)
-    log_widget.update()
-    status_label.config(text="Scraping domains...")
-    total = len(reachable_domains)
-    progress_var.set(0)
-    progress_bar.update()
-    completed = [0]
-
-    def log_callback(msg):
-        log_widget.insert(tk.END, msg + "\n")
-        log_widget.see(tk.END)
-        log_widget.update()
-        # Progress update
-        completed[0] += 1
-        percent = (completed[0] / total) * 100
-        progress_var.set(percent)
-        progress_bar.update()
+async def scrape_async(base, events, max_workers, tlds):
+    from bs import save_html_files_async, scan_and_save_async
+    from history import RunHistory, format_delta_lines
+    from httpcache import HttpCache
+    from journal import Journal, journal_path
+    from pinger import iter_reachable_async
+    from probestore import ProbeStore
+    from report import write_report
+    from timing import StageTimer
 
+    events.status("Pinging domains, please wait...")
+    events.log(f"Starting scan for: {base}")
     formats = getattr(run_scraper_thread, 'output_formats', ["txt"])
     tags_to_scrape = getattr(run_scraper_thread, 'tags_to_scrape', None)
     rate_limit = getattr(run_scraper_thread, 'rate_limit', 0.5)
     output_dir = getattr(run_scraper_thread, 'output_dir', os.path.abspath(os.getcwd()))
-    stats = save_html_files(base, reachable_domains, formats=formats, log_callback=log_callback, tags_to_scrape=tags_to_scrape, rate_limit=rate_limit, output_dir=output_dir)
-    report_path = write_report(base, stats, formats=formats)
-    status_label.config(text=f"Done! {stats['saved']} domains saved.")
-    progress_var.set(100)
-    progress_bar.update()
-    log_widget.insert(tk.END, f"Done! {stats['saved']} domains saved.\n")
-    log_widget.insert(tk.END, f"Report saved to {report_path}\n")
-    log_widget.see(tk.END)
-    messagebox.showinfo("Done", f"Done!\nReport saved to:\n{report_path}")
-
- 
+    parser = getattr(run_scraper_thread, 'parser', "html.parser")
+    use_cache = getattr(run_scraper_thread, 'use_cache', False)
+    full_sweep = getattr(run_scraper_thread, 'full_sweep', False)
+    nlp = getattr(run_scraper_thread, 'nlp', True)
+    journal = Journal(journal_path(base, output_dir), getattr(run_scraper_thread, 'resume', False))
+    store = ProbeStore()
+    cache = HttpCache() if use_cache else None
+    timer = StageTimer()
+
+    def progress(done, total):
+        events.progress((done / total) * 100 if total else 100)
+
+    try:
+        if getattr(run_scraper_thread, 'single_pass', False):
+            events.status("Pinging and scraping domains...")
+            reachable_domains, stats = await scan_and_save_async(base, suffixes=tlds, formats=formats, log_callback=events.log, progress_callback=progress, timeout=5, max_workers=min(max_workers, 100), tags_to_scrape=tags_to_scrape, output_dir=output_dir, parser=parser, cache=cache, store=store, full_sweep=full_sweep, timer=timer, nlp=nlp, journal=journal)
+        else:
+            final_urls = {}
+            reachable_domains = []
+            # Most likely TLDs are probed first; show every hit as it arrives
+            async for suffix, url in iter_reachable_async(base, tlds, limit=max_workers, connect_timeout=5, read_timeout=5, store=store, full_sweep=full_sweep, timer=timer, final_urls=final_urls, journal=journal, progress_callback=progress):
+                reachable_domains.append((suffix, url))
+                events.status(f"Pinging domains... {len(reachable_domains)} reachable so far")
+                events.log(f"Reachable: {url}")
+            if reachable_domains:
+                events.log(f"Found {len(reachable_domains)} reachable domains.")
+                events.status("Scraping domains...")
+                events.progress(0)
+                stats = await save_html_files_async(base, reachable_domains, formats=formats, log_callback=events.log, tags_to_scrape=tags_to_scrape, rate_limit=rate_limit, output_dir=output_dir, parser=parser, cache=cache, timer=timer, nlp=nlp, final_urls=final_urls, journal=journal, progress_callback=progress)
+    finally:
+        journal.close()
+        store.close()
+        if cache is not None:
+            cache.close()
+    # Recorded even without reachable domains, so domains that went away show up
+    history = RunHistory()
+    try:
+        delta = history.record_run(base, journal, stats if reachable_domains else {}, timer)[1]
+    finally:
+        history.close()
+    for line in format_delta_lines(delta):
+        events.log(line)
+    if not reachable_domains:
+        events.status("No reachable domain found.")
+        events.log("No reachable domain found.")
+        return
+    report_path = write_report(base, stats, formats=formats, output_dir=output_dir, timer=timer, delta=delta)
+    events.status(f"Done! {stats['saved']} pages saved.")
+    events.progress(100)
+    events.log(f"Done! {stats['saved']} pages saved.")
+    events.log(f"Report saved to {report_path}")
+    events.message("info", "Done", f"Done!\nReport saved to:\n{report_path}")
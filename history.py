@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+from dedup import page_fingerprint_text
+
+_HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.sqlite")
+# A domain counts as slower than in the previous run if its probe latency grew by
+# this factor and by at least this many seconds
+LATENCY_REGRESSION_FACTOR = 1.5
+LATENCY_REGRESSION_MIN = 0.2
+
+
+def content_fingerprint(extracted):
+    """
+    Returns a hash of the extracted text of a page (see dedup.page_fingerprint_text()),
+    so markup-only changes do not count as changed content.
+    """
+    return hashlib.sha1(page_fingerprint_text(extracted).encode("utf-8")).hexdigest()[:16]
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class RunHistory:
+    """
+    Local SQLite history of finished runs. Each run of a base gets a row in `runs`
+    (its totals) and a row in `results` per domain: reachability, HTTP status, probe
+    latency, seconds spent on the host, title and content hash of the page. To keep
+    the store small over months of sweeps, only reachable domains are stored, plus
+    the domains that were reachable in the previous run and are not any more.
+    Runs are indexed by (base, time) and results by (run, tld), so a diff or trend
+    only reads the rows it returns, however many runs are stored.
+    """
+
+    def __init__(self, path=_HISTORY_FILE):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                base TEXT NOT NULL,
+                finished_at REAL NOT NULL,
+                probed INTEGER NOT NULL,
+                reachable INTEGER NOT NULL,
+                saved INTEGER NOT NULL,
+                failed INTEGER NOT NULL,
+                not_useful INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS runs_base ON runs (base, finished_at);
+            CREATE TABLE IF NOT EXISTS results (
+                run_id INTEGER NOT NULL REFERENCES runs (id),
+                tld TEXT NOT NULL,
+                reachable INTEGER NOT NULL,
+                status INTEGER,
+                latency REAL,
+                seconds REAL,
+                final_url TEXT,
+                title TEXT,
+                content_hash TEXT,
+                alias TEXT,
+                PRIMARY KEY (run_id, tld)
+            ) WITHOUT ROWID;
+        """)
+        self.db.commit()
+
+    def last_run(self, base, before=None):
+        """
+        Returns (id, finished_at) of the latest run of `base` (before run id `before`
+        if given), or None.
+        """
+        if before is None:
+            return self.db.execute(
+                "SELECT id, finished_at FROM runs WHERE base = ? ORDER BY finished_at DESC LIMIT 1", (base,)
+            ).fetchone()
+        return self.db.execute(
+            "SELECT id, finished_at FROM runs WHERE base = ? AND finished_at < (SELECT finished_at FROM runs WHERE id = ?) "
+            "ORDER BY finished_at DESC LIMIT 1", (base, before)
+        ).fetchone()
+
+    def results(self, run_id):
+        """
+        Returns {tld: result dict} of the domains stored for run `run_id`.
+        """
+        rows = self.db.execute(
+            "SELECT tld, reachable, status, latency, seconds, final_url, title, content_hash, alias FROM results WHERE run_id = ?", (run_id,)
+        )
+        return {
+            tld: {"reachable": bool(reachable), "status": status, "latency": latency, "seconds": seconds,
+                  "final_url": final_url, "title": title, "content_hash": content_hash, "alias": alias}
+            for tld, reachable, status, latency, seconds, final_url, title, content_hash, alias in rows
+        }
+
+    def record_run(self, base, journal, stats, timer=None):
+        """
+        Stores the run of `base` whose probes and pages are in `journal` (a
+        journal.Journal), with totals from `stats` and the seconds spent per host from
+        `timer` (a timing.StageTimer). Returns (run id, delta against the previous
+        run; see diff()).
+        """
+        previous = self.last_run(base)
+        previous_reachable = set()
+        if previous is not None:
+            previous_reachable = {tld for tld, result in self.results(previous[0]).items() if result["reachable"]}
+        hosts = timer.hosts if timer is not None else {}
+        pages = dict(journal.pages)
+        probes = dict(journal.probes)
+        rows = []
+        for suffix, probe in probes.items():
+            if not probe["reachable"] and suffix not in previous_reachable:
+                continue
+            page = pages.get(suffix, {})
+            extracted = page.get("extracted")
+            host_times = hosts.get(urlparse(probe["url"]).hostname, {})
+            rows.append((
+                suffix, int(probe["reachable"]), probe.get("status"), probe.get("latency"),
+                round(sum(host_times.values()), 4) if host_times else None,
+                page.get("final_url") or probe.get("final_url"),
+                extracted.get("title") if extracted else None,
+                content_fingerprint(extracted) if extracted else None,
+                page.get("alias"),
+            ))
+        reachable = sum(1 for probe in probes.values() if probe["reachable"])
+        cursor = self.db.execute(
+            "INSERT INTO runs (base, finished_at, probed, reachable, saved, failed, not_useful) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (base, time.time(), len(probes), reachable, stats.get("saved", 0), stats.get("failed", 0), stats.get("not_useful", 0))
+        )
+        run_id = cursor.lastrowid
+        self.db.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [(run_id, *row) for row in rows])
+        self.db.commit()
+        return run_id, self.diff(run_id, base)
+
+    def diff(self, run_id, base):
+        """
+        Compares run `run_id` of `base` with the run before it. Returns a dict with the
+        time of the "previous_run" (None for the first run) and the tlds that are
+        "new" (reachable now but not then), "gone" (reachable then, probed now and not
+        reachable), "changed" (other content hash) and "slower" ({"tld", "before",
+        "after"} probe latencies, see LATENCY_REGRESSION_FACTOR), plus how many tlds
+        reachable then were "not_checked" now (e.g. the sweep stopped early).
+        """
+        previous = self.last_run(base, before=run_id)
+        if previous is None:
+            return {"previous_run": None}
+        before = self.results(previous[0])
+        after = self.results(run_id)
+        delta = {"previous_run": format_time(previous[1]), "new": [], "gone": [], "changed": [], "slower": [], "not_checked": 0}
+        for tld, now in sorted(after.items()):
+            then = before.get(tld)
+            was_reachable = then is not None and then["reachable"]
+            if not now["reachable"]:
+                if was_reachable:
+                    delta["gone"].append(tld)
+                continue
+            if not was_reachable:
+                delta["new"].append(tld)
+                continue
+            if now["content_hash"] and then["content_hash"] and now["content_hash"] != then["content_hash"]:
+                delta["changed"].append(tld)
+            if now["latency"] is not None and then["latency"] is not None:
+                if now["latency"] >= then["latency"] * LATENCY_REGRESSION_FACTOR and now["latency"] - then["latency"] >= LATENCY_REGRESSION_MIN:
+                    delta["slower"].append({"tld": tld, "before": then["latency"], "after": now["latency"]})
+        delta["not_checked"] = sum(1 for tld, then in before.items() if then["reachable"] and tld not in after)
+        return delta
+
+    def trend(self, base, tld=None, limit=30):
+        """
+        Returns the last `limit` runs of `base`, oldest first: with `tld`, a list of
+        (finished_at, result dict or None if it was not reachable), otherwise a list of
+        (finished_at, probed, reachable, saved, failed).
+        """
+        runs = self.db.execute(
+            "SELECT id, finished_at, probed, reachable, saved, failed FROM runs WHERE base = ? ORDER BY finished_at DESC LIMIT ?", (base, limit)
+        ).fetchall()[::-1]
+        if tld is None:
+            return [row[1:] for row in runs]
+        trend = []
+        for run_id, finished_at, *_ in runs:
+            row = self.db.execute(
+                "SELECT reachable, status, latency, seconds, title, content_hash FROM results WHERE run_id = ? AND tld = ?", (run_id, tld)
+            ).fetchone()
+            result = None
+            if row is not None and row[0]:
+                result = dict(zip(("status", "latency", "seconds", "title", "content_hash"), row[1:]))
+            trend.append((finished_at, result))
+        return trend
+
+    def close(self):
+        self.db.close()
+
+
+def format_delta_lines(delta, max_items=20):
+    """
+    Formats a RunHistory.diff() dict as report lines.
+    """
+    if delta.get("previous_run") is None:
+        return ["First recorded run of this base."]
+
+    def listed(items):
+        shown = ", ".join(items[:max_items])
+        return shown + (f" and {len(items) - max_items} more" if len(items) > max_items else "")
+
+    lines = [
+        f"{len(delta['new'])} new, {len(delta['gone'])} gone, {len(delta['changed'])} changed, "
+        f"{len(delta['slower'])} slower, {delta['not_checked']} not checked"
+    ]
+    for key in ("new", "gone", "changed"):
+        if delta[key]:
+            lines.append(f"{key.capitalize()}: {listed(delta[key])}")
+    if delta["slower"]:
+        lines.append("Slower: " + listed([f"{s['tld']} {s['before']:.2f}s -> {s['after']:.2f}s" for s in delta["slower"]]))
+    return lines
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Show the run history of a base: per-run totals, or one TLD over time.")
+    ap.add_argument("base", help="Base domain name")
+    ap.add_argument("--tld", help="Show this TLD (e.g. .no) over time instead of the run totals")
+    ap.add_argument("--runs", type=int, default=30, help="Number of latest runs to show (default: 30)")
+    ap.add_argument("--diff", action="store_true", help="Show what changed in the latest run")
+    ap.add_argument("--db", default=_HISTORY_FILE, help="History database (default: history.sqlite next to the app)")
+    args = ap.parse_args(argv)
+
+    history = RunHistory(args.db)
+    try:
+        if args.diff:
+            last = history.last_run(args.base)
+            if last is None:
+                print(f"No runs of {args.base} recorded.")
+                return 1
+            print(f"Run of {format_time(last[1])}:")
+            for line in format_delta_lines(history.diff(last[0], args.base), max_items=sys.maxsize):
+                print(f"  {line}")
+        elif args.tld:
+            tld = args.tld if args.tld.startswith(".") else f".{args.tld}"
+            print(f"{'finished':<20} {'status':>6} {'latency s':>10} {'seconds':>8}  {'hash':<16}  title")
+            for finished_at, result in history.trend(args.base, tld, args.runs):
+                if result is None:
+                    print(f"{format_time(finished_at):<20} {'-':>6}")
+                    continue
+                latency = f"{result['latency']:.3f}" if result["latency"] is not None else "-"
+                seconds = f"{result['seconds']:.2f}" if result["seconds"] is not None else "-"
+                print(f"{format_time(finished_at):<20} {result['status'] or '-':>6} {latency:>10} {seconds:>8}  {result['content_hash'] or '-':<16}  {result['title'] or ''}")
+        else:
+            print(f"{'finished':<20} {'probed':>7} {'reachable':>10} {'saved':>6} {'failed':>7}")
+            for finished_at, probed, reachable, saved, failed in history.trend(args.base, limit=args.runs):
+                print(f"{format_time(finished_at):<20} {probed:>7} {reachable:>10} {saved:>6} {failed:>7}")
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
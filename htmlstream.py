@@ -0,0 +1,180 @@
+import json
+from html.parser import HTMLParser
+
+# Parser engines accepted by bs.extract_page(); "stream" only materializes the wanted
+# elements. Defined here so the GUI can list them without loading the scraping stack.
+PARSERS = ("html.parser", "lxml", "stream")
+
+# Tags that never have content or an end tag (same set BeautifulSoup uses)
+_VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+    'image', 'isindex', 'nextid', 'spacer'
+}
+# Text inside these tags is not part of get_text() of the surrounding elements
+_NON_TEXT_TAGS = {'script', 'style', 'template'}
+
+
+class TargetedExtractor(HTMLParser):
+    """
+    Streaming extractor that only keeps the elements extract_page() needs: the first
+    <title>, the description/og:description meta tags, JSON-LD scripts and the text of
+    the requested tags. No document tree is built, so memory stays proportional to the
+    extracted text rather than to the page.
+
+    Feed the document (in one piece or in chunks) with feed(), then call close() and
+    result(). The result matches what the BeautifulSoup "html.parser" backend extracts.
+    """
+
+    def __init__(self, tags):
+        super().__init__(convert_charrefs=True)
+        self.targets = set(tags)
+        # Stack of open elements: [name, collected text parts or None, title node or None]
+        self.stack = []
+        self.non_text_depth = 0
+        self.title = None
+        # Children lists of the open elements inside the first <title>, root first
+        self.title_stack = None
+        self.meta_desc = None
+        self.og_desc = None
+        self.json_ld_parts = None
+        self.json_ld = []
+        self.h_tags = []
+        # Adjacent data events are merged into one string, as BeautifulSoup does
+        self.pending = []
+        # Void elements opened without "/>"; their stray end tags are ignored
+        self.closed_void = []
+
+    def flush(self):
+        if not self.pending:
+            return
+        data = "".join(self.pending)
+        self.pending = []
+        if self.title_stack:
+            self.title_stack[-1].append(data)
+        if self.json_ld_parts is not None:
+            self.json_ld_parts.append(data)
+        if self.non_text_depth:
+            return
+        text = data.strip()
+        if not text:
+            return
+        for _, parts, _ in self.stack:
+            if parts is not None:
+                parts.append(text)
+
+    def handle_starttag(self, tag, attrs, self_closing=False):
+        self.flush()
+        if tag == 'meta':
+            attrs = dict(attrs)
+            if self.meta_desc is None and attrs.get('name') == 'description':
+                self.meta_desc = attrs.get('content') or ""
+            if self.og_desc is None and attrs.get('property') == 'og:description':
+                self.og_desc = attrs.get('content') or ""
+        if tag in _VOID_TAGS:
+            if self.title_stack:
+                self.title_stack[-1].append([])
+            if not self_closing:
+                self.closed_void.append(tag)
+            return
+        parts = None
+        if tag in self.targets:
+            parts = []
+            # Reserve the slot now so results keep document order of the start tags
+            self.h_tags.append({"tag": tag, "text": parts})
+        title_node = None
+        if self.title_stack:
+            title_node = []
+            self.title_stack[-1].append(title_node)
+            self.title_stack.append(title_node)
+        elif tag == 'title' and self.title is None:
+            title_node = []
+            self.title_stack = [title_node]
+        self.stack.append([tag, parts, title_node])
+        if tag == 'script' and dict(attrs).get('type') == 'application/ld+json':
+            self.json_ld_parts = []
+        if tag in _NON_TEXT_TAGS:
+            self.non_text_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, self_closing=True)
+        self.close_element(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_void:
+            self.closed_void.remove(tag)
+            return
+        self.close_element(tag)
+
+    def close_element(self, tag):
+        self.flush()
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > i:
+            name, _, title_node = self.stack.pop()
+            if name in _NON_TEXT_TAGS:
+                self.non_text_depth -= 1
+            if title_node is not None:
+                self.title_stack.pop()
+                if not self.title_stack:
+                    self.finish_title(title_node)
+            if name == 'script' and self.json_ld_parts is not None:
+                if len(self.json_ld_parts) == 1:
+                    try:
+                        self.json_ld.append(json.loads(self.json_ld_parts[0]))
+                    except Exception:
+                        pass
+                self.json_ld_parts = None
+
+    def finish_title(self, node):
+        # Same rule as soup.title.string: follow single children down to a string
+        while len(node) == 1 and not isinstance(node[0], str):
+            node = node[0]
+        self.title = node[0] if len(node) == 1 else ""
+        self.title_stack = None
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_comment(self, data):
+        # Comments only matter for the title, where they count as a child string
+        self.flush()
+        if self.title_stack:
+            self.title_stack[-1].append(data)
+
+    def close(self):
+        super().close()
+        self.flush()
+        if self.title_stack:
+            self.finish_title(self.title_stack[0])
+
+    def result(self):
+        """
+        Returns (title, meta_description, og_description, json_ld, tags) in the same
+        shape as extract_page() builds them.
+        """
+        h_tags = []
+        for item in self.h_tags:
+            text = "".join(item["text"])
+            if text:
+                h_tags.append({"tag": item["tag"], "text": text})
+        return (
+            (self.title or "").strip(),
+            (self.meta_desc or "").strip(),
+            (self.og_desc or "").strip(),
+            self.json_ld,
+            h_tags
+        )
+
+
+def extract_elements_stream(text, tags):
+    """
+    Runs TargetedExtractor over a complete document and returns its result().
+    """
+    parser = TargetedExtractor(tags)
+    parser.feed(text)
+    parser.close()
+    return parser.result()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+_HTTP_CACHE_FILE = os.path.join(os.path.dirname(__file__), "http_cache.sqlite")
+_HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+# Seconds a writer waits for another process (see parallel.py) to release the database
+_HTTP_CACHE_BUSY_TIMEOUT = 30
+
+
+def content_hash(text):
+    """
+    Returns the SHA-256 hex digest of a page body.
+    """
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+class HttpCache:
+    """
+    On-disk response cache keyed by URL. For every page it keeps the validators
+    (ETag, Last-Modified), a hash of the body, the compressed body and the result of
+    extract_page(), so unchanged pages can skip the download, parse and file rewrite.
+    The total stored size is bounded; least recently used entries are evicted first.
+    The total is kept up to date by triggers, so every process sharing the file
+    (WAL mode) sees the same one without scanning the table.
+    Writes (put(), touch(), update_extracted()) are queued to one background thread
+    with its own connection, so a caller on the event loop never waits for another
+    process to release the database; reads see them once that thread has run them.
+    """
+
+    def __init__(self, path=_HTTP_CACHE_FILE, max_bytes=_HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = self.connect()
+        self.db.executescript("""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                extract_key TEXT,
+                extracted TEXT,
+                body BLOB,
+                size INTEGER,
+                last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE TABLE IF NOT EXISTS totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                size INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(size), 0) FROM responses;
+            CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN
+                UPDATE totals SET size = size + NEW.size WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN
+                UPDATE totals SET size = size - OLD.size WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses BEGIN
+                UPDATE totals SET size = size - OLD.size + NEW.size WHERE id = 0;
+            END;
+            COMMIT;
+        """)
+        self.writer = ThreadPoolExecutor(max_workers=1, initializer=self.open_writer)
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=_HTTP_CACHE_BUSY_TIMEOUT)
+        db.execute("PRAGMA journal_mode = WAL")
+        return db
+
+    def open_writer(self):
+        # Runs on the writer thread, the only one that uses this connection
+        self.write_db = self.connect()
+
+    def write(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print("Error writing HTTP cache:", e)
+
+    def get(self, url):
+        """
+        Returns the cached entry for `url` as a dict, or None.
+        """
+        row = self.db.execute(
+            "SELECT etag, last_modified, content_hash, extract_key, extracted, body FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, hash_, extract_key, extracted, body = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": hash_,
+            "extract_key": extract_key,
+            "extracted": json.loads(extracted),
+            "text": zlib.decompress(body).decode("utf-8")
+        }
+
+    def conditional_headers(self, entry):
+        """
+        Returns the If-None-Match / If-Modified-Since headers for a cached entry.
+        """
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, text, extracted, extract_key=None, etag=None, last_modified=None, hash_=None):
+        """
+        Queues a page for storing. `extract_key` identifies the extraction options (tags,
+        parser) the `extracted` result was produced with, so it is only reused for the
+        same options.
+        """
+        self.writer.submit(self.write, self.store, url, text, extracted, extract_key, etag, last_modified, hash_)
+
+    def store(self, url, text, extracted, extract_key, etag, last_modified, hash_):
+        body = zlib.compress(text.encode("utf-8"))
+        extracted = json.dumps(extracted, ensure_ascii=False)
+        # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire
+        # the trigger that keeps the total size
+        self.write_db.execute(
+            "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+            "etag = excluded.etag, last_modified = excluded.last_modified, content_hash = excluded.content_hash, "
+            "extract_key = excluded.extract_key, extracted = excluded.extracted, body = excluded.body, "
+            "size = excluded.size, last_used = excluded.last_used",
+            (url, etag, last_modified, hash_ or content_hash(text), extract_key, extracted, body, len(body) + len(extracted), time.time())
+        )
+        self.write_db.commit()
+        self.evict()
+
+    def update_extracted(self, pages):
+        """
+        Replaces the stored extract_page() results of `pages` ([(url, extracted)]), e.g.
+        with the keywords and sentiment of the NLP stage, so a cache hit does not have
+        to be analysed again.
+        """
+        self.writer.submit(self.write, self.store_extracted, pages)
+
+    def store_extracted(self, pages):
+        self.write_db.executemany(
+            "UPDATE responses SET size = size - LENGTH(extracted) + ?, extracted = ? WHERE url = ?",
+            [(len(text), text, url) for url, text in ((url, json.dumps(extracted, ensure_ascii=False)) for url, extracted in pages)]
+        )
+        self.write_db.commit()
+        self.evict()
+
+    def touch(self, url, etag=None, last_modified=None):
+        """
+        Marks an entry as used, updating its validators if the server sent new ones.
+        """
+        self.writer.submit(self.write, self.store_touch, url, etag, last_modified, time.time())
+
+    def store_touch(self, url, etag, last_modified, used):
+        self.write_db.execute(
+            "UPDATE responses SET last_used = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+            (used, etag, last_modified, url)
+        )
+        self.write_db.commit()
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the cache fits in max_bytes; runs on
+        the writer thread.
+        """
+        total = self.write_db.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        doomed = []
+        for url, size in self.write_db.execute("SELECT url, size FROM responses ORDER BY last_used"):
+            doomed.append((url,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self.write_db.executemany("DELETE FROM responses WHERE url = ?", doomed)
+        self.write_db.commit()
+
+    def flush(self):
+        """
+        Waits until every write queued so far has been run.
+        """
+        self.writer.submit(lambda: None).result()
+
+    def close(self):
+        """
+        Runs the queued writes and closes the cache.
+        """
+        self.writer.submit(lambda: self.write_db.close())
+        self.writer.shutdown()
+        self.db.close()
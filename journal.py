@@ -0,0 +1,116 @@
+import json
+import os
+import queue
+import threading
+
+
+def journal_path(base, output_dir=None):
+    """
+    Returns the path of the run journal of `base`: output_dir/base/base-journal.jsonl
+    (next to the report).
+    """
+    folder = os.path.join(output_dir, base) if output_dir else base
+    return os.path.join(folder, f"{base}-journal.jsonl")
+
+
+class Journal:
+    """
+    Append-only log (one JSON line per entry) of the probes and pages of one base
+    that have completed in the current run, so an interrupted run can be resumed.
+    Entries are written by a background thread and fsynced in batches of up to
+    `batch_size` entries (or every `flush_interval` seconds).
+    With resume, the entries of an earlier run are loaded into `probes` and `pages`
+    ({suffix: entry}) and new entries are appended; otherwise the journal starts empty.
+    New entries are added to `probes` and `pages` as well, so at the end of a run they
+    hold all of its work (see history.RunHistory.record_run()).
+    """
+
+    def __init__(self, path, resume=False, batch_size=100, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.probes = {}
+        self.pages = {}
+        if resume and os.path.exists(path):
+            self.load()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+        self.batch = []
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            # The last line is cut off if the run was killed mid-write; drop it so new
+            # entries start on a line of their own
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            (self.probes if entry["type"] == "probe" else self.pages)[entry["suffix"]] = entry
+
+    def probe(self, suffix, url, result):
+        """
+        Records the outcome of the probe of `suffix` (a probe_details_async() dict).
+        """
+        entry = {"type": "probe", "suffix": suffix, "url": url, "reachable": result["reachable"], "final_url": result.get("final_url"),
+                 "status": result.get("status"), "latency": result.get("latency"), "error": result.get("error")}
+        self.probes[suffix] = entry
+        self.queue.put(entry)
+
+    def page(self, suffix, url, counts, final_url=None, extracted=None, alias=None):
+        """
+        Records a page that is done: `counts` are the statistics it added (e.g.
+        {"saved": 2, "cache_hits": 1} or {"failed": 1}), `extracted` is its
+        extract_page() dict if it was stored, `alias` its dedup alias if it was not.
+        """
+        entry = {"type": "page", "suffix": suffix, "url": url, "counts": counts}
+        if final_url:
+            entry["final_url"] = final_url
+        if extracted is not None:
+            entry["extracted"] = extracted
+        if alias is not None:
+            entry["alias"] = alias
+        self.pages[suffix] = entry
+        self.queue.put(entry)
+
+    def restore_stats(self, stats):
+        """
+        Adds the statistics of every recorded page to `stats`.
+        """
+        for entry in self.pages.values():
+            for key, value in entry["counts"].items():
+                stats[key] = stats.get(key, 0) + value
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def work(self):
+        while True:
+            try:
+                entry = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush()
+                continue
+            if entry is None:
+                self.flush()
+                return
+            self.batch.append(json.dumps(entry, ensure_ascii=False) + "\n")
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        self.file.write("".join(self.batch))
+        self.batch = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
@@ -1,4 +1,12 @@
-from gui import start_gui
+import multiprocessing
+import sys
 
 if __name__ == "__main__":
-    start_gui()
\ No newline at end of file
+    # Needed for the parsing process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        # Any command-line arguments select the headless batch mode
+        from cli import main
+        sys.exit(main())
+    from gui import start_gui
+    start_gui()
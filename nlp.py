@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+_WORD = re.compile(r'\b\w{4,}\b')
+# Pages per sentiment task sent to the worker pool
+SENTIMENT_CHUNK = 64
+# Bumped when keywords or sentiment are computed differently, so stored results
+# from older versions are analysed again
+NLP_VERSION = 1
+
+
+def analysis_key(top_n=10, sentiment=True):
+    """
+    Returns the marker analyze_pages_async() stores in the "nlp" field of a page it
+    analysed with these options.
+    """
+    return f"v{NLP_VERSION}-top{top_n}" + ("-sentiment" if sentiment else "")
+
+
+def page_text(extracted):
+    """
+    Returns the text of a page used for keywords and sentiment: its scraped tags.
+    """
+    return ' '.join(h["text"] for h in extracted.get("tags") or [])
+
+
+def tfidf_keywords(documents, top_n=10):
+    """
+    Returns the `top_n` keywords of every document ranked by TF-IDF over the whole
+    set, so words that every site of a base shares (navigation, cookie banners) rank
+    below the words that set a site apart. Words are runs of 4+ word characters.
+    """
+    vocab = {}
+    doc_ids = []
+    term_ids = []
+    for i, document in enumerate(documents):
+        for word in _WORD.findall(document.lower()):
+            term_ids.append(vocab.setdefault(word, len(vocab)))
+            doc_ids.append(i)
+    n_docs = len(documents)
+    if not term_ids:
+        return [[] for _ in range(n_docs)]
+    n_terms = len(vocab)
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    # Count each (document, term) pair once
+    pairs, counts = np.unique(doc_ids * n_terms + np.asarray(term_ids, dtype=np.int64), return_counts=True)
+    docs = pairs // n_terms
+    terms = pairs % n_terms
+    df = np.bincount(terms, minlength=n_terms)
+    idf = np.log((1 + n_docs) / (1 + df)) + 1
+    lengths = np.bincount(doc_ids, minlength=n_docs)
+    scores = counts / lengths[docs] * idf[terms]
+    # By document, then best score first; ties keep the order words were first seen
+    order = np.lexsort((terms, -scores, docs))
+    sorted_docs = docs[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_docs, sorted_docs)
+    keep = order[rank < top_n]
+    words = list(vocab)
+    keywords = [[] for _ in range(n_docs)]
+    for doc, term in zip(docs[keep].tolist(), terms[keep].tolist()):
+        keywords[doc].append(words[term])
+    return keywords
+
+
+def sentiments(texts):
+    """
+    Returns TextBlob polarity/subjectivity for each text (None if TextBlob is missing
+    or fails). Runs in a worker process or thread.
+    """
+    try:
+        from textblob import TextBlob
+    except ImportError:
+        return [None] * len(texts)
+    results = []
+    for text in texts:
+        try:
+            blob = TextBlob(text)
+            results.append({
+                "polarity": round(blob.sentiment.polarity, 2),
+                "subjectivity": round(blob.sentiment.subjectivity, 2)
+            })
+        except Exception:
+            results.append(None)
+    return results
+
+
+async def analyze_pages_async(pages, executor=None, top_n=10, sentiment=True, keep_analysed=False):
+    """
+    Sets "keywords" (TF-IDF across all `pages`) and "sentiment" on every extract_page()
+    dict in `pages`. Sentiment runs in chunks on `executor` (a process or thread pool,
+    on the event loop if None); sentiment=False leaves it None.
+    Every analysed page gets the analysis_key() of the options in its "nlp" field.
+    With keep_analysed, pages that already carry that key (e.g. unchanged pages from
+    the HTTP cache) keep their keywords and sentiment; they still count for the
+    document frequencies of the others. Returns the pages that were analysed.
+    """
+    key = analysis_key(top_n, sentiment)
+    if keep_analysed:
+        todo = [i for i, page in enumerate(pages) if page.get("nlp") != key]
+    else:
+        todo = list(range(len(pages)))
+    if not todo:
+        return []
+    texts = [page_text(page) for page in pages]
+    loop = asyncio.get_running_loop()
+    if executor is not None:
+        keywords = await loop.run_in_executor(executor, tfidf_keywords, texts, top_n)
+    else:
+        keywords = tfidf_keywords(texts, top_n)
+    todo_texts = [texts[i] for i in todo]
+    scores = [None] * len(todo)
+    if sentiment:
+        chunks = [todo_texts[i:i + SENTIMENT_CHUNK] for i in range(0, len(todo_texts), SENTIMENT_CHUNK)]
+        if executor is not None:
+            results = await asyncio.gather(*(loop.run_in_executor(executor, sentiments, chunk) for chunk in chunks))
+        else:
+            results = [sentiments(chunk) for chunk in chunks]
+        scores = [score for chunk in results for score in chunk]
+    for i, score in zip(todo, scores):
+        pages[i]["keywords"] = keywords[i]
+        pages[i]["sentiment"] = score
+        pages[i]["nlp"] = key
+    return [pages[i] for i in todo]
+
+
+def analyze_pages(pages, executor=None, top_n=10, sentiment=True):
+    return asyncio.run(analyze_pages_async(pages, executor, top_n, sentiment))
+
+
+def load_folder(folder):
+    """
+    Returns {(output_dir, base): [(suffix, url, extracted)]} for the page JSON files
+    saved under `folder` (an output folder or a single base folder).
+    """
+    from bs import EXTRACT_FIELDS
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(folder, "**", "*.json"), recursive=True)):
+        base_folder = os.path.dirname(os.path.abspath(path))
+        base = os.path.basename(base_folder)
+        name = os.path.basename(path)[:-len(".json")]
+        if not name.startswith(base + "-"):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        # Reports and timing files live next to the pages but have no url/tags
+        if not isinstance(data, dict) or "url" not in data or "tags" not in data:
+            continue
+        extracted = {field: data.get(field) for field in EXTRACT_FIELDS}
+        pages.setdefault((os.path.dirname(base_folder), base), []).append(("." + name[len(base) + 1:], data["url"], extracted))
+    return pages
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compute keywords (TF-IDF per base) and sentiment for pages that were saved without them.")
+    ap.add_argument("path", help="Output folder with saved JSON pages, or a results-*.jsonl shard")
+    ap.add_argument("--top", type=int, default=10, help="Keywords per page (default: 10)")
+    ap.add_argument("--workers", type=int, help="Sentiment worker processes (default: one per CPU)")
+    ap.add_argument("--no-sentiment", action="store_true", help="Only compute keywords")
+    args = ap.parse_args(argv)
+
+    from concurrent.futures import ProcessPoolExecutor
+    from bs import FileSink
+    from sink import ShardReader, ShardSink, shard_compression
+
+    if os.path.isfile(args.path):
+        by_base = {}
+        for record in ShardReader(args.path).records():
+            by_base.setdefault((None, record["base"]), []).append((record["suffix"], record["url"], record))
+        folder, name = os.path.split(args.path)
+        # Updates are appended to the same shard
+        sink = ShardSink(folder, (), None, shard_compression(args.path), name=name[:name.index(".jsonl")])
+    else:
+        by_base = load_folder(args.path)
+        sink = None
+    if not by_base:
+        print(f"No saved pages found in {args.path}")
+        return 1
+
+    async def run():
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for (output_dir, base), pages in by_base.items():
+                await analyze_pages_async([extracted for _, _, extracted in pages], executor, args.top, not args.no_sentiment)
+                page_sink = sink or FileSink(output_dir)
+                for suffix, url, extracted in pages:
+                    page_sink.update(base, suffix, url, extracted)
+                await page_sink.drain()
+                if page_sink is not sink:
+                    page_sink.close()
+                print(f"{base}: analyzed {len(pages)} pages")
+
+    asyncio.run(run())
+    if sink is not None:
+        sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
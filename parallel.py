@@ -0,0 +1,373 @@
+import asyncio
+import contextlib
+import math
+import multiprocessing
+import os
+import queue
+
+from body import DEFAULT_MAX_BYTES
+from bs import FileSink, analyze_and_update, make_parse_executor, save_html_files_async
+from crawl import BloomFilter, crawl_sites_async
+from dedup import Deduplicator
+from httpcache import HttpCache
+from history import RunHistory
+from journal import Journal, journal_path
+from pinger import get_all_tlds, iter_reachable_async, make_session
+from probestore import ProbeStore
+from report import write_report
+from resolver import CachedResolver, DnsCache
+from throttle import HostThrottle
+from timing import StageTimer
+from tldrank import rank_suffixes
+
+# Seconds between checks that the workers are still alive while waiting for results
+POLL_INTERVAL = 1.0
+
+
+def split_work(items, parts):
+    """
+    Deals `items` round-robin into up to `parts` lists, so every list gets its share
+    of the first (most likely) items. Empty lists are left out.
+    """
+    return [items[i::parts] for i in range(parts) if items[i::parts]]
+
+
+def merge_stats(stats, delta):
+    """
+    Adds the statistics a worker returned for its share of a base to `stats`.
+    "total_pinged" and "unique" are left to the coordinator, which sees all of them.
+    """
+    for key, value in delta.items():
+        if key in ("total_pinged", "unique", "aliases"):
+            continue
+        stats[key] = stats.get(key, 0) + value
+
+
+class RemoteJournal:
+    """
+    Stands in for a journal.Journal in a worker process: holds the entries an
+    interrupted run recorded for the task's share of a base and sends new entries to
+    the coordinator, which writes them to the journal of the base.
+    """
+    restore_stats = Journal.restore_stats
+
+    def __init__(self, results, base, probes=None, pages=None):
+        self.results = results
+        self.base = base
+        self.probes = probes or {}
+        self.pages = pages or {}
+
+    def probe(self, *args):
+        self.results.put(("journal", self.base, "probe", args, {}))
+
+    def page(self, *args, **kwargs):
+        self.results.put(("journal", self.base, "page", args, kwargs))
+
+
+def worker_main(index, tasks, results, options):
+    """
+    Entry point of a worker process: runs tasks from `tasks` on its own event loop
+    until it gets None. Without logging, the pinger's output is silenced too.
+    """
+    if options["log"]:
+        asyncio.run(run_worker(index, tasks, results, options))
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(run_worker(index, tasks, results, options))
+
+
+async def run_worker(index, tasks, results, options):
+    loop = asyncio.get_running_loop()
+    if options["resolvers"] is not None:
+        resolver, http_resolver = options["resolvers"]()
+    else:
+        resolver, http_resolver = None, CachedResolver()
+    dns_cache = DnsCache() if options["use_dns_cache"] else DnsCache(None)
+    store = ProbeStore() if options["use_store"] else None
+    cache = HttpCache() if options["use_cache"] else None
+    rate_limit = options["rate_limit"]
+    max_concurrent = options["max_concurrent"]
+    sem = asyncio.Semaphore(max_concurrent)
+    throttle = HostThrottle(rate=1 / rate_limit if rate_limit > 0 else None, max_concurrency=max_concurrent)
+    session = make_session(options["limit"], options["limit_per_host"], http_resolver)
+    seen = BloomFilter() if options["crawl_depth"] else None
+
+    def log(msg):
+        results.put(("log", msg))
+    log_callback = log if options["log"] else None
+
+    try:
+        while True:
+            task = await loop.run_in_executor(None, tasks.get)
+            if task is None:
+                break
+            kind, task_id, base, items, extra = task
+            timer = StageTimer()
+            try:
+                if kind == "probe":
+                    journal = RemoteJournal(results, base, probes=extra["journal"])
+                    final_urls = {}
+                    hits = []
+                    async for suffix, url in iter_reachable_async(
+                            base, items, connect_timeout=options["timeout"], read_timeout=options["timeout"],
+                            resolver=resolver, dns_cache=dns_cache, store=store, full_sweep=options["full_sweep"],
+                            session=session, http_resolver=http_resolver, timer=timer, scheme=options["scheme"],
+                            final_urls=final_urls, journal=journal, rank=False, time_budget=options["time_budget"],
+                            max_hits=extra["max_hits"], max_probes=extra["max_probes"]):
+                        hits.append((suffix, url))
+                    results.put(("probed", task_id, base, hits, final_urls, timer))
+                else:
+                    journal = RemoteJournal(results, base, pages=extra["journal"])
+                    pages = []
+                    common = dict(
+                        tags_to_scrape=options["tags_to_scrape"], output_dir=options["output_dir"], parser=options["parser"],
+                        parse_mode="inline", cache=cache, session=session, sem=sem, throttle=throttle, timer=timer,
+                        max_bytes=options["max_bytes"], raw_gzip=options["raw_gzip"], nlp=False,
+                        final_urls=extra["final_urls"], dedup=options["dedup"], pages=pages)
+                    if options["crawl_depth"]:
+                        stats = await crawl_sites_async(
+                            base, items, options["formats"], log_callback, max_concurrent, rate_limit, max_depth=options["crawl_depth"],
+                            max_pages=options["max_pages"], max_site_bytes=options["max_site_bytes"], seen=seen, **common)
+                    else:
+                        stats = await save_html_files_async(base, items, options["formats"], log_callback, max_concurrent, rate_limit, journal=journal, **common)
+                    results.put(("scraped", task_id, base, stats, pages, timer))
+            except Exception as e:
+                results.put(("failed", task_id, base, f"{type(e).__name__}: {e}"))
+    finally:
+        await session.close()
+        if store is not None:
+            store.close()
+        if cache is not None:
+            cache.close()
+        # The coordinator merges the lookups of all workers and saves the cache once
+        results.put(("exit", index, dns_cache.new_entries()))
+
+
+async def sweep_parallel_async(bases, processes=None, suffixes=None, formats=None, tags_to_scrape=None, rate_limit=0.5, output_dir=None,
+                               limit=200, limit_per_host=0, max_concurrent=10, timeout=5, parser="stream", use_cache=True,
+                               full_sweep=False, log_callback=None, max_bytes=DEFAULT_MAX_BYTES, raw_gzip=False, nlp=True, dedup=True,
+                               resume=False, time_budget=None, max_hits=None, max_probes=None, resolvers=None, scheme="https",
+                               use_dns_cache=True, use_store=True, timers=None,
+                               crawl_depth=0, max_pages=50, max_site_bytes=20 * 1024 * 1024, use_history=True):
+    """
+    Sweeps and scrapes `bases` like cli.sweep_bases_async(), spread over `processes`
+    worker processes (one per CPU by default). Each worker has its own event loop,
+    connection pool (`limit` connections), download semaphore and per-host throttle,
+    and parses on its own loop, so the run is not held to one core.
+    The (base, tld) candidates of every base are ranked (see tldrank.rank_suffixes())
+    and dealt round-robin over as many workers as there are free for it: a whole base
+    per task once there are at least as many bases as processes. Workers stream back
+    their hits, journal entries and, per task, the statistics, pages and stage timings
+    of their share. Once every probe of a base is in, the coordinator drops the
+    candidates that redirect to a host another one serves and hands the rest out for
+    scraping; once every page is in, it runs the NLP stage over all pages of the base,
+    merges the statistics and timings and writes the report. Workers only read the DNS
+    cache and send their new lookups when they exit; the coordinator merges them and
+    saves the cache once.
+    Redirects are grouped over the whole base; identical and near-duplicate pages only
+    within a worker's share when a base is split. `time_budget` applies to every share,
+    `max_hits` and `max_probes` are split between the shares. With crawl_depth > 0,
+    sites are crawled as in crawl.crawl_sites_async().
+    `resolvers` is a picklable callable returning the (DNS resolver, aiohttp resolver)
+    each worker uses instead of the system ones, `scheme` the scheme that is probed,
+    and use_dns_cache=False / use_store=False / use_history=False leave the DNS cache /
+    probe store / run history alone.
+    With a dict as `timers`, the merged timing.StageTimer of every base is stored in it.
+    Returns {base: stats} (None for a base that failed).
+    """
+    formats = formats or ["txt"]
+    processes = processes or os.cpu_count() or 1
+    if suffixes is None:
+        suffixes = [s if s.startswith('.') else f'.{s}' for s in get_all_tlds()]
+    log = log_callback or (lambda msg: None)
+    store = ProbeStore() if use_store else None
+    try:
+        ranked = rank_suffixes(suffixes, store)
+    finally:
+        if store is not None:
+            store.close()
+    options = {
+        "formats": formats, "tags_to_scrape": tags_to_scrape, "rate_limit": rate_limit, "output_dir": output_dir,
+        "limit": limit, "limit_per_host": limit_per_host, "max_concurrent": max_concurrent, "timeout": timeout,
+        "parser": parser, "use_cache": use_cache, "full_sweep": full_sweep, "log": log_callback is not None,
+        "max_bytes": max_bytes, "raw_gzip": raw_gzip, "dedup": dedup, "time_budget": time_budget,
+        "resolvers": resolvers, "scheme": scheme, "use_dns_cache": use_dns_cache,
+        "use_store": use_store, "crawl_depth": crawl_depth, "max_pages": max_pages, "max_site_bytes": max_site_bytes
+    }
+    # Shares per base: enough to keep every worker busy
+    shares = max(1, math.ceil(processes / max(1, len(bases))))
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue()
+    results_queue = context.Queue()
+    workers = [context.Process(target=worker_main, args=(i, tasks, results_queue, options), daemon=True) for i in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    loop = asyncio.get_running_loop()
+    executor = make_parse_executor() if nlp else None
+    journals = {base: Journal(journal_path(base, output_dir), resume) for base in bases}
+    history = RunHistory() if use_history else None
+    dns_cache = DnsCache() if use_dns_cache else None
+    # The NLP stage runs here, so its results are stored in the cache from here too
+    cache = HttpCache() if use_cache and nlp else None
+    results = {}
+    state = {base: {"pending": set(), "hits": {}, "final_urls": {}, "pages": [], "timer": StageTimer(), "phase": "probe", "failed": None} for base in bases}
+    task_ids = iter(range(1 << 62))
+    finishing = []
+
+    def submit(kind, base, items, extra):
+        task_id = next(task_ids)
+        state[base]["pending"].add(task_id)
+        tasks.put((kind, task_id, base, items, extra))
+
+    def fail(base, error):
+        if state[base]["failed"] is None:
+            state[base]["failed"] = error
+
+    for base in bases:
+        probe_shares = split_work(ranked, shares)
+        for share in probe_shares:
+            share_set = set(share)
+            submit("probe", base, share, {
+                "journal": {suffix: entry for suffix, entry in journals[base].probes.items() if suffix in share_set},
+                "max_hits": math.ceil(max_hits / len(probe_shares)) if max_hits else None,
+                "max_probes": math.ceil(max_probes / len(probe_shares)) if max_probes else None
+            })
+
+    def start_scrape(base):
+        base_state = state[base]
+        order = {suffix: i for i, suffix in enumerate(ranked)}
+        reachable = sorted(base_state["hits"].items(), key=lambda hit: order.get(hit[0], len(order)))
+        if max_hits:
+            reachable = reachable[:max_hits]
+        log(f"[{base}] Found {len(reachable)} reachable domains.")
+        base_state["phase"] = "scrape"
+        base_state["deduplicator"] = Deduplicator() if dedup else None
+        base_state["stats"] = {"total_pinged": len(reachable), "saved": 0, "failed": 0, "not_useful": 0}
+        if crawl_depth:
+            base_state["stats"].update({"pages_crawled": 0, "bytes_crawled": 0, "robots_blocked": 0})
+        if use_cache:
+            base_state["stats"].update({"cache_hits": 0, "cache_revalidated": 0, "cache_misses": 0})
+        to_fetch = reachable
+        if base_state["deduplicator"] is not None:
+            to_fetch = base_state["deduplicator"].plan(reachable, base_state["final_urls"])
+        journal = journals[base]
+        for share in split_work(to_fetch, shares):
+            share_suffixes = {suffix for suffix, _ in share}
+            submit("scrape", base, share, {
+                "journal": {suffix: entry for suffix, entry in journal.pages.items() if suffix in share_suffixes},
+                "final_urls": {suffix: url for suffix, url in base_state["final_urls"].items() if suffix in share_suffixes}
+            })
+        if not base_state["pending"]:
+            finishing.append(asyncio.ensure_future(finish(base)))
+
+    async def finish(base):
+        base_state = state[base]
+        try:
+            stats = base_state["stats"]
+            if base_state["deduplicator"] is not None:
+                base_state["deduplicator"].update_stats(stats)
+            if nlp and base_state["pages"]:
+                sink = FileSink(output_dir, formats, log_callback, raw_gzip)
+                try:
+                    await analyze_and_update(base_state["pages"], executor, sink, base_state["timer"], cache)
+                finally:
+                    await sink.drain()
+                    sink.close()
+            delta = history.record_run(base, journals[base], stats, base_state["timer"])[1] if history is not None else None
+            report_path = await loop.run_in_executor(None, lambda: write_report(base, stats, formats=formats, output_dir=output_dir, timer=base_state["timer"], delta=delta))
+            log(f"[{base}] Done! {stats['saved']} pages saved. Report saved to {report_path}")
+            results[base] = stats
+            if timers is not None:
+                timers[base] = base_state["timer"]
+        except Exception as e:
+            log(f"[{base}] Failed: {e}")
+            results[base] = None
+
+    def get_message():
+        try:
+            return results_queue.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            return None
+
+    def handle(message):
+        kind = message[0]
+        if kind == "log":
+            log(message[1])
+            return
+        if kind == "journal":
+            _, base, method, args, kwargs = message
+            getattr(journals[base], method)(*args, **kwargs)
+            return
+        if kind == "exit":
+            exited[0] += 1
+            if dns_cache is not None:
+                dns_cache.merge(message[2])
+            return
+        task_id, base = message[1], message[2]
+        base_state = state[base]
+        base_state["pending"].discard(task_id)
+        if kind == "failed":
+            fail(base, message[3])
+        elif kind == "probed":
+            _, _, _, hits, final_urls, timer = message
+            base_state["hits"].update(hits)
+            base_state["final_urls"].update(final_urls)
+            base_state["timer"].merge(timer)
+        elif kind == "scraped":
+            _, _, _, delta, pages, timer = message
+            merge_stats(base_state["stats"], delta)
+            if base_state["deduplicator"] is not None:
+                base_state["deduplicator"].aliases.update(delta.get("aliases", {}))
+            base_state["pages"] += pages
+            base_state["timer"].merge(timer)
+        if base_state["pending"]:
+            return
+        if base_state["failed"] is not None:
+            log(f"[{base}] Failed: {base_state['failed']}")
+            results[base] = None
+        elif base_state["phase"] == "probe":
+            start_scrape(base)
+        else:
+            finishing.append(asyncio.ensure_future(finish(base)))
+
+    exited = [0]
+    try:
+        while any(base_state["pending"] for base_state in state.values()):
+            message = await loop.run_in_executor(None, get_message)
+            if message is None:
+                if not all(worker.is_alive() for worker in workers):
+                    raise RuntimeError("A worker process exited unexpectedly")
+                continue
+            handle(message)
+        await asyncio.gather(*finishing)
+        for _ in workers:
+            tasks.put(None)
+        # Pass on what the workers still send until they have closed their caches
+        while exited[0] < len(workers):
+            message = await loop.run_in_executor(None, get_message)
+            if message is None:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+            else:
+                handle(message)
+    finally:
+        for worker in workers:
+            worker.join(timeout=POLL_INTERVAL)
+            if worker.is_alive():
+                worker.terminate()
+        for journal in journals.values():
+            journal.close()
+        if history is not None:
+            history.close()
+        if cache is not None:
+            cache.close()
+        if dns_cache is not None:
+            dns_cache.save()
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+
+def sweep_parallel(bases, processes=None, **kwargs):
+    return asyncio.run(sweep_parallel_async(bases, processes, **kwargs))
@@ -1,75 +1,395 @@
-import requests
+import asyncio
+import aiohttp
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 
-import os
+import collections
+import re
 import time
 
-_TLD_CACHE_FILE = os.path.join(os.path.dirname(__file__), "tlds_cache.txt")
-_TLD_CACHE_TTL = 60 * 60 * 24  # 1 day
+from body import DEFAULT_MAX_BYTES, read_requests_response
+from probestore import is_definite
+from resolver import CachedResolver, DnsCache, is_nxdomain_error, resolve_hosts
+from timing import trace_config
+from tldrank import rank_suffixes
+from tlds import get_tlds
 
-def get_all_tlds():
+def get_all_tlds(categories=None, cctld=None):
     """
-    Returns a list of all active top-level domains (TLDs), using a local cache if available and fresh.
+    Returns a list of all active top-level domains (TLDs), optionally only those of the
+    given categories or only (not) ccTLDs. See tlds.get_tlds().
     """
-    url = "https://raw.githubusercontent.com/incognico/list-of-top-level-domains/master/tlds.csv"
-    # Check cache
-    if os.path.exists(_TLD_CACHE_FILE):
-        mtime = os.path.getmtime(_TLD_CACHE_FILE)
-        if time.time() - mtime < _TLD_CACHE_TTL:
-            try:
-                with open(_TLD_CACHE_FILE, "r", encoding="utf-8") as f:
-                    tlds = [line.strip() for line in f if line.strip() and not line.startswith("#")]
-                return tlds
-            except Exception as e:
-                print("Error reading TLD cache:", e)
-    # Download and cache
+    return get_tlds(categories, cctld)
+
+def fetch_website_details(url, timeout=5, headers=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Fetches the given URL and returns a dict with "reachable" (HTTP 200), the "status"
+    (None if no response), the final "url", "headers", body "text" and whether it was
+    "truncated" (the last three only when reachable), and the "error" that stopped it:
+    None, "status" (answered with another status), "nxdomain" (the name does not exist),
+    "timeout" or "connection". The body is streamed and cut off after `max_bytes`.
+    """
+    import requests
+
+    result = {"reachable": False, "status": None, "url": None, "headers": None, "text": None, "truncated": False, "error": None}
     try:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        lines = resp.text.splitlines()
-        tlds = [line.split(",")[0].strip() for line in lines if line.strip() and not line.startswith("#")]
-        try:
-            with open(_TLD_CACHE_FILE, "w", encoding="utf-8") as f:
-                for tld in tlds:
-                    f.write(tld + "\n")
-        except Exception as e:
-            print("Error writing TLD cache:", e)
-        return tlds
+        response = requests.get(url, timeout=timeout, headers=headers, stream=True)
+        result.update(status=response.status_code, url=response.url)
+        if response.status_code != 200:
+            response.close()
+            result["error"] = "status"
+            return result
+        text, truncated = read_requests_response(response, max_bytes)
+    except requests.Timeout:
+        result["error"] = "timeout"
+        return result
     except requests.RequestException as e:
-        print("Error fetching TLD list:", e)
-        # Try to use cache even if stale
-        if os.path.exists(_TLD_CACHE_FILE):
-            try:
-                with open(_TLD_CACHE_FILE, "r", encoding="utf-8") as f:
-                    tlds = [line.strip() for line in f if line.strip() and not line.startswith("#")]
-                return tlds
-            except Exception as e:
-                print("Error reading TLD cache:", e)
-        return []
+        result["error"] = "nxdomain" if is_nxdomain_error(e) else "connection"
+        return result
+    result.update(reachable=True, headers=dict(response.headers), text=text, truncated=truncated)
+    return result
+
+def fetch_website(url, timeout=5, headers=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Fetches the given URL and returns a dict with the response details (status, final url,
+    headers, body text and whether it was "truncated") if it responds with HTTP 200,
+    otherwise None. See fetch_website_details().
+    """
+    result = fetch_website_details(url, timeout, headers, max_bytes)
+    if not result["reachable"]:
+        return None
+    return {key: result[key] for key in ("status", "url", "headers", "text", "truncated")}
 
 def ping_website(url, timeout=5):
     """
     Returns True if the given URL responds with HTTP 200, otherwise False.
     """
-    try:
-        response = requests.get(url, timeout=timeout)
-        return response.status_code == 200
-    except requests.RequestException:
-        return False
+    return fetch_website(url, timeout=timeout) is not None
+
+def is_valid_domain(domain):
+    # Allow Norwegian characters å, ø, æ (both lower and upper case)
+    return re.match(r'^[a-zA-Z0-9\-åøæÅØÆ]{1,63}$', domain) is not None
 
-def ping_domains(base, suffixes=None, timeout=5, max_workers=20):
+def build_candidates(base, suffixes=None, scheme="https"):
     """
-    Tries each suffix in `suffixes` for the given `base` domain name in parallel.
+    Returns a list of tuples (suffix, url) to try for the given `base` domain name.
     If suffixes is None, fetches all TLDs using get_all_tlds().
-    Returns a list of tuples (suffix, url) for all reachable domains.
+    `scheme` is only changed for local test servers that do not speak TLS.
     """
     if suffixes is None:
         suffixes = get_all_tlds()
         # Add a dot to each TLD if not already present
         suffixes = [s if s.startswith('.') else f'.{s}' for s in suffixes]
+    return [(suffix, f"{scheme}://{base}{suffix}") for suffix in suffixes]
+
+def make_session(limit=200, limit_per_host=0, http_resolver=None):
+    """
+    Returns an aiohttp session over one shared connector with the given total and
+    per-host connection limits, resolving names through `http_resolver` if given.
+    Requests made with a timing trace_request_ctx are timed (see timing.trace_config()).
+    Must be called from a running event loop.
+    """
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, ttl_dns_cache=300, resolver=http_resolver)
+    headers = {"User-Agent": "Mozilla/5.0 (compatible; DomainScraper/1.0)"}
+    return aiohttp.ClientSession(connector=connector, headers=headers, trace_configs=[trace_config()])
+
+async def probe_details_async(session, url, connect_timeout=5, read_timeout=5, method="head", timer=None):
+    """
+    Async reachability check that avoids downloading the body.
+    Sends a HEAD request (falling back to a one-byte ranged GET if the server rejects HEAD),
+    or only the ranged GET if method is "get".
+    Returns a dict with "reachable" (HTTP 200, or 206 for the ranged GET), the last
+    "status" (None if no response), "latency" in seconds, the "final_url" after redirects
+    and the "error" if there was no answer: "nxdomain", "timeout" or "connection".
+    The latency is also added to `timer` (a timing.StageTimer) as the "probe" stage.
+    """
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+    result = {"reachable": False, "status": None, "latency": None, "final_url": None, "error": None}
+    start = time.monotonic()
+    try:
+        if method == "head":
+            async with session.head(url, allow_redirects=True, timeout=timeout) as response:
+                result.update(status=response.status, final_url=str(response.url))
+                if response.status == 200:
+                    result["reachable"] = True
+                # Only retry with GET when the server does not support HEAD
+                if response.status not in (405, 501):
+                    return result
+        async with session.get(url, headers={"Range": "bytes=0-0"}, allow_redirects=True, timeout=timeout) as response:
+            result.update(status=response.status, final_url=str(response.url), reachable=response.status in (200, 206))
+    except asyncio.TimeoutError:
+        result["error"] = "timeout"
+    except (aiohttp.ClientError, ValueError) as e:
+        result["error"] = "nxdomain" if is_nxdomain_error(e) else "connection"
+    finally:
+        result["latency"] = round(time.monotonic() - start, 4)
+        if timer is not None:
+            timer.add("probe", result["latency"], urlparse(url).hostname)
+    return result
+
+async def probe_website_async(session, url, connect_timeout=5, read_timeout=5, method="head"):
+    """
+    Returns True if the URL responds with HTTP 200 (or 206 for the ranged GET), otherwise
+    False. See probe_details_async().
+    """
+    return (await probe_details_async(session, url, connect_timeout, read_timeout, method))["reachable"]
+
+async def iter_reachable_async(base, suffixes=None, limit=200, limit_per_host=0, connect_timeout=5, read_timeout=5, method="head", resolve_dns=True, dns_concurrency=100, resolver=None, dns_cache=None, store=None, full_sweep=False, recheck_reachable=True, session=None, http_resolver=None, timer=None, scheme="https", final_urls=None, journal=None, rank=True, time_budget=None, max_hits=None, max_probes=None, progress_callback=None):
+    """
+    Probes the candidate domains of `base` and yields (suffix, url) for every reachable
+    one as soon as its probe succeeds. All probes go through one shared aiohttp
+    connector, so thousands can be in flight from a single thread: `limit` caps the
+    total number of open connections (and probes in flight), `limit_per_host` the
+    connections per host (0 means no per-host cap).
+    With rank, candidates are probed most likely first (see tldrank.rank_suffixes(),
+    which learns from `store`), so the usual hits arrive in the first seconds.
+    With resolve_dns, candidates are resolved ahead of the probes by a separate stage
+    (`dns_concurrency` lookups at a time, using `resolver` and the on-disk `dns_cache`)
+    that feeds the names that exist to the probe workers, so names that do not exist
+    are dropped before any HTTP request is made. Names whose lookup failed for a
+    transient reason are skipped without recording an outcome.
+    With a probestore.ProbeStore as `store` the sweep is incremental: only suffixes that
+    ProbeStore.plan() selects are probed (all of them with full_sweep), fresh reachable
+    results it skips are yielded as they are, and every outcome is recorded except
+    transient failures (see probestore.is_definite()).
+    To share one connection pool between several sweeps, pass an existing `session`
+    (see make_session()) together with the CachedResolver its connector uses as
+    `http_resolver`; `limit` and `limit_per_host` then come from that connector.
+    DNS lookups and probes are timed into `timer` (a timing.StageTimer) if given.
+    With a dict as `final_urls`, the URL every reachable domain ended up at after
+    redirects is stored in it by suffix (see save_html_files_async()).
+    Every probe outcome is recorded in `journal` (a journal.Journal) if given; probes it
+    already holds from an interrupted run are not sent again, unless they failed for a
+    transient reason.
+    The sweep stops early after `time_budget` seconds, `max_hits` reachable domains or
+    `max_probes` probes; probes still in flight are then cancelled.
+    progress_callback(done, total) is called after every candidate that had to be
+    probed (`total` of them).
+    """
+    start = time.monotonic()
+    if suffixes is None:
+        suffixes = [s if s.startswith('.') else f'.{s}' for s in get_all_tlds()]
+    if rank:
+        suffixes = rank_suffixes(suffixes, store)
+    urls = build_candidates(base, suffixes, scheme)
+    known_hits = []
+    outcomes = []
+    if journal is not None:
+        for suffix, url in urls:
+            entry = journal.probes.get(suffix)
+            if entry is not None and entry["reachable"]:
+                known_hits.append((suffix, url))
+                if final_urls is not None and entry["final_url"]:
+                    final_urls[suffix] = entry["final_url"]
+        # Transient failures are probed again
+        urls = [(suffix, url) for suffix, url in urls if suffix not in journal.probes or not is_definite(journal.probes[suffix])]
+    if store is not None:
+        to_probe, known = store.plan(base, [suffix for suffix, _ in urls], full_sweep, recheck_reachable)
+        to_probe, known = set(to_probe), set(known)
+        known_hits += [(suffix, url) for suffix, url in urls if suffix in known]
+        if known and (final_urls is not None or journal is not None):
+            stored = store.get(base)
+            for suffix, url in urls:
+                if suffix in known:
+                    if final_urls is not None and stored[suffix]["final_url"]:
+                        final_urls[suffix] = stored[suffix]["final_url"]
+                    if journal is not None:
+                        journal.probe(suffix, url, stored[suffix])
+        urls = [(suffix, url) for suffix, url in urls if suffix in to_probe]
+    own_session = session is None
+    if own_session:
+        http_resolver = CachedResolver()
+        session = make_session(limit, limit_per_host, http_resolver)
+    cache = None
+    if resolve_dns:
+        cache = dns_cache if dns_cache is not None else DnsCache()
+    pending = collections.deque(urls)
+    # Names that resolved, in the order the resolver stage finished them; None tells a
+    # probe worker that no more are coming
+    resolved_queue = asyncio.Queue()
+    found = asyncio.Queue()
+    probes = [0]
+    # Candidates whose lookup failed for a transient reason; they are not recorded, so
+    # the next run tries them again
+    dns_failed = set()
+
+    def record(suffix, url, result):
+        outcomes.append((suffix, result))
+        if journal is not None:
+            journal.probe(suffix, url, result)
+        if progress_callback is not None:
+            progress_callback(len(outcomes) + len(dns_failed), len(urls))
+
+    def probing_done():
+        return max_probes is not None and probes[0] >= max_probes
+
+    def resolving_done():
+        # Enough names are probed or waiting to be probed to reach max_probes
+        return max_probes is not None and probes[0] + resolved_queue.qsize() >= max_probes
+
+    async def resolver_worker():
+        # Resolves ahead of the probes, so names that do not exist never take an HTTP slot
+        while pending and not resolving_done():
+            suffix, url = pending.popleft()
+            host = urlparse(url).hostname
+            resolved = await resolve_hosts([host], resolver=resolver, cache=cache, timer=timer, failed=dns_failed)
+            if host in dns_failed:
+                if progress_callback is not None:
+                    progress_callback(len(outcomes) + len(dns_failed), len(urls))
+                continue
+            if host not in resolved:
+                # The name does not exist
+                record(suffix, url, {"reachable": False, "error": "nxdomain"})
+                continue
+            if http_resolver is not None:
+                http_resolver.update(resolved)
+            resolved_queue.put_nowait((suffix, url))
+
+    async def resolver_stage(resolvers, probers):
+        try:
+            await asyncio.gather(*resolvers)
+        finally:
+            for _ in range(probers):
+                resolved_queue.put_nowait(None)
+
+    async def next_candidate():
+        if not resolve_dns:
+            return pending.popleft() if pending else None
+        return await resolved_queue.get()
+
+    async def worker():
+        while not probing_done():
+            candidate = await next_candidate()
+            # Another worker may have taken the last probe while this one waited
+            if candidate is None or probing_done():
+                return
+            suffix, url = candidate
+            probes[0] += 1
+            result = await probe_details_async(session, url, connect_timeout, read_timeout, method, timer)
+            record(suffix, url, result)
+            if result["reachable"]:
+                print(f"Domain {url} is reachable.")
+                if final_urls is not None:
+                    final_urls[suffix] = result["final_url"]
+                found.put_nowait((suffix, url))
+
+    hits = 0
+    workers = []
+    resolvers = []
+    finished = None
+    try:
+        for hit in known_hits:
+            yield hit
+            hits += 1
+            if max_hits is not None and hits >= max_hits:
+                return
+        # One worker per connection, so candidates are probed in their ranked order
+        size = min(session.connector.limit or len(urls), len(urls))
+        workers = [asyncio.create_task(worker()) for _ in range(size)]
+        if resolve_dns:
+            # DNS runs as its own stage with `dns_concurrency` lookups in flight
+            resolvers = [asyncio.create_task(resolver_worker()) for _ in range(min(dns_concurrency, len(urls)))]
+            resolvers.append(asyncio.create_task(resolver_stage(resolvers[:], size)))
+        finished = asyncio.ensure_future(asyncio.wait(workers))
+        while True:
+            get = asyncio.ensure_future(found.get())
+            remaining = None if time_budget is None else max(0, start + time_budget - time.monotonic())
+            done, _ = await asyncio.wait({get, finished}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if get not in done:
+                get.cancel()
+                if finished not in done:
+                    break  # Out of time
+                for task in workers:
+                    task.result()
+                while not found.empty():
+                    yield found.get_nowait()
+                break
+            yield get.result()
+            hits += 1
+            if max_hits is not None and hits >= max_hits:
+                break
+    finally:
+        if finished is not None:
+            finished.cancel()
+        for task in workers + resolvers:
+            task.cancel()
+        await asyncio.gather(*workers, *resolvers, return_exceptions=True)
+        if own_session:
+            await session.close()
+        # A cache passed in by the caller is saved by the caller, once for all its sweeps
+        if cache is not None and dns_cache is None:
+            cache.save()
+        if store is not None:
+            store.record_many(base, outcomes)
+
+def iter_reachable(*args, **kwargs):
+    """
+    Synchronous generator version of iter_reachable_async() for threads without an
+    event loop (e.g. the GUI worker); takes the same arguments.
+    """
+    loop = asyncio.new_event_loop()
+    hits = iter_reachable_async(*args, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(hits.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(hits.aclose())
+        loop.close()
+
+async def ping_domains_async(base, suffixes=None, limit=200, limit_per_host=0, connect_timeout=5, read_timeout=5, method="head", resolve_dns=True, dns_concurrency=100, resolver=None, dns_cache=None, store=None, full_sweep=False, recheck_reachable=True, session=None, http_resolver=None, timer=None, scheme="https", final_urls=None, journal=None, rank=True, time_budget=None, max_hits=None, max_probes=None):
+    """
+    Asyncio version of ping_domains: collects everything iter_reachable_async() yields
+    (same arguments). Returns a list of tuples (suffix, url) for all reachable domains.
+    """
+    reachable = [hit async for hit in iter_reachable_async(
+        base, suffixes, limit, limit_per_host, connect_timeout, read_timeout, method, resolve_dns, dns_concurrency,
+        resolver, dns_cache, store, full_sweep, recheck_reachable, session, http_resolver, timer, scheme, final_urls,
+        journal, rank, time_budget, max_hits, max_probes
+    )]
+    if not reachable:
+        print("No reachable domains found.")
+    return reachable
+
+def ping_domains(base, suffixes=None, timeout=5, max_workers=20, engine="async", connect_timeout=None, read_timeout=None, limit_per_host=0, method="head", resolve_dns=True, dns_concurrency=100, store=None, full_sweep=False, timer=None, final_urls=None, journal=None, time_budget=None, max_hits=None, max_probes=None):
+    """
+    Tries each suffix in `suffixes` for the given `base` domain name in parallel.
+    If suffixes is None, fetches all TLDs using get_all_tlds().
+    With engine="async" (default) the probes run on aiohttp with `max_workers` concurrent
+    connections after a DNS pre-resolution stage (see ping_domains_async);
+    engine="threads" uses the old requests + ThreadPoolExecutor pinger.
+    With a probestore.ProbeStore as `store` the async engine only re-probes expired or
+    previously reachable entries, unless full_sweep is set.
+    The async engine fills `final_urls` (if given) with the final URL of every
+    reachable domain, records and resumes probes through `journal`, probes the most
+    likely TLDs first and stops at `time_budget` seconds, `max_hits` or `max_probes`
+    (see iter_reachable_async()).
+    Returns a list of tuples (suffix, url) for all reachable domains.
+    """
+    if engine == "async":
+        return asyncio.run(ping_domains_async(
+            base, suffixes,
+            limit=max_workers,
+            limit_per_host=limit_per_host,
+            connect_timeout=connect_timeout if connect_timeout is not None else timeout,
+            read_timeout=read_timeout if read_timeout is not None else timeout,
+            method=method,
+            resolve_dns=resolve_dns,
+            dns_concurrency=dns_concurrency,
+            store=store,
+            full_sweep=full_sweep,
+            timer=timer,
+            final_urls=final_urls,
+            journal=journal,
+            time_budget=time_budget,
+            max_hits=max_hits,
+            max_probes=max_probes
+        ))
 
     reachable = []
-    urls = [(suffix, f"https://{base}{suffix}") for suffix in suffixes]
+    urls = build_candidates(base, suffixes)
 
     def check(suffix_url):
         suffix, url = suffix_url
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import time
+
+_PROBE_STORE_FILE = os.path.join(os.path.dirname(__file__), "probe_store.sqlite")
+_PROBE_POSITIVE_TTL = 60 * 60 * 12  # 12 hours
+_PROBE_NEGATIVE_TTL = 60 * 60 * 24 * 7  # 1 week
+# Seconds a writer waits for another process (see parallel.py) to release the database
+_PROBE_STORE_BUSY_TIMEOUT = 30
+# Answers that may well change on the next try (timeouts, rate limits, server errors)
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def is_definite(result):
+    """
+    Returns True if a probe result (see pinger.probe_details_async()) is worth keeping
+    for its full TTL: reachable, a name that does not exist, or an HTTP answer that
+    trying again will not change. Timeouts, connection errors and retryable statuses
+    are transient.
+    """
+    if result["reachable"] or result.get("error") == "nxdomain":
+        return True
+    status = result.get("status")
+    return status is not None and status not in RETRYABLE_STATUSES
+
+
+class ProbeStore:
+    """
+    Local SQLite store of probe outcomes per (base, tld): reachable flag, HTTP status
+    (None when the name did not resolve), latency in seconds, final URL after redirects
+    and the time it was last checked. Reachable and unreachable results expire after
+    separate TTLs, which plan() uses to decide what an incremental sweep has to probe.
+    """
+
+    def __init__(self, path=_PROBE_STORE_FILE, positive_ttl=_PROBE_POSITIVE_TTL, negative_ttl=_PROBE_NEGATIVE_TTL):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.db = sqlite3.connect(path, timeout=_PROBE_STORE_BUSY_TIMEOUT)
+        # WAL lets the worker processes of a parallel sweep read while one writes
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS probes (
+                base TEXT NOT NULL,
+                tld TEXT NOT NULL,
+                reachable INTEGER NOT NULL,
+                status INTEGER,
+                latency REAL,
+                final_url TEXT,
+                checked_at REAL NOT NULL,
+                PRIMARY KEY (base, tld)
+            )
+        """)
+        self.db.commit()
+
+    def get(self, base):
+        """
+        Returns {tld: result dict} of every stored probe for `base`.
+        """
+        rows = self.db.execute(
+            "SELECT tld, reachable, status, latency, final_url, checked_at FROM probes WHERE base = ?", (base,)
+        )
+        return {
+            tld: {"reachable": bool(reachable), "status": status, "latency": latency, "final_url": final_url, "checked_at": checked_at}
+            for tld, reachable, status, latency, final_url, checked_at in rows
+        }
+
+    def tld_hit_rates(self):
+        """
+        Returns {tld: (reachable, probed)} counted over every base in the store, with
+        tlds without the leading dot.
+        """
+        rows = self.db.execute("SELECT tld, SUM(reachable), COUNT(*) FROM probes GROUP BY tld")
+        return {tld.lstrip("."): (hits, total) for tld, hits, total in rows}
+
+    def is_fresh(self, result, now=None):
+        ttl = self.positive_ttl if result["reachable"] else self.negative_ttl
+        return result["checked_at"] + ttl > (now or time.time())
+
+    def plan(self, base, suffixes, full_sweep=False, recheck_reachable=True):
+        """
+        Splits `suffixes` for an incremental sweep of `base`. Returns (to_probe, known),
+        where to_probe are the suffixes that have no result, an expired result, or were
+        reachable last time (unless recheck_reachable is False and the result is still
+        fresh), and known are the fresh reachable suffixes that are not probed again.
+        With full_sweep every suffix is probed.
+        """
+        if full_sweep:
+            return list(suffixes), []
+        stored = self.get(base)
+        now = time.time()
+        to_probe = []
+        known = []
+        for suffix in suffixes:
+            result = stored.get(suffix)
+            if result is None or not self.is_fresh(result, now):
+                to_probe.append(suffix)
+            elif result["reachable"]:
+                if recheck_reachable:
+                    to_probe.append(suffix)
+                else:
+                    known.append(suffix)
+        return to_probe, known
+
+    def record_many(self, base, results):
+        """
+        Stores probe results for `base`; `results` is a list of (tld, result dict).
+        Transient failures (see is_definite()) are left out, so the next sweep probes
+        them again instead of skipping them for the negative TTL.
+        """
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(base, tld, int(r["reachable"]), r.get("status"), r.get("latency"), r.get("final_url"), now)
+             for tld, r in results if is_definite(r)]
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
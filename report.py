@@ -1,17 +1,56 @@
 import os
+import csv
+import json
 from datetime import datetime
+from history import format_delta_lines
+from timing import format_stage_lines
 
-def write_report(base, stats, formats=("txt",)):
+def write_report(base, stats, formats=("txt",), output_dir=None, timer=None, delta=None):
+    """
+    Writes the scrape report for `base` in the given formats to output_dir/base
+    (or ./base) and returns the path of the text report.
+    With a timing.StageTimer as `timer`, per-stage latency percentiles are added to
+    every format and the per-host timings are written to base-timings.json.
+    If duplicate sites were detected (stats["unique"] and stats["aliases"]), the unique
+    count is reported next to the reachable one and the aliases are written to
+    base-aliases.json. Crawl statistics (crawl.crawl_sites_async()) are reported too.
+    With `delta` (history.RunHistory.diff()), the changes since the previous run are
+    listed: new and gone domains, changed content and slower domains.
+    """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     report_lines = [
         f"Scrape report for '{base}':",
         f"Timestamp: {timestamp}",
         f"Total pinged: {stats['total_pinged']}",
-        f"Saved: {stats['saved']}",
+        f"Pages saved: {stats['saved']}",
         f"Failed to scrape: {stats['failed']}",
         f"Not useful scrape: {stats['not_useful']}",
     ]
-    report_dir = base
+    has_unique = "unique" in stats
+    if has_unique:
+        aliases = stats["aliases"]
+        redirects = sum(1 for alias in aliases.values() if alias["reason"] == "redirect")
+        unique_line = f"Unique sites: {stats['unique']} of {stats['total_pinged']} reachable ({redirects} redirects, {len(aliases) - redirects} duplicates)"
+        report_lines.insert(3, unique_line)
+    has_crawl = "pages_crawled" in stats
+    if has_crawl:
+        crawl_line = f"Crawled: {stats['pages_crawled']} pages ({stats['bytes_crawled']} characters), {stats['robots_blocked']} blocked by robots.txt"
+        report_lines.append(crawl_line)
+    has_cache = "cache_hits" in stats
+    if has_cache:
+        cache_line = f"HTTP cache: {stats['cache_hits']} hits, {stats['cache_revalidated']} revalidated, {stats['cache_misses']} misses"
+        report_lines.append(cache_line)
+    delta_lines = format_delta_lines(delta) if delta is not None else []
+    if delta_lines:
+        delta_title = f"Since previous run ({delta['previous_run']}):" if delta.get("previous_run") else "History:"
+        report_lines.append(delta_title)
+        report_lines += [f"  {line}" for line in delta_lines]
+    stages = timer.summary() if timer is not None else {}
+    stage_lines = format_stage_lines(stages)
+    if stage_lines:
+        report_lines.append("Stage latency:")
+        report_lines += [f"  {line}" for line in stage_lines]
+    report_dir = os.path.join(output_dir, base) if output_dir else base
     os.makedirs(report_dir, exist_ok=True)
     report_paths = {}
     if "txt" in formats:
@@ -23,15 +62,32 @@ def write_report(base, stats, formats=("txt",)):
         csv_path = os.path.join(report_dir, f"{base}-report.csv")
         with open(csv_path, "w", newline='', encoding="utf-8") as f:
             writer = csv.writer(f)
-            writer.writerow(["base", "timestamp", "total_pinged", "saved", "failed", "not_useful"])
-            writer.writerow([
+            header = ["base", "timestamp", "total_pinged", "saved", "failed", "not_useful"]
+            row = [
                 base,
                 timestamp,
                 stats["total_pinged"],
                 stats["saved"],
                 stats["failed"],
                 stats["not_useful"]
-            ])
+            ]
+            if has_unique:
+                header += ["unique", "aliases"]
+                row += [stats["unique"], len(stats["aliases"])]
+            if has_crawl:
+                header += ["pages_crawled", "bytes_crawled", "robots_blocked"]
+                row += [stats["pages_crawled"], stats["bytes_crawled"], stats["robots_blocked"]]
+            if has_cache:
+                header += ["cache_hits", "cache_revalidated", "cache_misses"]
+                row += [stats["cache_hits"], stats["cache_revalidated"], stats["cache_misses"]]
+            if delta is not None and delta.get("previous_run"):
+                header += ["previous_run", "new", "gone", "changed", "slower", "not_checked"]
+                row += [delta["previous_run"], len(delta["new"]), len(delta["gone"]), len(delta["changed"]), len(delta["slower"]), delta["not_checked"]]
+            for stage, summary in stages.items():
+                header += [f"{stage}_count", f"{stage}_p50", f"{stage}_p95", f"{stage}_p99"]
+                row += [summary["count"], summary["p50"], summary["p95"], summary["p99"]]
+            writer.writerow(header)
+            writer.writerow(row)
         report_paths["csv"] = csv_path
     if "json" in formats:
         json_path = os.path.join(report_dir, f"{base}-report.json")
@@ -39,25 +95,48 @@ def write_report(base, stats, formats=("txt",)):
             json.dump({
                 "base": base,
                 "timestamp": timestamp,
-                **stats
+                **stats,
+                **({"delta": delta} if delta is not None else {}),
+                **({"stages": stages} if stages else {})
             }, f, indent=2)
         report_paths["json"] = json_path
     if "html" in formats:
         html_path = os.path.join(report_dir, f"{base}-report.html")
+        unique_item = f"<li><b>Unique sites:</b> {unique_line[len('Unique sites: '):]}</li>" if has_unique else ""
+        crawl_item = f"<li><b>Crawled:</b> {crawl_line[len('Crawled: '):]}</li>" if has_crawl else ""
+        cache_item = f"<li><b>HTTP cache:</b> {cache_line[len('HTTP cache: '):]}</li>" if has_cache else ""
+        delta_items = "".join(f"<li>{line}</li>" for line in delta_lines)
+        delta_list = f"<li><b>{delta_title}</b><ul>{delta_items}</ul></li>" if delta_items else ""
+        stage_items = "".join(f"<li>{line}</li>" for line in stage_lines)
+        stage_list = f"<li><b>Stage latency:</b><ul>{stage_items}</ul></li>" if stage_items else ""
         html_content = f"""
         <html><head><meta charset='utf-8'><title>Scrape report for '{base}'</title></head><body>
         <h2>Scrape report for '{base}'</h2>
         <ul>
         <li><b>Timestamp:</b> {timestamp}</li>
         <li><b>Total pinged:</b> {stats['total_pinged']}</li>
-        <li><b>Saved:</b> {stats['saved']}</li>
+        {unique_item}
+        <li><b>Pages saved:</b> {stats['saved']}</li>
         <li><b>Failed to scrape:</b> {stats['failed']}</li>
         <li><b>Not useful scrape:</b> {stats['not_useful']}</li>
+        {crawl_item}
+        {cache_item}
+        {delta_list}
+        {stage_list}
         </ul>
         </body></html>
         """
         with open(html_path, "w", encoding="utf-8") as f:
             f.write(html_content)
         report_paths["html"] = html_path
+    if has_unique and stats["aliases"]:
+        aliases_path = os.path.join(report_dir, f"{base}-aliases.json")
+        with open(aliases_path, "w", encoding="utf-8") as f:
+            json.dump(stats["aliases"], f, indent=2)
+        report_paths["aliases"] = aliases_path
+    if timer is not None and timer.hosts:
+        timings_path = os.path.join(report_dir, f"{base}-timings.json")
+        timer.write_hosts(timings_path)
+        report_paths["timings"] = timings_path
     # Return the text report path for backward compatibility
     return report_paths.get("txt")
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import socket
+import time
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+_DNS_CACHE_FILE = os.path.join(os.path.dirname(__file__), "dns_cache.json")
+_DNS_POSITIVE_TTL = 60 * 60  # 1 hour
+_DNS_NEGATIVE_TTL = 60 * 60 * 24  # 1 day
+
+# getaddrinfo errors that mean "this name does not exist" rather than a transient failure
+_NXDOMAIN_ERRNOS = {socket.EAI_NONAME}
+if hasattr(socket, "EAI_NODATA"):
+    _NXDOMAIN_ERRNOS.add(socket.EAI_NODATA)
+
+
+class NXDomain(Exception):
+    """Raised by resolvers when a host name does not exist."""
+
+
+def is_nxdomain_error(error):
+    """
+    Returns True if `error` (e.g. from requests or aiohttp) was caused by a lookup that
+    found the name does not exist, following the exceptions it wraps.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, NXDomain):
+            return True
+        if isinstance(error, socket.gaierror):
+            return error.errno in _NXDOMAIN_ERRNOS
+        # urllib3 keeps the cause in `reason`, aiohttp in `os_error`, requests in args
+        wrapped = getattr(error, "reason", None) or getattr(error, "os_error", None)
+        if not isinstance(wrapped, BaseException):
+            wrapped = next((arg for arg in getattr(error, "args", ()) if isinstance(arg, BaseException)), None)
+        error = wrapped or error.__cause__ or error.__context__
+    return False
+
+
+def ascii_host(host):
+    """
+    Returns the IDNA (punycode) form of a host name, which is what aiohttp resolves.
+    """
+    try:
+        return host.encode("idna").decode("ascii").lower()
+    except UnicodeError:
+        return host.lower()
+
+
+class SystemResolver:
+    """
+    Resolves host names with the operating system resolver (getaddrinfo in a thread).
+    """
+
+    async def resolve(self, host):
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            if e.errno in _NXDOMAIN_ERRNOS:
+                raise NXDomain(host) from e
+            raise
+        return sorted({info[4][0] for info in infos})
+
+
+class StaticResolver:
+    """
+    Resolves host names from an in-memory table {host: address or [addresses]}.
+    Hosts missing from the table resolve to `default` if given, otherwise raise NXDomain.
+    Useful for tests and offline runs.
+    """
+
+    def __init__(self, table, default=None):
+        self.table = {ascii_host(host): addrs for host, addrs in table.items()}
+        self.default = default
+
+    async def resolve(self, host):
+        addrs = self.table.get(ascii_host(host), self.default)
+        if addrs is None:
+            raise NXDomain(host)
+        return [addrs] if isinstance(addrs, str) else list(addrs)
+
+
+class DnsCache:
+    """
+    On-disk cache of DNS answers. Positive answers (a list of addresses) and negative
+    answers (NXDOMAIN, stored as None) are kept with separate TTLs.
+    """
+
+    def __init__(self, path=_DNS_CACHE_FILE, positive_ttl=_DNS_POSITIVE_TTL, negative_ttl=_DNS_NEGATIVE_TTL):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        # Hosts set since the cache was loaded (see new_entries())
+        self.changed = set()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print("Error reading DNS cache:", e)
+
+    def get(self, host):
+        """
+        Returns (True, addresses) for a fresh cached answer, where addresses is None for a
+        cached NXDOMAIN, or (False, None) if the host is not cached or has expired.
+        """
+        entry = self.entries.get(ascii_host(host))
+        if entry and entry["expires"] > time.time():
+            return True, entry["addresses"]
+        return False, None
+
+    def set(self, host, addresses):
+        ttl = self.positive_ttl if addresses else self.negative_ttl
+        self.entries[ascii_host(host)] = {"addresses": addresses, "expires": time.time() + ttl}
+        self.changed.add(ascii_host(host))
+
+    def new_entries(self):
+        """
+        Returns the entries set since the cache was loaded, e.g. for a worker process to
+        hand its lookups to the coordinator (see merge()).
+        """
+        return {host: self.entries[host] for host in self.changed}
+
+    def merge(self, entries):
+        """
+        Adds the `entries` of another cache (see new_entries()), keeping the answer that
+        expires last for every host.
+        """
+        for host, entry in entries.items():
+            current = self.entries.get(host)
+            if current is None or entry["expires"] > current["expires"]:
+                self.entries[host] = entry
+                self.changed.add(host)
+
+    def save(self):
+        if not self.path:
+            return
+        now = time.time()
+        entries = {host: entry for host, entry in self.entries.items() if entry["expires"] > now}
+        # Per process, so runs saving at the same time do not share a temporary file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print("Error writing DNS cache:", e)
+
+
+async def resolve_hosts(hosts, concurrency=100, resolver=None, cache=None, timer=None, failed=None):
+    """
+    Resolves `hosts` concurrently (at most `concurrency` lookups at a time) and returns a
+    dict {host: [addresses]} of the hosts that exist. NXDOMAIN answers are dropped and
+    cached as negative answers; other lookup failures (timeouts, SERVFAIL, EAI_AGAIN)
+    are dropped without caching and added to the set `failed` if given, so callers can
+    tell them from names that do not exist.
+    Lookups that are not answered from the cache are timed into `timer` as "dns".
+    """
+    resolver = resolver or SystemResolver()
+    sem = asyncio.Semaphore(concurrency)
+    resolved = {}
+
+    async def lookup(host):
+        if cache is not None:
+            found, addresses = cache.get(host)
+            if found:
+                if addresses:
+                    resolved[host] = addresses
+                return
+        async with sem:
+            start = time.perf_counter()
+            try:
+                addresses = await resolver.resolve(host)
+            except NXDomain:
+                addresses = None
+            except Exception:
+                if failed is not None:
+                    failed.add(host)
+                return
+            finally:
+                if timer is not None:
+                    timer.add("dns", time.perf_counter() - start, host)
+        if cache is not None:
+            cache.set(host, addresses)
+        if addresses:
+            resolved[host] = addresses
+
+    await asyncio.gather(*(lookup(host) for host in hosts))
+    return resolved
+
+
+class CachedResolver(AbstractResolver):
+    """
+    aiohttp resolver that answers from the results of resolve_hosts(), so the HTTP
+    stage does not look the same names up again. Unknown hosts (e.g. redirect
+    targets) fall back to aiohttp's default resolver.
+    """
+
+    def __init__(self, resolved=None):
+        self.resolved = {}
+        self.fallback = DefaultResolver()
+        self.update(resolved or {})
+
+    def update(self, resolved):
+        """
+        Adds more resolve_hosts() results, e.g. when one session serves several sweeps.
+        """
+        self.resolved.update({ascii_host(host): addrs for host, addrs in resolved.items()})
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        addrs = self.resolved.get(ascii_host(host))
+        if addrs and family in (socket.AF_INET, socket.AF_INET6):
+            addrs = [addr for addr in addrs if (":" in addr) == (family == socket.AF_INET6)]
+        if not addrs:
+            return await self.fallback.resolve(host, port, family)
+        return [{
+            "hostname": host,
+            "host": addr,
+            "port": port,
+            "family": socket.AF_INET6 if ":" in addr else socket.AF_INET,
+            "proto": 0,
+            "flags": socket.AI_NUMERICHOST
+        } for addr in addrs]
+
+    async def close(self):
+        await self.fallback.close()
@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import concurrent.futures
+import gzip
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from bs import EXTRACT_FIELDS, USEFUL_FIELDS, write_page
+
+COMPRESSIONS = (None, "gzip", "zstd")
+_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def compress(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def decompress(frame, compression):
+    if compression == "gzip":
+        return gzip.decompress(frame)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return frame
+
+
+def shard_compression(path):
+    for compression, extension in _EXTENSIONS.items():
+        if compression and path.endswith(".jsonl" + extension):
+            return compression
+    return None
+
+
+class ShardSink:
+    """
+    Result sink that appends every page as one JSON line to a single shard per run,
+    output_dir/results-<time>.jsonl (.gz or .zst with `compression`), instead of
+    writing separate files per domain. A background thread takes records from a queue
+    and writes them in batches of up to `batch_size` (or every `flush_interval`
+    seconds); each batch is one compressed frame, so the shard can be read with
+    zcat/zstdcat. The index next to it (shard.idx, one JSON line per record) holds the
+    frame offset and position of every URL, so ShardReader.get() can read one page
+    without scanning the shard. The raw page is included as "html" only when the
+    html format is requested. update() appends a record with only the new keywords and
+    sentiment of a page; ShardReader merges it into the original record.
+    Same interface as bs.FileSink.
+    """
+    # Raw pages are part of the records, not separate files
+    raw_files = False
+
+    def __init__(self, output_dir=None, formats=("txt",), log_callback=None, compression=None, batch_size=200, flush_interval=1.0, name=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.folder = output_dir or os.getcwd()
+        self.path = os.path.join(self.folder, (name or time.strftime("results-%Y%m%d-%H%M%S")) + ".jsonl" + _EXTENSIONS[compression])
+        self.index_path = self.path + ".idx"
+        self.compression = compression
+        self.include_html = "html" in formats
+        self.log_callback = log_callback
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch = []
+        self.file = None
+        self.index = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def put(self, base, suffix, url, text, extracted, stats, skip_existing=False, raw_written=False, timer=None, done=None):
+        record = {"base": base, "suffix": suffix, "url": url, "fetched_at": round(time.time(), 3)}
+        record.update({field: extracted.get(field) for field in EXTRACT_FIELDS})
+        if self.include_html and text is not None:
+            record["html"] = text
+        self.queue.put(("record", (record, stats, timer, done)))
+
+    def update(self, base, suffix, url, extracted):
+        record = {"base": base, "suffix": suffix, "url": url, "update": True, "keywords": extracted.get("keywords"), "sentiment": extracted.get("sentiment")}
+        self.queue.put(("record", (record, None, None, None)))
+
+    async def run(self, fn, *args):
+        """
+        Runs fn(*args) on the writer thread, after everything queued before it.
+        """
+        future = concurrent.futures.Future()
+        self.queue.put(("call", (fn, args, future)))
+        return await asyncio.wrap_future(future)
+
+    async def drain(self):
+        """
+        Waits until everything queued so far has been written.
+        """
+        await self.run(self.flush)
+
+    def close(self):
+        self.queue.put(("stop", None))
+        self.thread.join()
+
+    def work(self):
+        while True:
+            try:
+                kind, item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush()
+                continue
+            if kind == "record":
+                self.batch.append(item)
+                if len(self.batch) >= self.batch_size:
+                    self.flush()
+            elif kind == "call":
+                fn, args, future = item
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                self.flush()
+                if self.file is not None:
+                    self.file.close()
+                    self.index.close()
+                return
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        start = time.perf_counter()
+        try:
+            if self.file is None:
+                os.makedirs(self.folder, exist_ok=True)
+                self.file = open(self.path, "ab")
+                self.index = open(self.index_path, "a", encoding="utf-8")
+            lines = []
+            entries = []
+            position = 0
+            for record, _, _, _ in batch:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                entry = {"url": record["url"], "base": record["base"], "suffix": record["suffix"], "start": position, "length": len(line)}
+                if record.get("update"):
+                    entry["update"] = True
+                entries.append(entry)
+                lines.append(line)
+                position += len(line)
+            frame = compress(b"".join(lines), self.compression)
+            offset = self.file.tell()
+            self.file.write(frame)
+            self.file.flush()
+            for entry in entries:
+                entry.update(offset=offset, size=len(frame))
+                self.index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.index.flush()
+        except Exception as e:
+            if self.log_callback:
+                self.log_callback(f"Error writing {self.path}: {e}")
+            return
+        elapsed = (time.perf_counter() - start) / len(batch)
+        for record, stats, timer, done in batch:
+            if stats is None:
+                continue
+            useful = any(record[field] for field in USEFUL_FIELDS)
+            stats["saved" if useful else "not_useful"] += 1
+            if done is not None:
+                done({"saved" if useful else "not_useful": 1})
+            if timer is not None:
+                timer.add("write", elapsed, urlparse(record["url"]).hostname)
+            if self.log_callback and useful:
+                self.log_callback(f"Saved {record['url']} to {self.path}")
+
+
+class ShardReader:
+    """
+    Reads a shard written by ShardSink: get(url) looks one page up through the index,
+    records() yields all of them in order. Later keyword/sentiment updates are merged
+    into the records.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compression = shard_compression(path)
+        self.entries = {}
+        self.updates = {}
+        self.frames = []
+        with open(path + ".idx", "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                (self.updates if entry.get("update") else self.entries)[entry["url"]] = entry
+                frame = (entry["offset"], entry["size"])
+                if not self.frames or self.frames[-1] != frame:
+                    self.frames.append(frame)
+
+    def read_frame(self, f, offset, size):
+        f.seek(offset)
+        return decompress(f.read(size), self.compression)
+
+    def read_record(self, f, entry):
+        data = self.read_frame(f, entry["offset"], entry["size"])
+        return json.loads(data[entry["start"]:entry["start"] + entry["length"]])
+
+    def get(self, url):
+        """
+        Returns the record stored for `url`, or None.
+        """
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        with open(self.path, "rb") as f:
+            record = self.read_record(f, entry)
+            if url in self.updates:
+                record.update(self.read_update(f, self.updates[url]))
+        return record
+
+    def read_update(self, f, entry):
+        update = self.read_record(f, entry)
+        return {"keywords": update["keywords"], "sentiment": update["sentiment"]}
+
+    def records(self):
+        with open(self.path, "rb") as f:
+            updates = {}
+            frames = {(entry["offset"], entry["size"]) for entry in self.updates.values()}
+            for offset, size in sorted(frames):
+                for line in self.read_frame(f, offset, size).splitlines():
+                    if line.strip():
+                        update = json.loads(line)
+                        if update.get("update"):
+                            updates[update["url"]] = {"keywords": update["keywords"], "sentiment": update["sentiment"]}
+            for offset, size in self.frames:
+                for line in self.read_frame(f, offset, size).splitlines():
+                    if line.strip():
+                        record = json.loads(line)
+                        if record.get("update"):
+                            continue
+                        record.update(updates.get(record["url"], {}))
+                        yield record
+
+
+def export_files(path, output_dir=None, formats=("txt", "json", "html"), raw_gzip=False, log_callback=None):
+    """
+    Writes every record of a shard in the per-file layout of bs.write_page(), as a
+    normal run would have. Raw HTML is only available if the shard was written with
+    the html format. Returns the write statistics.
+    """
+    stats = {"saved": 0, "not_useful": 0}
+    for record in ShardReader(path).records():
+        extracted = {field: record.get(field) for field in EXTRACT_FIELDS}
+        write_page(record["base"], record["suffix"], record["url"], record.get("html"), extracted, log_callback, stats, formats, output_dir, raw_gzip=raw_gzip)
+    return stats
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Read result shards written with --shard.")
+    commands = ap.add_subparsers(dest="command", required=True)
+    get = commands.add_parser("get", help="Print the record of one URL")
+    get.add_argument("shard", help="Shard file (results-*.jsonl[.gz|.zst])")
+    get.add_argument("url", help="URL of the page")
+    export = commands.add_parser("export", help="Write the per-domain files of a shard")
+    export.add_argument("shard", help="Shard file (results-*.jsonl[.gz|.zst])")
+    export.add_argument("-o", "--output-dir", default=os.getcwd(), help="Output folder (default: current folder)")
+    export.add_argument("--formats", default="txt,json,html", help="Comma-separated output formats (default: txt,json,html)")
+    export.add_argument("--gzip-html", action="store_true", help="Store raw pages gzip-compressed (.html.gz)")
+    args = ap.parse_args(argv)
+
+    if args.command == "get":
+        record = ShardReader(args.shard).get(args.url)
+        if record is None:
+            print(f"{args.url} is not in {args.shard}")
+            return 1
+        print(json.dumps(record, ensure_ascii=False, indent=2))
+        return 0
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    stats = export_files(args.shard, args.output_dir, formats, args.gzip_html, print)
+    print(f"Exported {stats['saved']} pages, {stats['not_useful']} had nothing useful.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import contextlib
+import socket
+
+from aiohttp import web
+
+from resolver import CachedResolver
+
+
+@contextlib.asynccontextmanager
+async def local_server(handler):
+    """
+    Serves every path with the aiohttp `handler` on a free local port and yields the
+    port; must be entered from a running event loop.
+    """
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    await web.SockSite(runner, sock).start()
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        await runner.cleanup()
+
+
+class LocalResolver(CachedResolver):
+    """
+    aiohttp resolver that sends every host to the local server on `port`.
+    """
+
+    def __init__(self, port):
+        super().__init__()
+        self.port = port
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{
+            "hostname": host,
+            "host": "127.0.0.1",
+            "port": self.port,
+            "family": socket.AF_INET,
+            "proto": 0,
+            "flags": socket.AI_NUMERICHOST
+        }]
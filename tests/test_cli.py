@@ -0,0 +1,29 @@
+import asyncio
+import functools
+
+import cli
+from probestore import ProbeStore
+from resolver import DnsCache
+
+
+def test_sweep_runs_at_most_max_bases_at_once(tmp_path, monkeypatch):
+    running = {"now": 0, "most": 0}
+
+    async def ping(base, *args, **kwargs):
+        running["now"] += 1
+        running["most"] = max(running["most"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return []
+
+    async def scrape(base, reachable, *args, **kwargs):
+        return {"total_pinged": 0, "saved": 0, "failed": 0, "not_useful": 0}
+
+    monkeypatch.setattr(cli, "ping_domains_async", ping)
+    monkeypatch.setattr(cli, "save_html_files_async", scrape)
+    monkeypatch.setattr(cli, "DnsCache", functools.partial(DnsCache, None))
+    monkeypatch.setattr(cli, "ProbeStore", functools.partial(ProbeStore, str(tmp_path / "probes.sqlite")))
+    bases = [f"base{i}" for i in range(10)]
+    results = asyncio.run(cli.sweep_bases_async(bases, [".no"], output_dir=str(tmp_path), use_cache=False, use_history=False, max_bases=3))
+    assert sorted(results) == bases
+    assert running["most"] == 3
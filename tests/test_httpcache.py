@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from httpcache import HttpCache
+
+
+def total_size(cache):
+    return cache.db.execute("SELECT size FROM totals").fetchone()[0]
+
+
+def test_put_does_not_wait_for_a_locked_database(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = HttpCache(path)
+    # Another process holds the write lock
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        cache.put("http://a.example/", "<html>a</html>", {"title": "a"})
+        cache.touch("http://a.example/", etag='"1"')
+        assert time.monotonic() - start < 0.5
+        assert cache.get("http://a.example/") is None
+    finally:
+        other.rollback()
+        other.close()
+    cache.flush()
+    entry = cache.get("http://a.example/")
+    assert entry["text"] == "<html>a</html>"
+    assert entry["extracted"] == {"title": "a"}
+    assert entry["etag"] == '"1"'
+    cache.close()
+
+
+def test_running_total_follows_puts_updates_and_evictions(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite"), max_bytes=1000)
+    for i in range(50):
+        cache.put(f"http://{i}.example/", "x" * (100 + i), {"title": str(i)})
+    cache.put("http://49.example/", "y" * 500, {"title": "49"})
+    cache.update_extracted([("http://49.example/", {"title": "49", "keywords": ["a"] * 20})])
+    cache.flush()
+    stored = cache.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    assert total_size(cache) == stored
+    assert 0 < stored <= 1000
+    # The least recently used pages went first
+    assert cache.get("http://0.example/") is None
+    assert cache.get("http://49.example/")["extracted"]["keywords"] == ["a"] * 20
+    cache.close()
@@ -0,0 +1,105 @@
+import asyncio
+
+from aiohttp import web
+
+from bs import save_html_files_async
+from helpers import LocalResolver, local_server
+from journal import Journal
+from pinger import iter_reachable_async, make_session
+from resolver import DnsCache, StaticResolver
+
+PAGE = "<html><head><title>{host}</title></head><body><p>Text of {host}</p></body></html>"
+
+
+def serve_pages(requests):
+    async def handler(request):
+        host = request.host.split(":")[0]
+        requests.append((request.method, host))
+        return web.Response(text=PAGE.format(host=host), content_type="text/html")
+    return handler
+
+
+async def with_session(port, run):
+    http_resolver = LocalResolver(port)
+    session = make_session(http_resolver=http_resolver)
+    try:
+        return await run(session, http_resolver)
+    finally:
+        await session.close()
+
+
+def test_cut_off_last_line_is_dropped(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path)
+    journal.probe(".no", "https://example.no", {"reachable": True, "status": 200})
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "probe", "suffix": ".se"')
+
+    journal = Journal(path, resume=True)
+    journal.probe(".dk", "https://example.dk", {"reachable": False, "status": 404})
+    journal.close()
+    resumed = Journal(path, resume=True)
+    resumed.close()
+    assert set(resumed.probes) == {".no", ".dk"}
+
+
+def test_resumed_sweep_only_probes_what_is_left(tmp_path):
+    suffixes = [f".t{i}" for i in range(20)]
+    path = str(tmp_path / "journal.jsonl")
+    requests = []
+
+    def sweep(journal, **kwargs):
+        async def run(session, http_resolver):
+            return [hit async for hit in iter_reachable_async(
+                "example", suffixes, resolver=StaticResolver({}, default="127.0.0.1"), dns_cache=DnsCache(None),
+                session=session, http_resolver=http_resolver, scheme="http", rank=False, journal=journal, **kwargs
+            )]
+
+        async def main():
+            async with local_server(serve_pages(requests)) as port:
+                return await with_session(port, run)
+        return asyncio.run(main())
+
+    # Interrupted after 5 probes
+    journal = Journal(path)
+    assert len(sweep(journal, max_probes=5)) == 5
+    journal.close()
+
+    requests.clear()
+    journal = Journal(path, resume=True)
+    hits = sweep(journal)
+    journal.close()
+    assert len(requests) == 15
+    assert sorted(hits) == sorted((suffix, f"http://example{suffix}") for suffix in suffixes)
+
+
+def test_resumed_scrape_restores_finished_pages(tmp_path):
+    domains = [(suffix, f"http://example{suffix}") for suffix in (".a", ".b", ".c")]
+    path = str(tmp_path / "journal.jsonl")
+    requests = []
+
+    def scrape(journal, domains):
+        async def run(session, http_resolver):
+            return await save_html_files_async(
+                "example", domains, ["txt"], rate_limit=0, output_dir=str(tmp_path), parse_mode="inline",
+                session=session, nlp=False, journal=journal
+            )
+
+        async def main():
+            async with local_server(serve_pages(requests)) as port:
+                return await with_session(port, run)
+        return asyncio.run(main())
+
+    # Interrupted after the first two pages
+    journal = Journal(path)
+    assert scrape(journal, domains[:2])["saved"] == 2
+    journal.close()
+
+    requests.clear()
+    journal = Journal(path, resume=True)
+    stats = scrape(journal, domains)
+    journal.close()
+    assert requests == [("GET", "example.c")]
+    assert stats["saved"] == 3
+    assert stats["total_pinged"] == 3
@@ -0,0 +1,45 @@
+import asyncio
+
+from bs import analyze_and_update
+from httpcache import HttpCache
+from nlp import analyze_pages_async
+
+
+def page(text):
+    return {"title": None, "tags": [{"tag": "p", "text": text}], "keywords": [], "sentiment": None}
+
+
+class RecordingSink:
+    def __init__(self):
+        self.updated = []
+
+    def update(self, base, suffix, url, extracted):
+        self.updated.append(suffix)
+
+
+def test_analysed_pages_are_kept_without_sentiment():
+    pages = [page("rivers and mountains"), page("markets and harbours")]
+    assert len(asyncio.run(analyze_pages_async(pages, sentiment=False, keep_analysed=True))) == 2
+    assert pages[0]["keywords"] and pages[0]["sentiment"] is None
+    # Sentiment stays None, but the pages are marked as analysed
+    assert asyncio.run(analyze_pages_async(pages, sentiment=False, keep_analysed=True)) == []
+    # Other options analyse them again
+    assert len(asyncio.run(analyze_pages_async(pages, top_n=3, sentiment=False, keep_analysed=True))) == 2
+
+
+def test_unchanged_cached_pages_are_not_rewritten(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite"))
+    first = [("b", f".{name}", f"http://b.{name}/", page(f"{name} words here")) for name in ("a", "c")]
+    for _, _, url, extracted in first:
+        cache.put(url, "<html></html>", extracted)
+    sink = RecordingSink()
+    asyncio.run(analyze_and_update(first, None, sink, cache=cache))
+    assert sink.updated == [".a", ".c"]
+    cache.flush()
+
+    # Next run: .a comes from the cache unchanged, .c changed
+    second = [("b", ".a", "http://b.a/", cache.get("http://b.a/")["extracted"]), ("b", ".c", "http://b.c/", page("other words"))]
+    sink = RecordingSink()
+    asyncio.run(analyze_and_update(second, None, sink, cache=cache))
+    assert sink.updated == [".c"]
+    cache.close()
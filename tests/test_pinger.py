@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from helpers import LocalResolver, local_server
+from pinger import iter_reachable_async, make_session
+from probestore import ProbeStore
+from resolver import DnsCache, StaticResolver
+
+SUFFIXES = [f".t{i}" for i in range(200)]
+
+
+async def sweep(port, **kwargs):
+    """
+    Sweeps "example" over SUFFIXES against the local server on `port` and returns the
+    hits; every name exists.
+    """
+    http_resolver = LocalResolver(port)
+    session = make_session(limit=20, http_resolver=http_resolver)
+    try:
+        return [hit async for hit in iter_reachable_async(
+            "example", SUFFIXES, resolver=StaticResolver({}, default="127.0.0.1"), dns_cache=DnsCache(None),
+            session=session, http_resolver=http_resolver, scheme="http", rank=False, **kwargs
+        )]
+    finally:
+        await session.close()
+
+
+@pytest.mark.parametrize("resolve_dns", [True, False])
+def test_max_probes_limits_requests(resolve_dns):
+    requests = []
+
+    async def handler(request):
+        requests.append(request.host)
+        return web.Response(text="ok")
+
+    async def main():
+        async with local_server(handler) as port:
+            return await sweep(port, resolve_dns=resolve_dns, max_probes=10)
+
+    hits = asyncio.run(main())
+    assert len(requests) == 10
+    assert len(hits) == 10
+
+
+def test_max_probes_counts_probes_after_the_dns_stage():
+    requests = []
+
+    async def handler(request):
+        requests.append(request.host)
+        return web.Response(text="ok")
+
+    async def main():
+        async with local_server(handler) as port:
+            return await sweep(port, resolve_dns=True, dns_concurrency=200, max_probes=3)
+
+    hits = asyncio.run(main())
+    assert len(requests) == 3
+    assert len(hits) == 3
+
+
+def test_max_hits_stops_early():
+    async def handler(request):
+        return web.Response(text="ok")
+
+    async def main():
+        async with local_server(handler) as port:
+            return await sweep(port, max_hits=5)
+
+    assert len(asyncio.run(main())) == 5
+
+
+def test_store_keeps_only_definite_outcomes(tmp_path):
+    statuses = {"ok": 200, "missing": 404, "busy": 503}
+
+    async def handler(request):
+        return web.Response(status=statuses[request.host.split(":")[0].rsplit(".", 1)[1]])
+
+    async def main(store):
+        async with local_server(handler) as port:
+            http_resolver = LocalResolver(port)
+            session = make_session(http_resolver=http_resolver)
+            resolver = StaticResolver({f"example.{name}": "127.0.0.1" for name in statuses})
+            try:
+                return [hit async for hit in iter_reachable_async(
+                    "example", [".ok", ".missing", ".busy", ".nx"], resolver=resolver, dns_cache=DnsCache(None),
+                    store=store, session=session, http_resolver=http_resolver, scheme="http", rank=False
+                )]
+            finally:
+                await session.close()
+
+    store = ProbeStore(str(tmp_path / "probes.sqlite"))
+    assert asyncio.run(main(store)) == [(".ok", "http://example.ok")]
+    assert set(store.get("example")) == {".ok", ".missing", ".nx"}
+    store.close()
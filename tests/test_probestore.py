@@ -0,0 +1,75 @@
+import asyncio
+
+import bs
+from journal import Journal
+from probestore import ProbeStore, is_definite
+
+PAGE = "<html><head><title>Hello</title></head><body><p>Some text</p></body></html>"
+
+# Outcome of fetch_website_details() per suffix
+FETCHES = {
+    ".timeout": {"status": None, "error": "timeout"},
+    ".reset": {"status": None, "error": "connection"},
+    ".nx": {"status": None, "error": "nxdomain"},
+    ".missing": {"status": 404, "error": "status"},
+    ".busy": {"status": 503, "error": "status"},
+    ".ok": {"status": 200, "error": None},
+}
+
+
+def fake_fetch(calls):
+    def fetch(url, timeout=5, headers=None, max_bytes=None):
+        suffix = "." + url.rsplit(".", 1)[1]
+        calls.append(suffix)
+        reachable = FETCHES[suffix]["status"] == 200
+        return dict(FETCHES[suffix], reachable=reachable, url=url if FETCHES[suffix]["status"] else None,
+                    headers={} if reachable else None, text=PAGE if reachable else None, truncated=False)
+    return fetch
+
+
+def scan(tmp_path, store, journal=None):
+    return asyncio.run(bs.scan_and_save_async(
+        "example", list(FETCHES), output_dir=str(tmp_path), parse_mode="inline", store=store, nlp=False, journal=journal
+    ))
+
+
+def test_is_definite():
+    assert is_definite({"reachable": True, "status": 200})
+    assert is_definite({"reachable": False, "error": "nxdomain"})
+    assert is_definite({"reachable": False, "status": 404})
+    assert not is_definite({"reachable": False, "status": 503})
+    assert not is_definite({"reachable": False, "status": None, "error": "timeout"})
+    # Journal entries from before failures were classified
+    assert not is_definite({"reachable": False, "status": None})
+
+
+def test_single_pass_stores_only_definite_outcomes(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bs, "fetch_website_details", fake_fetch(calls))
+    store = ProbeStore(str(tmp_path / "probes.sqlite"))
+    reachable, stats = scan(tmp_path, store)
+    assert reachable == [(".ok", "https://example.ok")]
+    assert set(store.get("example")) == {".nx", ".missing", ".ok"}
+
+    # The next incremental sweep tries the transient failures again
+    calls.clear()
+    scan(tmp_path, store)
+    assert set(calls) == {".timeout", ".reset", ".busy", ".ok"}
+    store.close()
+
+
+def test_resume_probes_transient_failures_again(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bs, "fetch_website_details", fake_fetch(calls))
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path)
+    scan(tmp_path, None, journal)
+    journal.close()
+
+    calls.clear()
+    journal = Journal(path, resume=True)
+    reachable, stats = scan(tmp_path, None, journal)
+    journal.close()
+    assert set(calls) == {".timeout", ".reset", ".busy"}
+    assert reachable == [(".ok", "https://example.ok")]
+    assert stats["saved"] == 1
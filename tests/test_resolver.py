@@ -0,0 +1,62 @@
+import asyncio
+import socket
+
+from resolver import DnsCache, NXDomain, resolve_hosts
+
+
+class FlakyResolver:
+    """
+    Resolves names ending in .ok, answers NXDOMAIN for .nx and fails with a
+    temporary error for everything else.
+    """
+
+    async def resolve(self, host):
+        if host.endswith(".ok"):
+            return ["127.0.0.1"]
+        if host.endswith(".nx"):
+            raise NXDomain(host)
+        raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+
+
+def test_only_nxdomain_is_cached_as_negative():
+    cache = DnsCache(None)
+    failed = set()
+    resolved = asyncio.run(resolve_hosts(["a.ok", "b.nx", "c.tmp"], resolver=FlakyResolver(), cache=cache, failed=failed))
+    assert resolved == {"a.ok": ["127.0.0.1"]}
+    assert failed == {"c.tmp"}
+    assert cache.get("a.ok") == (True, ["127.0.0.1"])
+    assert cache.get("b.nx") == (True, None)
+    assert cache.get("c.tmp") == (False, None)
+
+
+def test_worker_lookups_are_merged_into_one_save(tmp_path):
+    path = str(tmp_path / "dns_cache.json")
+    cache = DnsCache(path)
+    cache.set("old.ok", ["10.0.0.1"])
+    cache.save()
+
+    # Two workers load the same file and look up different names
+    first, second = DnsCache(path), DnsCache(path)
+    first.set("first.ok", ["10.0.0.2"])
+    second.set("second.nx", None)
+    assert first.new_entries().keys() == {"first.ok"}
+
+    coordinator = DnsCache(path)
+    coordinator.merge(first.new_entries())
+    coordinator.merge(second.new_entries())
+    coordinator.save()
+
+    saved = DnsCache(path)
+    assert saved.get("old.ok") == (True, ["10.0.0.1"])
+    assert saved.get("first.ok") == (True, ["10.0.0.2"])
+    assert saved.get("second.nx") == (True, None)
+
+
+def test_merge_keeps_the_answer_that_expires_last():
+    cache = DnsCache(None)
+    cache.set("a.ok", ["10.0.0.1"])
+    newer = dict(cache.entries["a.ok"], addresses=["10.0.0.2"], expires=cache.entries["a.ok"]["expires"] + 60)
+    older = dict(newer, addresses=["10.0.0.3"], expires=newer["expires"] - 120)
+    cache.merge({"a.ok": newer})
+    cache.merge({"a.ok": older})
+    assert cache.get("a.ok") == (True, ["10.0.0.2"])
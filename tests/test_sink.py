@@ -0,0 +1,28 @@
+import asyncio
+
+from bs import FileSink
+from sink import ShardSink
+
+USEFUL = {"title": "Hello", "meta_description": None, "og_description": None, "json_ld": [], "tags": [], "keywords": [], "sentiment": None}
+EMPTY = dict(USEFUL, title=None)
+
+
+def write_pages(sink):
+    stats = {"saved": 0, "not_useful": 0}
+
+    async def main():
+        sink.put("example", ".no", "https://example.no", "<html></html>", USEFUL, stats)
+        sink.put("example", ".se", "https://example.se", "<html></html>", EMPTY, stats)
+        await sink.drain()
+        sink.close()
+
+    asyncio.run(main())
+    return stats
+
+
+def test_file_and_shard_sinks_count_pages(tmp_path):
+    formats = ("txt", "json", "html")
+    file_stats = write_pages(FileSink(str(tmp_path / "files"), formats))
+    shard_stats = write_pages(ShardSink(str(tmp_path / "shard"), formats))
+    assert file_stats == shard_stats == {"saved": 1, "not_useful": 1}
+    assert (tmp_path / "files" / "example" / "example-no.json").exists()
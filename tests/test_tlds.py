@@ -0,0 +1,19 @@
+import tlds
+
+
+def test_idn_cctlds_are_country_codes():
+    for tld in ("рф", "中国", "ελ", "бг", "ею", "xn--p1ai"):
+        assert tlds.guess_category(tld) == "country-code"
+    assert tlds.guess_category("москва") == "generic"
+    assert tlds.guess_category("テスト") == "test"
+
+
+def test_source_names_lose_direction_marks():
+    assert tlds.parse_source('"‏.مصر‎"\n"com","generic"\n') == {"مصر": "country-code", "com": "generic"}
+
+
+def test_compiled_index_lists_idn_cctlds():
+    index, _ = tlds.read_index()
+    cctlds = {tld for tld, category in index.items() if category == "country-code"}
+    assert {"no", "рф", "中国", "ελ", "مصر"} <= cctlds
+    assert not any("‎" in tld or "‏" in tld for tld in index)
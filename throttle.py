@@ -0,0 +1,173 @@
+import asyncio
+import contextlib
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """
+    Returns the delay in seconds from a Retry-After header (seconds or HTTP date),
+    or None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self.refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostState:
+    """
+    Per-host throttling state: token bucket, adaptive concurrency limit, requests in
+    flight, smoothed latency, the time until which the host asked us to wait and the
+    highest rate it allows (robots.txt Crawl-delay).
+    """
+
+    def __init__(self, rate, concurrency):
+        self.bucket = TokenBucket(rate) if rate else None
+        self.max_rate = None
+        self.limit = concurrency
+        self.in_flight = 0
+        self.latency = None
+        self.blocked_until = 0.0
+        self.cond = asyncio.Condition()
+
+
+class HostThrottle:
+    """
+    Per-host politeness scheduler. Each host gets its own token bucket (`rate` requests
+    per second, None for no rate limit) and a concurrency limit that adapts AIMD-style:
+    it grows additively while responses are fast and is halved (together with the rate)
+    on 429/503 responses, timeouts or a latency spike. Retry-After is honoured for the
+    whole host. Limits never go above `max_concurrency`/`max_rate` or below the minimums.
+    """
+
+    def __init__(self, rate=2.0, max_concurrency=10, initial_concurrency=2, min_concurrency=1,
+                 max_rate=None, min_rate=None, latency_factor=2.0, base_delay=1.0, max_delay=60.0):
+        self.rate = rate
+        self.max_rate = max_rate or (rate * 4 if rate else None)
+        self.min_rate = min_rate or (rate / 8 if rate else None)
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = min(initial_concurrency, max_concurrency)
+        self.min_concurrency = min_concurrency
+        self.latency_factor = latency_factor
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hosts = {}
+
+    def host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.rate, self.initial_concurrency)
+        return state
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host):
+        """
+        Waits for a free concurrency slot and a token for `host`, then holds the slot.
+        """
+        state = self.host(host)
+        async with state.cond:
+            await state.cond.wait_for(lambda: state.in_flight < int(state.limit))
+            state.in_flight += 1
+        try:
+            while True:
+                if state.bucket:
+                    await state.bucket.acquire()
+                # A Retry-After may have arrived while we waited for the token
+                delay = state.blocked_until - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            async with state.cond:
+                state.in_flight -= 1
+                state.cond.notify_all()
+
+    def set_crawl_delay(self, host, delay):
+        """
+        Limits `host` to one request per `delay` seconds from now on, e.g. for a
+        robots.txt Crawl-delay; ramping up never goes past it.
+        """
+        if not delay or delay <= 0:
+            return
+        state = self.host(host)
+        state.max_rate = 1 / delay
+        if state.bucket is None:
+            state.bucket = TokenBucket(state.max_rate)
+        else:
+            state.bucket.rate = min(state.bucket.rate, state.max_rate)
+
+    def record(self, host, status=None, latency=None, timeout=False, retry_after=None):
+        """
+        Feeds the outcome of a request to `host` into its limits: back off on 429/503,
+        timeouts and latency spikes, ramp up on fast successful responses.
+        """
+        state = self.host(host)
+        wait = parse_retry_after(retry_after) if isinstance(retry_after, str) else retry_after
+        if wait:
+            state.blocked_until = max(state.blocked_until, time.monotonic() + min(wait, self.max_delay))
+        slow = (latency is not None and state.latency is not None
+                and latency > state.latency * self.latency_factor)
+        if latency is not None:
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+        if timeout or status in (429, 503) or slow:
+            state.limit = max(self.min_concurrency, state.limit / 2)
+            if state.bucket:
+                floor = self.min_rate or state.max_rate / 8
+                state.bucket.rate = max(floor, state.bucket.rate / 2)
+        elif status is not None and status < 500:
+            state.limit = min(self.max_concurrency, state.limit + 1 / state.limit)
+            if state.bucket:
+                step = (self.rate or state.max_rate) / 10
+                ceiling = min(rate for rate in (self.max_rate, state.max_rate) if rate)
+                state.bucket.rate = min(ceiling, state.bucket.rate + step)
+        else:
+            return
+        # Let waiters re-check the (possibly raised) limit
+        asyncio.ensure_future(self._notify(state))
+
+    async def _notify(self, state):
+        async with state.cond:
+            state.cond.notify_all()
+
+    def retry_delay(self, attempt, retry_after=None):
+        """
+        Returns how long to wait before retry number `attempt` (1-based): the server's
+        Retry-After if given, otherwise exponential backoff with full jitter.
+        """
+        wait = parse_retry_after(retry_after) if isinstance(retry_after, str) else retry_after
+        if wait:
+            return min(wait, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
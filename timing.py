@@ -0,0 +1,149 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import aiohttp
+
+# Stages in pipeline order; anything else is reported after these
+STAGES = ("dns", "probe", "queue", "connect", "ttfb", "download", "parse", "nlp", "write")
+# Upper bounds (seconds) of the histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30)
+
+
+def percentile(sorted_values, p):
+    """
+    Returns the p-th percentile (nearest rank) of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageTimer:
+    """
+    Collects how long each stage of a sweep takes. Every sample belongs to a stage
+    ("dns", "connect", "ttfb", "parse", ...) and optionally to a host, so the run can be
+    summarised per stage (percentiles and a histogram) and per host.
+    Samples are only appended, so one timer can be shared by the event loop and
+    worker threads.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.hosts = {}
+
+    def add(self, stage, seconds, host=None):
+        self.samples.setdefault(stage, []).append(seconds)
+        if host:
+            stages = self.hosts.setdefault(host, {})
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def merge(self, other):
+        """
+        Adds all samples of another StageTimer to this one.
+        """
+        for stage, values in other.samples.items():
+            self.samples.setdefault(stage, []).extend(values)
+        for host, stages in other.hosts.items():
+            mine = self.hosts.setdefault(host, {})
+            for stage, seconds in stages.items():
+                mine[stage] = mine.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage, host=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, host)
+
+    def stages(self):
+        known = [stage for stage in STAGES if stage in self.samples]
+        return known + sorted(stage for stage in self.samples if stage not in STAGES)
+
+    def summary(self):
+        """
+        Returns {stage: {"count", "total", "mean", "p50", "p95", "p99", "max", "histogram"}}
+        with times in seconds; histogram holds the sample count per HISTOGRAM_BOUNDS
+        bucket plus one for slower samples.
+        """
+        result = {}
+        for stage in self.stages():
+            values = sorted(self.samples[stage])
+            histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+            i = 0
+            for value in values:
+                while i < len(HISTOGRAM_BOUNDS) and value > HISTOGRAM_BOUNDS[i]:
+                    i += 1
+                histogram[i] += 1
+            total = sum(values)
+            result[stage] = {
+                "count": len(values),
+                "total": round(total, 4),
+                "mean": round(total / len(values), 4),
+                "p50": round(percentile(values, 50), 4),
+                "p95": round(percentile(values, 95), 4),
+                "p99": round(percentile(values, 99), 4),
+                "max": round(values[-1], 4),
+                "histogram": histogram
+            }
+        return result
+
+    def write_hosts(self, path):
+        """
+        Writes the per-host timings as JSON to `path`, slowest host first:
+        a list of {"host", "total", <stage>: seconds, ...}.
+        """
+        rows = []
+        for host, stages in self.hosts.items():
+            row = {"host": host, "total": round(sum(stages.values()), 4)}
+            row.update({stage: round(seconds, 4) for stage, seconds in stages.items()})
+            rows.append(row)
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+def trace_config():
+    """
+    Returns an aiohttp TraceConfig that records the "dns", "connect" (TCP and TLS) and
+    "ttfb" (request start until the final response headers, connecting and redirects
+    included) stages of requests made with trace_request_ctx={"timer": StageTimer,
+    "host": host}. Other requests are ignored.
+    """
+    config = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx=None: SimpleNamespace(trace_request_ctx=trace_request_ctx, started={}))
+
+    def starter(name):
+        async def on_start(session, ctx, params):
+            if ctx.trace_request_ctx:
+                ctx.started[name] = time.perf_counter()
+        return on_start
+
+    def ender(name):
+        async def on_end(session, ctx, params):
+            start = ctx.started.pop(name, None) if ctx.trace_request_ctx else None
+            if start is not None:
+                ctx.trace_request_ctx["timer"].add(name, time.perf_counter() - start, ctx.trace_request_ctx.get("host"))
+        return on_end
+
+    config.on_dns_resolvehost_start.append(starter("dns"))
+    config.on_dns_resolvehost_end.append(ender("dns"))
+    config.on_connection_create_start.append(starter("connect"))
+    config.on_connection_create_end.append(ender("connect"))
+    config.on_request_start.append(starter("ttfb"))
+    config.on_request_end.append(ender("ttfb"))
+    return config
+
+
+def format_stage_lines(summary):
+    """
+    Returns one line with the count and p50/p95/p99/max (in ms) per stage of
+    StageTimer.summary().
+    """
+    return [
+        f"{stage}: n={s['count']} p50={s['p50'] * 1000:.1f}ms p95={s['p95'] * 1000:.1f}ms p99={s['p99'] * 1000:.1f}ms max={s['max'] * 1000:.1f}ms"
+        for stage, s in summary.items()
+    ]
@@ -0,0 +1,62 @@
+import locale
+import os
+
+# Built-in chance that a brand is found under a TLD, used before there is any history.
+# Unlisted TLDs get DEFAULT_PRIOR.
+COMMON_TLDS = {
+    "com": 0.9, "net": 0.5, "org": 0.5, "de": 0.35, "info": 0.3, "io": 0.3, "co": 0.3,
+    "uk": 0.3, "fr": 0.3, "nl": 0.3, "se": 0.3, "no": 0.3, "dk": 0.3, "eu": 0.25,
+    "fi": 0.25, "es": 0.25, "it": 0.25, "pl": 0.25, "ch": 0.25, "at": 0.25, "be": 0.25,
+    "us": 0.25, "ca": 0.25, "biz": 0.2, "me": 0.2, "au": 0.2, "ru": 0.2, "app": 0.15,
+    "dev": 0.15, "ai": 0.15, "tv": 0.15, "nz": 0.15, "ie": 0.15, "pt": 0.15, "cz": 0.15,
+    "jp": 0.15, "cn": 0.15, "in": 0.15, "br": 0.15, "mx": 0.1, "ar": 0.1, "kr": 0.1,
+    "tw": 0.1, "hk": 0.1, "sg": 0.1, "za": 0.1, "is": 0.1, "gr": 0.1, "hu": 0.1,
+    "ro": 0.1, "sk": 0.1, "lt": 0.1, "lv": 0.1, "ee": 0.1, "online": 0.05, "site": 0.05,
+    "store": 0.05, "shop": 0.05, "xyz": 0.05, "cc": 0.05, "ws": 0.05,
+}
+DEFAULT_PRIOR = 0.01
+# Prior of the ccTLD of the user's country
+LOCALE_PRIOR = 0.8
+# How many probes of history the prior counts as
+PRIOR_WEIGHT = 5
+# Countries whose ccTLD differs from the ISO code, and languages without a country
+_COUNTRY_TLDS = {"gb": "uk"}
+_LANGUAGE_TLDS = {"nb": "no", "nn": "no", "no": "no", "da": "dk", "sv": "se", "fi": "fi", "de": "de", "fr": "fr", "nl": "nl", "it": "it", "es": "es", "pl": "pl", "ja": "jp"}
+
+
+def locale_tld(locale_name=None):
+    """
+    Returns the ccTLD of the country in `locale_name` (e.g. "nb_NO.UTF-8" -> "no"),
+    by default the user's locale, or None if it has no country or language we know.
+    """
+    if locale_name is None:
+        locale_name = locale.getlocale()[0] or os.environ.get("LC_ALL") or os.environ.get("LANG") or ""
+    name = locale_name.split(".")[0].replace("-", "_").lower()
+    language, _, country = name.partition("_")
+    if len(country) == 2:
+        return _COUNTRY_TLDS.get(country, country)
+    return _LANGUAGE_TLDS.get(language)
+
+
+def tld_key(suffix):
+    return suffix.lstrip(".").lower()
+
+
+def rank_suffixes(suffixes, store=None, locale_name=None):
+    """
+    Returns `suffixes` ordered by how likely a base is to be found under them: the hit
+    rate of each TLD over all bases in the probestore.ProbeStore `store`, smoothed
+    towards a prior from COMMON_TLDS and the user's locale (see locale_tld()).
+    Ties keep their order.
+    """
+    history = store.tld_hit_rates() if store is not None else {}
+    home = locale_tld(locale_name)
+    scores = {}
+    for suffix in suffixes:
+        key = tld_key(suffix)
+        prior = COMMON_TLDS.get(key, DEFAULT_PRIOR)
+        if key == home:
+            prior = max(prior, LOCALE_PRIOR)
+        hits, total = history.get(key, (0, 0))
+        scores[suffix] = (hits + PRIOR_WEIGHT * prior) / (total + PRIOR_WEIGHT)
+    return sorted(suffixes, key=lambda suffix: -scores[suffix])
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+TLD_SOURCE_URL = "https://raw.githubusercontent.com/incognico/list-of-top-level-domains/master/tlds.csv"
+TLD_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tlds_index.json")
+TLD_INDEX_TTL = 60 * 60 * 24  # 1 day
+# IANA root zone categories
+CATEGORIES = ("generic", "country-code", "sponsored", "generic-restricted", "infrastructure", "test")
+# Used to categorize names when the source list has no category column
+_SPONSORED = {"aero", "asia", "cat", "coop", "edu", "gov", "int", "jobs", "mil", "museum", "post", "tel", "travel", "xxx"}
+_RESTRICTED = {"biz", "name", "pro"}
+_INFRASTRUCTURE = {"arpa"}
+# Internationalized ccTLDs (IANA root zone) and the IDN test TLDs
+_IDN_COUNTRY_CODES = {
+    "ελ", "бг", "бел", "ею", "мкд", "мон", "рф", "срб", "укр", "қаз", "հայ", "გე", "ไทย", "한국",
+    "中国", "中國", "台湾", "台灣", "新加坡", "澳門", "香港",
+    "भारत", "भारतम्", "भारोत", "বাংলা", "ভারত", "ভাৰত", "ਭਾਰਤ", "ભારત", "ଭାରତ", "இந்தியா", "இலங்கை",
+    "சிங்கப்பூர்", "భారత్", "ಭಾರತ", "ഭാരതം", "ලංකා",
+    "الاردن", "الجزائر", "السعودية", "المغرب", "امارات", "ایران", "بارت", "بھارت", "تونس", "سودان",
+    "سورية", "عراق", "عمان", "فلسطين", "قطر", "مصر", "مليسيا", "موريتانيا", "پاکستان", "ڀارت", "يمن",
+}
+_IDN_TEST = {"δοκιμή", "испытание", "परीक्षा", "பரிட்சை", "טעסט", "آزمایشی", "إختبار", "テスト", "测试", "測試", "테스트"}
+# Drops the direction marks the source list wraps right-to-left names in
+_DROP_BIDI_MARKS = str.maketrans("", "", "\u200e\u200f")
+
+# The index of this process, loaded once by load_index()
+_index = None
+
+
+def guess_category(tld):
+    """
+    Returns the IANA category of `tld` as far as it follows from the name: two ASCII
+    letters or a known internationalized ccTLD (also in punycode) are a ccTLD, a few
+    sponsored/restricted/infrastructure/test names are known, and everything else is
+    generic.
+    """
+    if tld.startswith("xn--"):
+        try:
+            tld = tld.encode("ascii").decode("idna")
+        except UnicodeError:
+            pass
+    if (len(tld) == 2 and tld.isascii() and tld.isalpha()) or tld in _IDN_COUNTRY_CODES:
+        return "country-code"
+    if tld in _IDN_TEST:
+        return "test"
+    if tld in _SPONSORED:
+        return "sponsored"
+    if tld in _RESTRICTED:
+        return "generic-restricted"
+    if tld in _INFRASTRUCTURE:
+        return "infrastructure"
+    return "generic"
+
+
+def parse_source(text):
+    """
+    Returns {tld: category} for the TLD list CSV `text` (name in the first column,
+    category in the second if present).
+    """
+    index = {}
+    for row in csv.reader(io.StringIO(text)):
+        if not row or row[0].startswith("#"):
+            continue
+        tld = row[0].translate(_DROP_BIDI_MARKS).strip().strip('"').lstrip(".").lower()
+        if not tld or tld in ("domain", "tld"):
+            continue
+        category = row[1].strip().lower() if len(row) > 1 else ""
+        index[tld] = category if category in CATEGORIES else guess_category(tld)
+    return index
+
+
+def compile_index(index, path=TLD_INDEX_FILE):
+    """
+    Writes `index` ({tld: category}) to `path` as the compact form load_index() reads:
+    the categories once and one category number per TLD, sorted by name.
+    """
+    data = {
+        "fetched": time.time(),
+        "categories": list(CATEGORIES),
+        "tlds": {tld: CATEGORIES.index(category) for tld, category in sorted(index.items())},
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def read_index(path=TLD_INDEX_FILE):
+    """
+    Returns ({tld: category}, time fetched) from the compiled index at `path`.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    categories = data["categories"]
+    return {tld: categories[number] for tld, number in data["tlds"].items()}, data["fetched"]
+
+
+def fetch_index(url=TLD_SOURCE_URL, timeout=10):
+    """
+    Downloads the TLD list and returns it as {tld: category}.
+    """
+    import requests
+
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return parse_source(response.text)
+
+
+def load_index(refresh=False):
+    """
+    Returns {tld: category} of all active TLDs. The compiled index is read once per
+    process; if it is older than TLD_INDEX_TTL (or `refresh` is set) the list is
+    downloaded again and compiled, falling back to the old index if that fails.
+    """
+    global _index
+    if _index is not None and not refresh:
+        return _index
+    index, fetched = {}, 0
+    try:
+        index, fetched = read_index()
+    except (OSError, ValueError, KeyError) as e:
+        print("Error reading TLD index:", e)
+    if refresh or time.time() - fetched >= TLD_INDEX_TTL:
+        try:
+            fresh = fetch_index()
+        except Exception as e:
+            print("Error fetching TLD list:", e)
+        else:
+            if fresh:
+                index = fresh
+                try:
+                    compile_index(index)
+                except OSError as e:
+                    print("Error writing TLD index:", e)
+    _index = index
+    return index
+
+
+def get_tlds(categories=None, cctld=None):
+    """
+    Returns the names of all active TLDs (without dot), only those in the given
+    `categories` if set, and only ccTLDs (cctld=True) or only other TLDs (False).
+    """
+    index = load_index()
+    return [
+        tld for tld, category in index.items()
+        if (categories is None or category in categories)
+        and (cctld is None or (category == "country-code") == cctld)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List known TLDs or refresh the compiled TLD index.")
+    parser.add_argument("--refresh", action="store_true", help="Download the TLD list and recompile the index")
+    parser.add_argument("--source", help="Compile the index from this local CSV or one-name-per-line file instead")
+    parser.add_argument("--category", action="append", choices=CATEGORIES, help="Only list TLDs of this category (repeatable)")
+    args = parser.parse_args()
+    if args.source:
+        with open(args.source, encoding="utf-8") as f:
+            compile_index(parse_source(f.read()))
+        return
+    if args.refresh:
+        load_index(refresh=True)
+    for tld in get_tlds(args.category):
+        print(tld)
+
+
+if __name__ == "__main__":
+    main()